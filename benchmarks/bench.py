@@ -0,0 +1,310 @@
+"""Throughput and latency benchmarks for the rate limiter.
+
+Drives the limiter service directly and the FastAPI app in-process over ASGI,
+for every combination of the selected targets, algorithms, key distributions
+and concurrency levels, and writes the results as JSON:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --output new.json --compare results.json
+
+Without ``--redis-url`` a throwaway ``redis-server`` is started on a free port.
+"""
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import itertools
+import json
+import math
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from redis.asyncio import Redis
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.main import create_app
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.limiter import ALGORITHMS, PARAM_NAMES
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.redis import RedisService
+
+TARGETS = ("service", "app", "local")
+DISTRIBUTIONS = ("hot", "uniform", "zipfian")
+
+
+@contextlib.contextmanager
+def spawn_redis():
+    """Run a redis-server without persistence on a free port."""
+    if shutil.which("redis-server") is None:
+        sys.exit("redis-server not found; install it or pass --redis-url")
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    process = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("redis-server did not start")
+                time.sleep(0.05)
+        yield f"redis://127.0.0.1:{port}/0"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def subject_sampler(distribution: str, keys: int, rng: random.Random):
+    """Return a function drawing subject names from ``distribution``."""
+    subjects = [f"bench:{i}" for i in range(keys)]
+    if distribution == "hot":
+        return lambda: subjects[0]
+    if distribution == "uniform":
+        return lambda: subjects[rng.randrange(keys)]
+
+    # Zipf with s = 1.1: a handful of subjects get most of the traffic
+    weights = list(itertools.accumulate(1 / (rank**1.1) for rank in range(1, keys + 1)))
+    total = weights[-1]
+    return lambda: subjects[min(bisect.bisect(weights, rng.random() * total), keys - 1)]
+
+
+async def drive(call, requests: int, concurrency: int):
+    """Run ``call`` ``requests`` times from ``concurrency`` tasks.
+
+    Returns the wall time, the latency of every call in seconds and how many
+    calls were allowed.
+    """
+    latencies = []
+    allowed = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal allowed
+        for _ in remaining:
+            start = time.perf_counter()
+            allowed += await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, allowed
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+def summarize(scenario: dict, seconds: float, latencies: list[float], allowed: int):
+    ordered = sorted(latencies)
+    return {
+        **scenario,
+        "requests": len(ordered),
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(len(ordered) / seconds, 1),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "p999_ms": round(percentile(ordered, 0.999) * 1000, 4),
+        "allowed_ratio": round(allowed / len(ordered), 4),
+    }
+
+
+async def asgi_post(app, path: str, body: bytes) -> int:
+    """POST ``body`` to ``app`` without a server or client, returning the status."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def service_call(limiter, algorithm, sample, args):
+    check = getattr(limiter, f"check_{algorithm}")
+
+    async def call():
+        result = await check(sample(), args.capacity, args.param)
+        return result["allowed"]
+
+    return call
+
+
+def app_call(app, algorithm, sample, args):
+    path = f"/v1/check/{algorithm}"
+    params = {name: None for name in set(PARAM_NAMES.values())}
+
+    async def call():
+        payload = {
+            "subject": sample(),
+            "capacity": args.capacity,
+            **params,
+            PARAM_NAMES[algorithm]: args.param,
+        }
+        status = await asgi_post(app, path, json.dumps(payload).encode())
+        if status not in (200, 429):
+            raise RuntimeError(f"{path} returned {status}")
+        return status == 200
+
+    return call
+
+
+async def run(args, redis_url: str):
+    redis = Redis.from_url(redis_url)
+    settings.backend = "redis"
+    settings.redis_url = redis_url
+    settings.deny_cache_size = args.deny_cache
+    app = create_app()
+    results = []
+
+    async with app.router.lifespan_context(app):
+        for target, algorithm, distribution, concurrency in itertools.product(
+            args.targets, args.algorithms, args.distributions, args.concurrency
+        ):
+            await redis.flushdb()
+            deny_cache = DenyCache(args.deny_cache) if args.deny_cache else None
+            sample = subject_sampler(distribution, args.keys, random.Random(0))
+            if target == "app":
+                call = app_call(app, algorithm, sample, args)
+            elif target == "local":
+                call = service_call(LocalService(deny_cache), algorithm, sample, args)
+            else:
+                limiter = RedisService(redis, deny_cache=deny_cache)
+                call = service_call(limiter, algorithm, sample, args)
+
+            await drive(call, args.warmup, concurrency)
+            seconds, latencies, allowed = await drive(call, args.requests, concurrency)
+            scenario = {
+                "target": target,
+                "algorithm": algorithm,
+                "distribution": distribution,
+                "concurrency": concurrency,
+            }
+            result = summarize(scenario, seconds, latencies, allowed)
+            results.append(result)
+            print(
+                f"{target:8} {algorithm:23} {distribution:8} c={concurrency:<4}"
+                f" {result['ops_per_sec']:>10.1f} ops/s"
+                f"  p50 {result['p50_ms']:.3f}ms  p99 {result['p99_ms']:.3f}ms"
+                f"  p999 {result['p999_ms']:.3f}ms"
+            )
+
+    await redis.aclose()
+    return results
+
+
+def scenario_key(result: dict):
+    return (
+        result["target"],
+        result["algorithm"],
+        result["distribution"],
+        result["concurrency"],
+    )
+
+
+def compare(results: list[dict], baseline: dict):
+    """Print the change of every scenario that also ran in ``baseline``."""
+    previous = {scenario_key(result): result for result in baseline["results"]}
+    print("\nchange against baseline:")
+    for result in results:
+        before = previous.get(scenario_key(result))
+        if before is None:
+            continue
+        ops = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        p99 = result["p99_ms"] / before["p99_ms"] - 1
+        print(
+            f"{' '.join(map(str, scenario_key(result))):60}"
+            f" ops/s {ops:+7.1%}  p99 {p99:+7.1%}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", help="use this Redis instead of spawning one")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument(
+        "--algorithms", nargs="+", choices=ALGORITHMS, default=ALGORITHMS
+    )
+    parser.add_argument(
+        "--distributions", nargs="+", choices=DISTRIBUTIONS, default=DISTRIBUTIONS
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--keys", type=int, default=10_000, help="distinct subjects")
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=100)
+    parser.add_argument(
+        "--param",
+        type=float,
+        default=100.0,
+        help="refill/leak rate or window size, depending on the algorithm",
+    )
+    parser.add_argument(
+        "--deny-cache", type=int, default=0, help="deny cache size, 0 disables it"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with contextlib.ExitStack() as stack:
+        redis_url = args.redis_url or stack.enter_context(spawn_redis())
+        results = asyncio.run(run(args, redis_url))
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {
+            name: value for name, value in vars(args).items() if name != "compare"
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+def main():
+    """Entry point of the ``distributed-rate-limiter-service`` command."""
+    # imported here so that importing the package does not build the app
+    from distributed_rate_limiter_service.server import main
+
+    main()
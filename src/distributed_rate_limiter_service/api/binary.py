@@ -0,0 +1,242 @@
+"""Length-prefixed binary protocol for rate limit checks.
+
+Every frame starts with its length as an unsigned 32-bit integer, not counting
+the length itself; all integers are big-endian.
+
+A request frame is ``id (u32), algorithm (u8), cost (u32), capacity (f64),
+param (f64), name length (u16)``, then the UTF-8 policy name and subject.
+``algorithm`` indexes ``ALGORITHMS``; for ``POLICY`` the name selects a
+policy and ``capacity`` and ``param`` are ignored, otherwise the name is
+empty.
+
+A response frame is ``id (u32), status (u8), remaining (i64), retry_after
+(f64), reset_after (f64)`` and, for ``ERROR``, a UTF-8 message.
+
+Requests on one connection are handled concurrently and responses are sent
+as they complete, so clients can pipeline checks and match responses by id.
+"""
+
+from typing import Any
+import asyncio
+import itertools
+import logging
+import struct
+
+from distributed_rate_limiter_service.service.limiter import (
+    ALGORITHMS,
+    RateLimitCheck,
+    RateLimiter,
+)
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+
+logger = logging.getLogger(__name__)
+
+LENGTH = struct.Struct("!I")
+REQUEST = struct.Struct("!IBIddH")
+RESPONSE = struct.Struct("!IBqdd")
+
+POLICY = 0xFF
+DENIED, ALLOWED, ERROR = 0, 1, 2
+
+# Frames are small; anything larger is a client bug, not a request
+MAX_FRAME = 64 * 1024
+
+
+def encode_request(
+    request_id: int,
+    algorithm: str | None,
+    subject: str,
+    capacity: float = 0,
+    param: float = 0,
+    cost: int = 1,
+    policy: str = "",
+) -> bytes:
+    code = POLICY if algorithm is None else ALGORITHMS.index(algorithm)
+    name = policy.encode()
+    body = (
+        REQUEST.pack(request_id, code, cost, capacity, param, len(name))
+        + name
+        + subject.encode()
+    )
+    return LENGTH.pack(len(body)) + body
+
+
+def encode_response(request_id: int, result: dict[str, Any]) -> bytes:
+    body = RESPONSE.pack(
+        request_id,
+        ALLOWED if result["allowed"] else DENIED,
+        result["remaining"],
+        result["retry_after"],
+        result["reset_after"],
+    )
+    return LENGTH.pack(len(body)) + body
+
+
+def encode_error(request_id: int, message: str) -> bytes:
+    body = RESPONSE.pack(request_id, ERROR, 0, 0.0, 0.0) + message.encode()
+    return LENGTH.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes | None:
+    """Read one frame body, or ``None`` once the peer has closed."""
+    try:
+        (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    except asyncio.IncompleteReadError:
+        return None
+    if length > MAX_FRAME:
+        raise ValueError(f"frame of {length} bytes exceeds {MAX_FRAME}")
+    return await reader.readexactly(length)
+
+
+class BinaryServer:
+    """Serves the binary protocol from a ``RateLimiter``.
+
+    At most ``max_in_flight`` requests per connection are evaluated at once;
+    beyond that the server stops reading, which pushes back on the client.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        policies: PolicyRegistry,
+        max_in_flight: int = 1024,
+    ):
+        self.limiter = limiter
+        self.policies = policies
+        self.max_in_flight = max_in_flight
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def close(self):
+        """Close every open connection, letting ``Server.wait_closed`` return."""
+        for writer in self._writers:
+            writer.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        self._writers.add(writer)
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                await in_flight.acquire()
+                task = asyncio.create_task(self._respond(frame, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+        except (ValueError, ConnectionError) as exc:
+            logger.warning("Closing binary connection: %s", exc)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, frame: bytes, writer: asyncio.StreamWriter):
+        request_id = 0
+        try:
+            request_id, code, cost, capacity, param, name_length = REQUEST.unpack_from(
+                frame
+            )
+            start = REQUEST.size + name_length
+            name = frame[REQUEST.size : start].decode()
+            subject = frame[start:].decode()
+            result = await self._check(code, name, subject, capacity, param, cost)
+            writer.write(encode_response(request_id, result))
+        except (ValueError, struct.error) as exc:
+            writer.write(encode_error(request_id, str(exc)))
+        except Exception:
+            logger.exception("Binary check %d failed", request_id)
+            writer.write(encode_error(request_id, "internal error"))
+        await writer.drain()
+
+    async def _check(self, code, name, subject, capacity, param, cost):
+        if code == POLICY:
+            policy = self.policies.get(name)
+            if policy is None:
+                raise ValueError("policy not found")
+            return await self.limiter.check_policy(policy, subject, cost)
+        if code >= len(ALGORITHMS):
+            raise ValueError(f"unknown algorithm code: {code}")
+
+        check = RateLimitCheck(ALGORITHMS[code], subject, capacity, param, cost)
+        return await self.limiter.check(check)
+
+
+class BinaryClient:
+    """Client for ``BinaryServer`` that pipelines concurrent checks."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count()
+        self._waiting: dict[int, asyncio.Future] = {}
+        self._reading = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(
+        cls, host: str | None = None, port: int | None = None, path: str | None = None
+    ):
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def check(
+        self,
+        algorithm: str,
+        subject: str,
+        capacity: float,
+        param: float,
+        cost: int = 1,
+    ) -> dict[str, Any]:
+        return await self._request(algorithm, subject, capacity, param, cost=cost)
+
+    async def check_policy(
+        self, policy: str, subject: str, cost: int = 1
+    ) -> dict[str, Any]:
+        return await self._request(None, subject, cost=cost, policy=policy)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        await self._reading
+
+    async def _request(self, algorithm, subject, capacity=0, param=0, **kwargs):
+        request_id = next(self._ids) % 2**32
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self.writer.write(
+            encode_request(request_id, algorithm, subject, capacity, param, **kwargs)
+        )
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            self._waiting.pop(request_id, None)
+            raise
+        return await future
+
+    async def _read(self):
+        try:
+            while (frame := await read_frame(self.reader)) is not None:
+                request_id, status, remaining, retry_after, reset_after = (
+                    RESPONSE.unpack_from(frame)
+                )
+                future = self._waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if status == ERROR:
+                    future.set_exception(ValueError(frame[RESPONSE.size :].decode()))
+                else:
+                    future.set_result(
+                        {
+                            "allowed": status == ALLOWED,
+                            "remaining": remaining,
+                            "retry_after": retry_after,
+                            "reset_after": reset_after,
+                        }
+                    )
+        except ConnectionError:
+            pass
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection closed"))
+            self._waiting.clear()
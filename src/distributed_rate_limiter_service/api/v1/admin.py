@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import AsyncIterator
+import json
+
+from distributed_rate_limiter_service.core.models import Algorithm, StateRecord
+from distributed_rate_limiter_service.core.utils import get_limiter
+from distributed_rate_limiter_service.service.limiter import ALGORITHMS, RateLimiter
+from distributed_rate_limiter_service.service.redis import RedisService
+
+router = APIRouter(prefix="/v1/admin", tags=["admin"])
+
+# Records written to Redis per pipeline while importing
+IMPORT_BATCH = 1000
+
+
+def get_redis_service(limiter: RateLimiter = Depends(get_limiter)) -> RedisService:
+    if not isinstance(limiter, RedisService):
+        raise HTTPException(
+            status_code=400, detail="state is only managed with the redis backend"
+        )
+    return limiter
+
+
+@router.get("/memory")
+async def memory_report(limiter: RateLimiter = Depends(get_limiter)):
+    return await limiter.memory_usage()
+
+
+@router.get("/state")
+async def export_state(
+    algorithm: Algorithm | None = None,
+    match: str = "*",
+    count: int = Query(1000, ge=1, le=10_000),
+    limiter: RedisService = Depends(get_redis_service),
+):
+    """Stream the state of every subject matching ``match`` as NDJSON.
+
+    ``match`` is a Redis glob on the subject; ``count`` keys are read per
+    ``SCAN`` call and pipeline. The output can be posted back to ``/state``.
+    """
+    algorithms = ALGORITHMS if algorithm is None else (algorithm,)
+
+    async def lines():
+        for name in algorithms:
+            async for record in limiter.scan_state(name, match, count):
+                yield json.dumps(record, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.delete("/state")
+async def reset_state(
+    match: str,
+    algorithm: Algorithm | None = None,
+    count: int = Query(1000, ge=1, le=10_000),
+    limiter: RedisService = Depends(get_redis_service),
+):
+    """Delete the state of every subject matching ``match``."""
+    algorithms = ALGORITHMS if algorithm is None else (algorithm,)
+    deleted = 0
+    for name in algorithms:
+        deleted += await limiter.reset_state(name, match, count)
+    return {"deleted": deleted}
+
+
+@router.post("/state")
+async def import_state(
+    request: Request, limiter: RedisService = Depends(get_redis_service)
+):
+    """Write NDJSON state records, as exported by ``GET /state``.
+
+    Records are written in batches as the body arrives; a malformed line
+    fails the request, leaving the batches before it written.
+    """
+    imported = 0
+    batch = []
+    number = 0
+    async for line in _lines(request):
+        number += 1
+        try:
+            batch.append(StateRecord.model_validate_json(line).model_dump())
+        except ValidationError as exc:
+            raise HTTPException(
+                status_code=400, detail=f"line {number}: {exc.errors()[0]['msg']}"
+            )
+        if len(batch) >= IMPORT_BATCH:
+            imported += await _import(limiter, batch)
+            batch = []
+    if batch:
+        imported += await _import(limiter, batch)
+    return {"imported": imported}
+
+
+async def _lines(request: Request) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def _import(limiter: RedisService, records: list[dict]) -> int:
+    try:
+        return await limiter.import_state(records)
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"invalid state: {exc!r}")
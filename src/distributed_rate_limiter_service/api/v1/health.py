@@ -1,20 +1,31 @@
 from fastapi import APIRouter, Depends
 
 from distributed_rate_limiter_service.core.config import settings
-from distributed_rate_limiter_service.core.utils import get_redis
+from distributed_rate_limiter_service.core.utils import get_limiter, get_redis
+from distributed_rate_limiter_service.service.limiter import RateLimiter
 
 router = APIRouter(prefix="/v1", tags=["health"])
 
 
 @router.get("/health")
-async def health_check(redis=Depends(get_redis)):
-    try:
-        redis_status = await redis.ping()
-    except Exception:
-        redis_status = False
+async def health_check(
+    redis=Depends(get_redis), limiter: RateLimiter = Depends(get_limiter)
+):
+    if redis is None:
+        # the local backend does not use Redis
+        redis_status = "DISABLED"
+    else:
+        try:
+            redis_status = "UP" if await redis.ping() else "DOWN"
+        except Exception:
+            redis_status = "DOWN"
+    fallback = limiter.fallback_mode
     return {
-        "status": "ok",
+        # checks are still answered, but not with the configured limits
+        "status": "ok" if fallback is None else "degraded",
         "app": settings.app_name,
         "environment": settings.environment,
-        "redis": "UP" if redis_status else "DOWN",
+        "backend": settings.backend,
+        "redis": redis_status,
+        "fallback": fallback,
     }
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, Response
+
+from distributed_rate_limiter_service.core.utils import get_metrics
+from distributed_rate_limiter_service.service.metrics import Metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics_endpoint(metrics: Metrics = Depends(get_metrics)):
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
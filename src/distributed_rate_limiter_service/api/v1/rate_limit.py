@@ -1,50 +1,262 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Response
+import json
 import math
+import time
 
-from distributed_rate_limiter_service.core.utils import get_redis_service
-from distributed_rate_limiter_service.service.redis import RedisService
-from distributed_rate_limiter_service.core.models import RateLimitCheckRequest
+from distributed_rate_limiter_service.core.utils import (
+    get_metrics,
+    get_limiter,
+    get_policies,
+)
+from distributed_rate_limiter_service.service.limiter import (
+    PARAM_NAMES,
+    RateLimitCheck,
+    RateLimiter,
+)
+from distributed_rate_limiter_service.service.metrics import (
+    ACQUIRE,
+    BATCH,
+    COMPOSITE,
+    POLICY,
+    Metrics,
+)
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.core.models import (
+    AcquireRequest,
+    Algorithm,
+    BatchCheckRequest,
+    CompositeCheckRequest,
+    PolicyCheckRequest,
+    RateLimitCheckRequest,
+    ReservableAlgorithm,
+)
 
 router = APIRouter(prefix="/v1", tags=["RateLimitCheck"])
 
 
-@router.post("/check/{algorithm}")
-async def check_rate_limit(
-    payload: RateLimitCheckRequest,
-    algorithm: Literal["token_bucket", "leaky_bucket", "sliding_window"],
-    redis_service: RedisService = Depends(get_redis_service),
+def get_param(algorithm: str, payload: RateLimitCheckRequest) -> float:
+    name = PARAM_NAMES[algorithm]
+    value = getattr(payload, name)
+    if not value:
+        raise HTTPException(status_code=400, detail=f"{name} not found")
+    return value
+
+
+def fallback_headers(limiter: RateLimiter) -> dict[str, str]:
+    """Tell clients that decisions currently come from the fallback."""
+    mode = limiter.fallback_mode
+    return {} if mode is None else {"X-RateLimit-Fallback": mode}
+
+
+# A single check result has a fixed shape, so its body is formatted directly
+# rather than going through FastAPI's encoder; floats use ``repr``, which is
+# valid JSON for the finite values the limiter returns.
+RESULT_JSON = '{"allowed":%s,"remaining":%d,"retry_after":%r,"reset_after":%r}'
+
+
+def result_json(result: dict) -> str:
+    return RESULT_JSON % (
+        "true" if result["allowed"] else "false",
+        result["remaining"],
+        result["retry_after"],
+        result["reset_after"],
+    )
+
+
+def rate_limit_response(
+    result: dict,
+    limit: float,
+    limiter: RateLimiter,
+    body: str | None = None,
+) -> Response:
+    """A 200 or 429 response for ``result`` with ``RateLimit-*`` headers.
+
+    Allowed and denied results take the same path; a denial only adds
+    ``Retry-After`` and wraps the body in ``detail`` like ``HTTPException``
+    would. ``body`` is the serialized result, by default ``RESULT_JSON``.
+    """
+    if body is None:
+        body = result_json(result)
+    headers = {
+        "RateLimit-Limit": str(limit),
+        "RateLimit-Remaining": str(result["remaining"]),
+        "RateLimit-Reset": str(math.ceil(result["reset_after"])),
+        **fallback_headers(limiter),
+    }
+    if result["allowed"]:
+        return Response(body, 200, headers, "application/json")
+
+    headers["Retry-After"] = str(math.ceil(result["retry_after"]))
+    # kept for clients of the earlier headers
+    headers["X-RateLimit-Remaining"] = headers["RateLimit-Remaining"]
+    headers["X-RateLimit-Limit"] = headers["RateLimit-Limit"]
+    return Response(f'{{"detail":{body}}}', 429, headers, "application/json")
+
+
+def shadow_response(result: dict, limiter: RateLimiter) -> Response:
+    """A 200 response for a shadow ``result``, whatever it decided.
+
+    The would-be decision is in the body and ``RateLimit-Shadow``; the
+    ``RateLimit-*`` headers are left out so clients do not act on it.
+    """
+    body = result_json(result)
+    headers = {
+        "RateLimit-Shadow": "allowed" if result["allowed"] else "denied",
+        **fallback_headers(limiter),
+    }
+    return Response(body, 200, headers, "application/json")
+
+
+@router.post("/check")
+async def check_policy(
+    payload: PolicyCheckRequest,
+    shadow: bool = False,
+    policies: PolicyRegistry = Depends(get_policies),
+    limiter: RateLimiter = Depends(get_limiter),
+    metrics: Metrics = Depends(get_metrics),
 ):
-    if algorithm == "token_bucket":
-        if not payload.refill_rate:
-            raise HTTPException(status_code=400, detail="refill_rate not found")
-        result = await redis_service.check_token_bucket(
-            payload.subject, payload.capacity, payload.refill_rate
-        )
-        retry_after = math.ceil(1 / payload.refill_rate)
+    start = time.perf_counter()
+    try:
+        policy = policies.get(payload.policy)
+        if policy is None:
+            raise HTTPException(status_code=404, detail="policy not found")
 
-    elif algorithm == "leaky_bucket":
-        if not payload.leak_rate:
-            raise HTTPException(status_code=400, detail="leak_rate not found")
-        result = await redis_service.check_leaky_bucket(
-            payload.subject, payload.capacity, payload.leak_rate
+        check = RateLimitCheck(
+            policy.algorithm,
+            payload.subject,
+            policy.capacity,
+            policy.param,
+            payload.cost,
         )
-        retry_after = math.ceil(1 / payload.leak_rate)
+        try:
+            if shadow:
+                return shadow_response(await limiter.peek(check), limiter)
+            result = await limiter.check(check)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
 
-    elif algorithm == "sliding_window":
-        if not payload.window_size:
-            raise HTTPException(status_code=400, detail="window_size not found")
-        result = await redis_service.check_sliding_window(
-            payload.subject, payload.capacity, payload.window_size
+        return rate_limit_response(result, policy.capacity, limiter)
+    finally:
+        metrics.handler_latency[POLICY].observe(time.perf_counter() - start)
+
+
+@router.post("/check/composite")
+async def check_composite(
+    payload: CompositeCheckRequest,
+    policies: PolicyRegistry = Depends(get_policies),
+    limiter: RateLimiter = Depends(get_limiter),
+    metrics: Metrics = Depends(get_metrics),
+):
+    start = time.perf_counter()
+    try:
+        composite = policies.get_composite(payload.policy)
+        if composite is None:
+            raise HTTPException(status_code=404, detail="policy not found")
+
+        try:
+            result = await limiter.check_composite(
+                composite, payload.subjects, payload.cost
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        # the limit of the first level that denied, or else of the level
+        # closest to denying
+        levels = [
+            (not level["allowed"], -level["remaining"], policy.capacity)
+            for (policy, _), level in zip(composite.levels, result["results"])
+            if level is not None
+        ]
+        limit = max(levels, key=lambda level: level[:2])[2]
+        body = json.dumps(result, separators=(",", ":"))
+        return rate_limit_response(result, limit, limiter, body)
+    finally:
+        metrics.handler_latency[COMPOSITE].observe(time.perf_counter() - start)
+
+
+@router.post("/acquire/{algorithm}")
+async def acquire(
+    payload: AcquireRequest,
+    algorithm: ReservableAlgorithm,
+    limiter: RateLimiter = Depends(get_limiter),
+    metrics: Metrics = Depends(get_metrics),
+):
+    start = time.perf_counter()
+    try:
+        check = RateLimitCheck(
+            algorithm,
+            payload.subject,
+            payload.capacity,
+            get_param(algorithm, payload),
+            payload.cost,
         )
-        retry_after = payload.window_size
+        timeout = min(payload.timeout, settings.acquire_max_timeout)
+        try:
+            result = await limiter.acquire(check, timeout, payload.wait)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        body = json.dumps(result, separators=(",", ":"))
+        return rate_limit_response(result, payload.capacity, limiter, body)
+    finally:
+        metrics.handler_latency[ACQUIRE].observe(time.perf_counter() - start)
+
 
-    if not result["allowed"]:
-        headers = {
-            "Retry-After": retry_after,
-            "X-RateLimit-Remaining": result["remaining"],
-            "X-RateLimit-Limit": payload.capacity,
-        }
-        raise HTTPException(status_code=429, detail=result, headers=headers)
+@router.post("/check/batch")
+async def check_rate_limit_batch(
+    payload: BatchCheckRequest,
+    response: Response,
+    limiter: RateLimiter = Depends(get_limiter),
+    metrics: Metrics = Depends(get_metrics),
+):
+    start = time.perf_counter()
+    try:
+        checks = [
+            RateLimitCheck(
+                check.algorithm,
+                check.subject,
+                check.capacity,
+                get_param(check.algorithm, check),
+                check.cost,
+            )
+            for check in payload.checks
+        ]
+        try:
+            result = await limiter.check_many(checks, payload.all_or_nothing)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        response.headers.update(fallback_headers(limiter))
+        return result
+    finally:
+        metrics.handler_latency[BATCH].observe(time.perf_counter() - start)
+
+
+@router.post("/check/{algorithm}")
+async def check_rate_limit(
+    payload: RateLimitCheckRequest,
+    algorithm: Algorithm,
+    shadow: bool = False,
+    limiter: RateLimiter = Depends(get_limiter),
+    metrics: Metrics = Depends(get_metrics),
+):
+    start = time.perf_counter()
+    try:
+        check = RateLimitCheck(
+            algorithm,
+            payload.subject,
+            payload.capacity,
+            get_param(algorithm, payload),
+            payload.cost,
+        )
+        try:
+            if shadow:
+                return shadow_response(await limiter.peek(check), limiter)
+            result = await limiter.check(check)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
 
-    return result
+        return rate_limit_response(result, payload.capacity, limiter)
+    finally:
+        metrics.handler_latency[algorithm].observe(time.perf_counter() - start)
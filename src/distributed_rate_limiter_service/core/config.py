@@ -1,10 +1,90 @@
+from typing import Literal
+import socket
+
 from pydantic_settings import BaseSettings
 
+from distributed_rate_limiter_service.core.models import (
+    CompositePolicyConfig,
+    PolicyConfig,
+)
+
 
 class Settings(BaseSettings):
     app_name: str = "Distributed Rate Limiter"
     environment: str = "dev"
+    # "local" keeps limits in process memory, per replica and without Redis
+    backend: Literal["redis", "local"] = "redis"
     redis_url: str = "redis://localhost:6397/0"
+    # Connect to a Redis Cluster (redis_url names any node) with hash-tagged keys
+    redis_cluster: bool = False
+    # Connections per worker (per node in cluster mode); a standalone client
+    # waits up to redis_pool_timeout for one to become free, a cluster client
+    # fails right away
+    redis_max_connections: int = 100
+    redis_pool_timeout: float = 5.0
+    redis_socket_timeout: float | None = 5.0
+    redis_socket_connect_timeout: float | None = 5.0
+    # Connections idle for longer are pinged before use; 0 disables the check
+    redis_health_check_interval: float = 30.0
+    # Serve the binary check protocol on a TCP port and/or a Unix socket
+    binary_host: str = "0.0.0.0"
+    binary_port: int | None = None
+    binary_socket: str | None = None
+    # Bind binary_port with SO_REUSEPORT, so every worker process can serve it
+    binary_reuse_port: bool = hasattr(socket, "SO_REUSEPORT")
+    # Single checks arriving within this many seconds of each other share one
+    # pipeline, flushed early once coalesce_max_batch checks are waiting; 0
+    # collects what arrives in the same event loop iteration and None
+    # disables coalescing
+    coalesce_window: float | None = None
+    coalesce_max_batch: int = 64
+    # Redis calls taking longer than breaker_timeout seconds fail; after
+    # breaker_failures failures in a row checks skip Redis for
+    # breaker_reset_timeout seconds. Meanwhile they are answered by the
+    # fallback: "open" allows, "closed" denies and "local" enforces each limit
+    # in memory, split evenly among fallback_replicas workers. None disables
+    # the breaker
+    breaker_fallback: Literal["open", "closed", "local"] | None = None
+    breaker_timeout: float = 0.05
+    breaker_failures: int = 5
+    breaker_reset_timeout: float = 5.0
+    fallback_replicas: int = 1
+    # "redis" takes timestamps from the Redis server clock inside the scripts;
+    # "client" uses each API host's wall clock
+    time_source: Literal["redis", "client"] = "redis"
+    # Largest block of token bucket tokens a worker reserves from Redis for
+    # one subject and spends locally, and how long it may hold them; 0
+    # disables leasing
+    token_lease_max: int = 0
+    token_lease_ttl: float = 1.0
+    # Subjects checked at least shard_hot_rate times per second across all
+    # workers are split across shard_count keys, so one hot subject is not
+    # bound to a single Redis key; 0 disables sharding. Workers share their
+    # counts and read which subjects are split every shard_interval seconds,
+    # and a denied request tries at most shard_probes of the keys
+    shard_count: int = 0
+    shard_hot_rate: float = 1000.0
+    shard_interval: float = 1.0
+    shard_probes: int = 2
+    # Longest wait an acquire request may ask for; longer timeouts are capped
+    acquire_max_timeout: float = 30.0
+    # Each decision is logged with probability decision_log_sample_rate, as a
+    # line of JSON in decision_log_file or an entry of the Redis Stream
+    # decision_log_stream. Decisions are written in batches every
+    # decision_log_flush_interval seconds and at most decision_log_buffer of
+    # them wait to be written; older ones are dropped
+    decision_log_file: str | None = None
+    decision_log_stream: str | None = None
+    decision_log_sample_rate: float = 0.01
+    decision_log_buffer: int = 10_000
+    decision_log_flush_interval: float = 1.0
+    # Subjects remembered as denied per worker; 0 disables the deny cache
+    deny_cache_size: int = 10_000
+    # Named limit policies, single or composite; entries in policy_file (JSON)
+    # take precedence and the file is reloaded when it changes
+    policies: dict[str, PolicyConfig | CompositePolicyConfig] = {}
+    policy_file: str | None = None
+    policy_reload_interval: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -1,4 +1,18 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, NonNegativeFloat, PositiveInt
+
+
+Algorithm = Literal[
+    "token_bucket",
+    "leaky_bucket",
+    "sliding_window",
+    "sliding_window_counter",
+    "gcra",
+]
+
+
+ReservableAlgorithm = Literal["token_bucket", "leaky_bucket"]
 
 
 class RateLimitCheckRequest(BaseModel):
@@ -7,3 +21,62 @@ class RateLimitCheckRequest(BaseModel):
     refill_rate: float | None
     leak_rate: float | None
     window_size: float | None
+    cost: PositiveInt = 1
+
+
+class AcquireRequest(RateLimitCheckRequest):
+    # Longest wait, in seconds, the caller accepts for a reservation
+    timeout: NonNegativeFloat = 0.0
+    # Hold the request until the reserved units are available, rather than
+    # returning the wait right away
+    wait: bool = True
+
+
+class BatchCheckItem(RateLimitCheckRequest):
+    algorithm: Algorithm
+
+
+class BatchCheckRequest(BaseModel):
+    checks: list[BatchCheckItem]
+    all_or_nothing: bool = False
+
+
+class PolicyConfig(BaseModel):
+    algorithm: Algorithm
+    capacity: int
+    refill_rate: float | None = None
+    leak_rate: float | None = None
+    window_size: float | None = None
+
+
+class CompositeLevelConfig(PolicyConfig):
+    # Subject checked at this level, with ``{name}`` placeholders filled in
+    # from the request, e.g. "tenant:{tenant}"; a constant makes it global
+    subject: str
+
+
+class CompositePolicyConfig(BaseModel):
+    levels: list[CompositeLevelConfig]
+
+
+class PolicyCheckRequest(BaseModel):
+    policy: str
+    subject: str
+    cost: PositiveInt = 1
+
+
+class CompositeCheckRequest(BaseModel):
+    policy: str
+    subjects: dict[str, str]
+    cost: PositiveInt = 1
+
+
+class StateRecord(BaseModel):
+    """Stored state of one subject, one line of an NDJSON export."""
+
+    algorithm: Algorithm
+    subject: str
+    # decoded as by ``RedisService.scan_state``
+    state: dict
+    # seconds until the state expires
+    ttl: float
@@ -1,12 +1,40 @@
 from fastapi import Request
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis, RedisCluster
 
-from distributed_rate_limiter_service.service.redis import RedisService
+from distributed_rate_limiter_service.core.config import Settings
 
+from distributed_rate_limiter_service.service.limiter import RateLimiter
+from distributed_rate_limiter_service.service.metrics import Metrics
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
 
-def get_redis(request: Request) -> Redis:
+
+def create_redis(settings: Settings) -> Redis | RedisCluster:
+    options = {
+        "max_connections": settings.redis_max_connections,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout,
+        "health_check_interval": settings.redis_health_check_interval,
+    }
+    if settings.redis_cluster:
+        return RedisCluster.from_url(settings.redis_url, **options)
+
+    pool = BlockingConnectionPool.from_url(
+        settings.redis_url, timeout=settings.redis_pool_timeout, **options
+    )
+    return Redis(connection_pool=pool)
+
+
+def get_redis(request: Request) -> Redis | None:
     return request.app.state.redis
 
 
-def get_redis_service(request: Request) -> RedisService:
-    return request.app.state.redis_service
+def get_limiter(request: Request) -> RateLimiter:
+    return request.app.state.limiter
+
+
+def get_policies(request: Request) -> PolicyRegistry:
+    return request.app.state.policies
+
+
+def get_metrics(request: Request) -> Metrics:
+    return request.app.state.metrics
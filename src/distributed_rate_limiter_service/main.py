@@ -1,24 +1,180 @@
 from fastapi import FastAPI
-from redis.asyncio import Redis
 from contextlib import asynccontextmanager
+import asyncio
+import contextlib
 
+from distributed_rate_limiter_service.api.binary import BinaryServer
+from distributed_rate_limiter_service.api.v1.admin import router as admin_router
 from distributed_rate_limiter_service.api.v1.health import router as health_router
+from distributed_rate_limiter_service.api.v1.metrics import router as metrics_router
 from distributed_rate_limiter_service.api.v1.rate_limit import (
     router as rate_limit_router,
 )
 from distributed_rate_limiter_service.core.config import settings
-from distributed_rate_limiter_service.service.redis import RedisService
+from distributed_rate_limiter_service.core.utils import create_redis
+from distributed_rate_limiter_service.service.breaker import CircuitBreaker, Fallback
+from distributed_rate_limiter_service.service.coalescer import Coalescer
+from distributed_rate_limiter_service.service.decision_log import (
+    DecisionLog,
+    FileSink,
+    StreamSink,
+)
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.lease import LeaseTable
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.metrics import Metrics
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+from distributed_rate_limiter_service.service.redis import (
+    OUTAGE_ERRORS,
+    SCRIPTS,
+    RedisService,
+)
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+from distributed_rate_limiter_service.service.shards import HotKeys
+
+
+def create_decision_log(redis, metrics: Metrics) -> DecisionLog | None:
+    if settings.decision_log_stream is not None:
+        if redis is None:
+            raise ValueError("decision_log_stream needs the redis backend")
+        sink = StreamSink(redis, settings.decision_log_stream)
+    elif settings.decision_log_file is not None:
+        sink = FileSink(settings.decision_log_file)
+    else:
+        return None
+    return DecisionLog(
+        sink,
+        settings.decision_log_sample_rate,
+        settings.decision_log_buffer,
+        settings.decision_log_flush_interval,
+        on_drop=metrics.decisions_dropped.inc,
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # App startup
-    app.state.redis = Redis.from_url(settings.redis_url)
-    app.state.redis_service = RedisService(app.state.redis)
+    app.state.metrics = Metrics()
+    deny_cache = None
+    if settings.deny_cache_size:
+        deny_cache = DenyCache(settings.deny_cache_size)
+    leases = None
+    hot_keys = None
+
+    if settings.backend == "local":
+        app.state.redis = None
+        decision_log = create_decision_log(None, app.state.metrics)
+        app.state.limiter = LocalService(
+            deny_cache, app.state.metrics, decision_log=decision_log
+        )
+    else:
+        app.state.redis = create_redis(settings)
+        app.state.metrics.track_pool(app.state.redis)
+        decision_log = create_decision_log(app.state.redis, app.state.metrics)
+        scripts = ScriptRegistry(
+            app.state.redis, SCRIPTS, on_reload=app.state.metrics.noscript_reloads.inc
+        )
+        await scripts.load()
+        if settings.token_lease_max:
+            leases = LeaseTable(settings.token_lease_max, settings.token_lease_ttl)
+        coalescer = None
+        if settings.coalesce_window is not None:
+            coalescer = Coalescer(
+                scripts, settings.coalesce_window, settings.coalesce_max_batch
+            )
+        breaker = fallback = None
+        if settings.breaker_fallback is not None:
+            breaker = CircuitBreaker(
+                settings.breaker_timeout,
+                settings.breaker_failures,
+                settings.breaker_reset_timeout,
+                errors=OUTAGE_ERRORS,
+            )
+            fallback = Fallback(
+                settings.breaker_fallback,
+                settings.fallback_replicas,
+                settings.breaker_reset_timeout,
+            )
+        if settings.shard_count > 1:
+            hot_keys = HotKeys(
+                settings.shard_count,
+                settings.shard_hot_rate,
+                settings.shard_interval,
+                settings.shard_probes,
+            )
+        app.state.limiter = RedisService(
+            app.state.redis,
+            scripts,
+            deny_cache,
+            settings.time_source,
+            app.state.metrics,
+            leases,
+            coalescer,
+            breaker,
+            fallback,
+            hot_keys,
+            decision_log,
+        )
+
+    app.state.policies = PolicyRegistry(settings.policies, settings.policy_file)
+    policy_watcher = None
+    if settings.policy_file:
+        policy_watcher = asyncio.create_task(
+            app.state.policies.watch(settings.policy_reload_interval)
+        )
+
+    pool_watcher = None
+    if app.state.metrics.multiprocess:
+        pool_watcher = asyncio.create_task(app.state.metrics.watch_pool())
+
+    hot_key_watcher = None
+    if hot_keys is not None:
+        hot_key_watcher = asyncio.create_task(app.state.limiter.watch_hot_keys())
+
+    decision_writer = None
+    if decision_log is not None:
+        decision_writer = asyncio.create_task(decision_log.run())
+
+    binary = BinaryServer(app.state.limiter, app.state.policies)
+    binary_servers = []
+    if settings.binary_port is not None:
+        binary_servers.append(
+            await asyncio.start_server(
+                binary.handle,
+                settings.binary_host,
+                settings.binary_port,
+                # every worker process serves the same port
+                reuse_port=settings.binary_reuse_port,
+            )
+        )
+    if settings.binary_socket is not None:
+        binary_servers.append(
+            await asyncio.start_unix_server(binary.handle, settings.binary_socket)
+        )
     yield
 
     # App shuts down
-    await app.state.redis.close()
+    for server in binary_servers:
+        server.close()
+    binary.close()
+    for server in binary_servers:
+        await server.wait_closed()
+    if policy_watcher is not None:
+        policy_watcher.cancel()
+    if hot_key_watcher is not None:
+        hot_key_watcher.cancel()
+    if pool_watcher is not None:
+        pool_watcher.cancel()
+    if leases is not None:
+        await app.state.limiter.release_leases()
+    if decision_writer is not None:
+        decision_writer.cancel()
+        # wait for the writer to stop, so it cannot flush alongside the last flush
+        with contextlib.suppress(asyncio.CancelledError):
+            await decision_writer
+        await decision_log.flush()
+    if app.state.redis is not None:
+        await app.state.redis.close()
 
 
 def create_app() -> FastAPI:
@@ -27,6 +183,8 @@ def create_app() -> FastAPI:
     # include routers
     app.include_router(health_router)
     app.include_router(rate_limit_router)
+    app.include_router(metrics_router)
+    app.include_router(admin_router)
 
     return app
 
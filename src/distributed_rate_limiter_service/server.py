@@ -0,0 +1,214 @@
+"""Runs the API in one worker process per core.
+
+The app is imported and the Lua scripts are loaded into Redis once, in the
+supervisor, before the workers are forked; each worker then opens its own
+Redis pool in the app's lifespan. With ``--reuse-port`` every worker binds
+its own listening socket with ``SO_REUSEPORT`` and the kernel spreads
+connections evenly between them; otherwise the workers share one socket.
+
+With several workers, Prometheus metrics are kept in prometheus_client's
+multiprocess mode, so a scrape of ``/metrics`` on any worker reports the
+totals of all of them: samples are written under ``PROMETHEUS_MULTIPROC_DIR``
+(a temporary directory unless it is set), which the supervisor clears at
+startup. The gauges of a worker are dropped when it exits; its counters are
+kept, so totals do not go backwards when a worker is restarted.
+
+uvloop and httptools are used when they are installed.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+from prometheus_client import multiprocess, values
+import uvicorn
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.core.utils import create_redis
+from distributed_rate_limiter_service.service.redis import SCRIPTS
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+
+def bind(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+async def preload_scripts():
+    if settings.backend != "redis":
+        return
+    redis = create_redis(settings)
+    try:
+        await ScriptRegistry(redis, SCRIPTS).load()
+    finally:
+        await redis.aclose()
+
+
+def share_metrics(path: str):
+    """Write the metrics of every process forked from now on under ``path``."""
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            # left over from an earlier run
+            os.remove(os.path.join(path, name))
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    # prometheus_client picks its value class on import, before this was set
+    values.ValueClass = values.get_value_class()
+
+
+def run_worker(app, args, index: int, sock: socket.socket | None):
+    if sock is None:
+        sock = bind(args.host, args.port, reuse_port=True)
+    if settings.binary_socket is not None and args.workers > 1:
+        # a Unix socket path can only be bound by one process
+        settings.binary_socket = f"{settings.binary_socket}.{index}"
+
+    config = uvicorn.Config(
+        app,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        log_level=args.log_level,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def forked_worker(app, args, index: int, sock: socket.socket | None):
+    # Leave the terminal's process group, so Ctrl-C reaches the supervisor
+    # alone and each worker gets exactly one SIGTERM, which uvicorn handles
+    # as a graceful shutdown; a second signal would skip the lifespan exit.
+    os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # blocked by the supervisor while forking, see ``supervise``
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    run_worker(app, args, index, sock)
+
+
+def supervise(app, args, restart_delay: float = 1.0):
+    """Fork the workers and restart any that exits until asked to stop."""
+    sock = None if args.reuse_port else bind(args.host, args.port, reuse_port=False)
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    temporary = metrics_dir is None
+    if temporary:
+        metrics_dir = tempfile.mkdtemp(prefix="rate-limiter-metrics-")
+    share_metrics(metrics_dir)
+    context = multiprocessing.get_context("fork")
+    workers: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def start(index: int):
+        process = context.Process(
+            target=forked_worker, args=(app, args, index, sock), daemon=False
+        )
+        # a signal reaching the worker before it resets its handlers would
+        # run the supervisor's ``stop`` there and be lost
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            process.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        workers[index] = process
+        if stopping:
+            # the signal came while this worker was starting, unseen by stop
+            os.kill(process.pid, signal.SIGTERM)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(args.workers):
+        start(index)
+    logger.info("Started %d workers on %s:%d", args.workers, args.host, args.port)
+
+    while workers:
+        sentinels = {process.sentinel: index for index, process in workers.items()}
+        for sentinel in multiprocessing.connection.wait(list(sentinels)):
+            index = sentinels[sentinel]
+            process = workers.pop(index)
+            process.join()
+            multiprocess.mark_process_dead(process.pid, metrics_dir)
+            if stopping:
+                continue
+            logger.warning(
+                "Worker %d exited with code %s, restarting",
+                index,
+                process.exitcode,
+            )
+            # do not spin if the worker keeps failing at startup
+            time.sleep(restart_delay)
+            if not stopping:
+                start(index)
+
+    if sock is not None:
+        sock.close()
+    if temporary:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes, one per core by default",
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action=argparse.BooleanOptionalAction,
+        default=hasattr(socket, "SO_REUSEPORT"),
+        help="give every worker its own SO_REUSEPORT socket",
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    # workers can only share the binary port through SO_REUSEPORT
+    settings.binary_reuse_port = args.reuse_port
+    if settings.binary_port is not None and args.workers > 1 and not args.reuse_port:
+        raise SystemExit("binary_port needs --reuse-port with more than one worker")
+
+    # imported before forking, so workers share the loaded modules
+    from distributed_rate_limiter_service.main import app
+
+    # fails fast if Redis is unreachable, before any worker starts
+    asyncio.run(preload_scripts())
+
+    if args.workers == 1:
+        run_worker(app, args, 0, bind(args.host, args.port, args.reuse_port))
+    else:
+        supervise(app, args)
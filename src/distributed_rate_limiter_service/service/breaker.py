@@ -0,0 +1,145 @@
+from typing import Awaitable, Callable, Literal
+import asyncio
+import logging
+import math
+import time
+
+from distributed_rate_limiter_service.service.limiter import (
+    RateLimitCheck,
+    Row,
+    split_check,
+)
+from distributed_rate_limiter_service.service.local import LocalService
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+FallbackMode = Literal["open", "closed", "local"]
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails fast while a dependency keeps failing.
+
+    Calls taking longer than ``timeout`` seconds are cancelled, so a stalled
+    connection costs at most that long. After ``failure_threshold`` failures
+    in a row the breaker opens and rejects calls for ``reset_timeout``
+    seconds; then a single trial call is let through, which closes the
+    breaker on success and opens it again on failure.
+
+    Only exceptions of the ``errors`` types, and timeouts, count as failures;
+    any other exception means the dependency did answer, and is passed on
+    like a success.
+    """
+
+    def __init__(
+        self,
+        timeout: float | None = 0.05,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        errors: tuple[type[BaseException], ...] = (Exception,),
+    ):
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.errors = errors + (TimeoutError,)
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if self._trial or self.clock() >= self.opened_at + self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    async def call(self, fn: Callable[..., Awaitable], *args):
+        trial = self.opened_at is not None
+        if trial:
+            if self._trial or self.clock() < self.opened_at + self.reset_timeout:
+                raise CircuitOpenError("circuit breaker is open")
+            self._trial = True
+
+        try:
+            result = await asyncio.wait_for(fn(*args), self.timeout)
+        except self.errors as exc:
+            self.failures += 1
+            if trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or trial:
+                    logger.warning("Circuit breaker opened: %r", exc)
+                self.opened_at = self.clock()
+            raise
+        except Exception:
+            self._close()
+            raise
+        finally:
+            if trial:
+                self._trial = False
+
+        self._close()
+        return result
+
+    def _close(self):
+        self.failures = 0
+        self.opened_at = None
+
+
+class Fallback:
+    """Answers checks while the storage backend is unavailable.
+
+    ``"open"`` allows every check and ``"closed"`` denies it, asking the
+    client to retry after ``retry_after`` seconds. ``"local"`` enforces each
+    limit in process memory, with its capacity and, for rate based
+    algorithms, its rate divided among ``replicas`` workers; limits are only
+    approximate while it is active, and its state is not merged back into
+    the backend.
+    """
+
+    def __init__(self, mode: FallbackMode, replicas: int = 1, retry_after: float = 1.0):
+        self.mode = mode
+        self.replicas = replicas
+        self.retry_after = retry_after
+        self.local = LocalService() if mode == "local" else None
+
+    async def evaluate(self, check: RateLimitCheck) -> Row:
+        if self.local is not None:
+            return await self.local._evaluate(self._share(check))
+        return self._fixed(check)
+
+    async def peek(self, check: RateLimitCheck) -> Row:
+        if self.local is not None:
+            return await self.local._peek(self._share(check))
+        return self._fixed(check)
+
+    async def reserve(self, check: RateLimitCheck, max_wait: float) -> Row:
+        if self.local is not None:
+            return await self.local._reserve(self._share(check), max_wait)
+        return self._fixed(check)
+
+    async def evaluate_many(self, checks: list[RateLimitCheck]) -> list[Row]:
+        if self.local is not None:
+            return await self.local._evaluate_many([self._share(c) for c in checks])
+        return [self._fixed(check) for check in checks]
+
+    async def evaluate_atomic(self, checks: list[RateLimitCheck]) -> list[Row]:
+        if self.local is not None:
+            return await self.local._evaluate_atomic([self._share(c) for c in checks])
+        return [self._fixed(check) for check in checks]
+
+    def _fixed(self, check: RateLimitCheck) -> Row:
+        if self.mode == "open":
+            return 1, math.floor(check.capacity - check.cost), 0.0, 0.0
+        return 0, 0, self.retry_after, self.retry_after
+
+    def _share(self, check: RateLimitCheck) -> RateLimitCheck:
+        share = split_check(check, self.replicas)
+        # never below the cost, so every valid check can still be allowed
+        return share._replace(capacity=max(check.cost, share.capacity))
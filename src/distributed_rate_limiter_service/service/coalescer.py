@@ -0,0 +1,70 @@
+from typing import Any, Sequence
+import asyncio
+
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+
+
+class Coalescer:
+    """Script calls from concurrent handlers, sent together in one pipeline.
+
+    A call waits until ``window`` seconds have passed since the first call of
+    its batch or ``max_batch`` calls are waiting, whichever comes first. With
+    a window of 0 a batch holds the calls made in the same event loop
+    iteration. Note that the event loop's timers only have millisecond
+    resolution on most platforms, so shorter windows round up.
+
+    Every call gets its own result or exception back; a failure of the
+    pipeline as a whole fails every call in it.
+    """
+
+    def __init__(
+        self, scripts: ScriptRegistry, window: float = 0.0002, max_batch: int = 64
+    ):
+        self.scripts = scripts
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def evalsha(self, name: str, keys: Sequence[Any], args: Sequence[Any]):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((name, keys, args), future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            if self.window:
+                self._timer = loop.call_later(self.window, self._flush)
+            else:
+                self._timer = loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # keep a reference so the task is not garbage collected
+            task = asyncio.ensure_future(self._send(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await self.scripts.evalsha_many(
+                (call for call, _ in batch), raise_on_error=False
+            )
+        except Exception as exc:
+            results = [exc] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            # the handler may have been cancelled in the meantime
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
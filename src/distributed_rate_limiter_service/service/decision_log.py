@@ -0,0 +1,122 @@
+from collections import deque
+from typing import Callable, Protocol
+import asyncio
+import json
+import logging
+import random
+import time
+
+from redis.asyncio import Redis, RedisCluster
+
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionSink(Protocol):
+    async def write(self, lines: list[str]): ...
+
+
+class FileSink:
+    """Appends decisions to a local file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def write(self, lines: list[str]):
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: list[str]):
+        with open(self.path, "a") as f:
+            f.writelines(line + "\n" for line in lines)
+
+
+class StreamSink:
+    """Adds decisions to a Redis Stream, trimmed to about ``maxlen`` entries."""
+
+    def __init__(self, redis: Redis | RedisCluster, stream: str, maxlen: int = 100_000):
+        self.redis = redis
+        self.stream = stream
+        self.maxlen = maxlen
+
+    async def write(self, lines: list[str]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for line in lines:
+                pipe.xadd(
+                    self.stream,
+                    {"decision": line},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+            await pipe.execute()
+
+
+class DecisionLog:
+    """A sample of rate limit decisions, written to ``sink`` in batches.
+
+    ``record`` only draws the sample and appends to a ring buffer of
+    ``buffer_size`` decisions, so it never waits on the sink; when the sink
+    falls behind the oldest decisions are dropped, counted in ``dropped`` and
+    reported to ``on_drop``. ``run`` flushes the buffer every
+    ``flush_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        sink: DecisionSink,
+        sample_rate: float = 0.01,
+        buffer_size: int = 10_000,
+        flush_interval: float = 1.0,
+        batch_size: int = 1000,
+        on_drop: Callable[[], None] | None = None,
+    ):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._buffer = deque(maxlen=buffer_size)
+
+    def record(self, check: RateLimitCheck, result: dict, shadow: bool = False):
+        if random.random() >= self.sample_rate:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+        # formatted when flushed, off the request path
+        self._buffer.append((time.time(), check, result, shadow))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write the decision log")
+
+    async def flush(self):
+        buffer = self._buffer
+        while buffer:
+            batch = [buffer.popleft() for _ in range(min(len(buffer), self.batch_size))]
+            try:
+                await self.sink.write([self._format(*entry) for entry in batch])
+            except asyncio.CancelledError:
+                # kept for the flush at shutdown, which follows a cancellation
+                buffer.extendleft(reversed(batch))
+                raise
+
+    @staticmethod
+    def _format(timestamp: float, check: RateLimitCheck, result: dict, shadow: bool):
+        return json.dumps(
+            {
+                "ts": timestamp,
+                **check._asdict(),
+                "allowed": result["allowed"],
+                "remaining": result["remaining"],
+                "retry_after": result["retry_after"],
+                "shadow": shadow,
+            },
+            separators=(",", ":"),
+        )
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import Hashable
+import time
+
+
+class DenyCache:
+    """Per-worker LRU of subjects known to be denied until a point in time.
+
+    Entries are only added from a Redis denial together with the exact time the
+    subject can be allowed again, so serving a cached denial never denies a
+    request Redis would have allowed. Expired entries are dropped lazily on
+    lookup and the least recently used entry is evicted once ``maxsize`` is
+    reached.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> tuple[float, float] | None:
+        """Return ``(retry_after, reset_after)`` of a cached denial, or ``None``."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        now = time.monotonic()
+        denied_until, reset_at = entry
+        if denied_until <= now:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return denied_until - now, reset_at - now
+
+    def deny(self, key: Hashable, retry_after: float, reset_after: float = 0.0):
+        if retry_after <= 0:
+            return
+
+        now = time.monotonic()
+        self._entries[key] = (now + retry_after, now + max(retry_after, reset_after))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Callable, Iterator
+import math
+import time
+
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck, Row
+
+
+class _Lease:
+    __slots__ = ("tokens", "remaining", "expires_at", "acquired_at", "used", "rate")
+
+    def __init__(self):
+        self.tokens = 0
+        self.used = 0
+        self.rate = 0.0
+
+
+class LeaseTable:
+    """Per-worker blocks of token bucket tokens reserved from Redis.
+
+    A lease holds tokens already taken out of the bucket in Redis, so spending
+    them locally can only delay when other workers see them consumed: across
+    the whole deployment at most ``max_size`` tokens per worker and subject
+    are admitted beyond what a single bucket would allow, and none once a
+    lease has been idle for ``ttl`` seconds.
+
+    Each renewal sizes the next block to the tokens the subject is expected to
+    use in ``ttl`` seconds, from a running average of its observed rate, so
+    cold subjects keep taking one request's worth at a time. The least
+    recently used lease is dropped once ``maxsize`` is reached; its tokens are
+    not returned, which can only under-admit.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100,
+        ttl: float = 1.0,
+        maxsize: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._leases: OrderedDict[tuple, _Lease] = OrderedDict()
+
+    def __len__(self):
+        return len(self._leases)
+
+    def spend(self, check: RateLimitCheck) -> Row | None:
+        """Allow ``check`` from its lease, or return ``None`` if it needs Redis."""
+        key = (check.subject, check.capacity, check.param)
+        lease = self._leases.get(key)
+        if lease is None or lease.tokens < check.cost:
+            return None
+        if lease.expires_at <= self.clock():
+            return None
+
+        self._leases.move_to_end(key)
+        lease.tokens -= check.cost
+        lease.used += check.cost
+        # what this worker last saw in Redis plus what it still holds
+        available = lease.remaining + lease.tokens
+        return 1, available, 0.0, (check.capacity - available) / check.param
+
+    def renew(self, check: RateLimitCheck) -> tuple[int, int]:
+        """Take back the unspent tokens of ``check``'s lease.
+
+        Returns ``(returned, size)``: the tokens to put back into the bucket
+        and how many to ask for in their place.
+        """
+        key = (check.subject, check.capacity, check.param)
+        lease = self._leases.get(key)
+        if lease is None:
+            return 0, check.cost
+
+        returned, lease.tokens = lease.tokens, 0
+        now = self.clock()
+        rate = lease.used / max(now - lease.acquired_at, 1e-6)
+        if lease.expires_at <= now:
+            # the subject went quiet, so earlier rates no longer apply
+            lease.rate = rate
+        else:
+            lease.rate = (lease.rate + rate) / 2
+        size = math.ceil(lease.rate * self.ttl)
+        return returned, min(self.max_size, max(check.cost, size))
+
+    def grant(self, check: RateLimitCheck, granted: int, remaining: int):
+        """Record ``granted`` tokens from Redis, ``check.cost`` of them spent."""
+        key = (check.subject, check.capacity, check.param)
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = self._leases[key] = _Lease()
+            if len(self._leases) > self.maxsize:
+                self._leases.popitem(last=False)
+        self._leases.move_to_end(key)
+
+        now = self.clock()
+        lease.tokens += granted - check.cost
+        lease.remaining = remaining
+        lease.expires_at = now + self.ttl
+        lease.acquired_at = now
+        lease.used = check.cost
+
+    def drain(self) -> Iterator[tuple[RateLimitCheck, int]]:
+        """Empty the table, yielding every lease that still holds tokens."""
+        leases, self._leases = self._leases, OrderedDict()
+        for (subject, capacity, param), lease in leases.items():
+            if lease.tokens:
+                check = RateLimitCheck("token_bucket", subject, capacity, param)
+                yield check, lease.tokens
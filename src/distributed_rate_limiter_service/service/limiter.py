@@ -0,0 +1,362 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Iterable, Mapping, NamedTuple
+import asyncio
+import math
+import time
+
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+
+if TYPE_CHECKING:
+    from distributed_rate_limiter_service.service.decision_log import DecisionLog
+    from distributed_rate_limiter_service.service.metrics import Metrics
+    from distributed_rate_limiter_service.service.policies import (
+        CompositePolicy,
+        Policy,
+    )
+
+
+class RateLimitCheck(NamedTuple):
+    algorithm: str
+    subject: str
+    capacity: float
+    # refill_rate (also the GCRA rate), leak_rate or window_size, depending on
+    # the algorithm
+    param: float
+    # units consumed by this request, e.g. bytes or compute units
+    cost: int = 1
+
+
+# Name of the request field holding each algorithm's ``param``
+PARAM_NAMES = {
+    "token_bucket": "refill_rate",
+    "leaky_bucket": "leak_rate",
+    "sliding_window": "window_size",
+    "sliding_window_counter": "window_size",
+    "gcra": "refill_rate",
+}
+
+ALGORITHMS = tuple(PARAM_NAMES)
+
+# Algorithms whose ``param`` is a rate rather than a duration
+RATE_ALGORITHMS = frozenset({"token_bucket", "leaky_bucket", "gcra"})
+
+# Algorithms that can hand out units ahead of time, see ``acquire``
+RESERVABLE_ALGORITHMS = ("token_bucket", "leaky_bucket")
+
+# ``allowed, remaining, retry_after, reset_after`` as returned by a backend;
+# the Redis scripts return the two durations as strings.
+Row = tuple[int, int, float | str, float | str]
+
+
+def split_check(check: RateLimitCheck, parts: int) -> RateLimitCheck:
+    """``check`` against one of ``parts`` equal shares of its limit."""
+    param = check.param
+    if check.algorithm in RATE_ALGORITHMS:
+        param /= parts
+    return check._replace(capacity=check.capacity / parts, param=param)
+
+
+class RateLimiter(ABC):
+    """Rate limit checks on top of a storage backend.
+
+    Validation, the deny cache, metrics and the decision log are handled
+    here, so a backend only evaluates the checks that could not be answered
+    locally.
+    """
+
+    def __init__(
+        self,
+        deny_cache: DenyCache | None = None,
+        metrics: "Metrics | None" = None,
+        decision_log: "DecisionLog | None" = None,
+    ):
+        self.deny_cache = deny_cache
+        self.metrics = metrics
+        self.decision_log = decision_log
+
+    @property
+    def fallback_mode(self) -> str | None:
+        """How checks are answered while the backend is unavailable, if so."""
+        return None
+
+    async def check(self, check: RateLimitCheck):
+        return await self._check(RateLimitCheck(*check))
+
+    async def peek(self, check: RateLimitCheck):
+        """What ``check`` would return right now, without consuming anything.
+
+        Backs shadow checks: a new limit evaluated against the state the
+        enforced limit of the same algorithm and subject builds up. The deny
+        cache is neither read nor written, and the decision is not counted
+        in the metrics.
+        """
+        check = RateLimitCheck(*check)
+        self._validate(check)
+        allowed, remaining, retry_after, reset_after = await self._peek(check)
+        result = {
+            "allowed": bool(allowed),
+            "remaining": remaining,
+            "retry_after": float(retry_after),
+            "reset_after": float(reset_after),
+        }
+        if self.decision_log is not None:
+            self.decision_log.record(check, result, shadow=True)
+        return result
+
+    async def check_token_bucket(
+        self, subject: str, capacity: float, refill_rate: float, cost: int = 1
+    ):
+        return await self._check(
+            RateLimitCheck("token_bucket", subject, capacity, refill_rate, cost)
+        )
+
+    async def check_leaky_bucket(
+        self, subject: str, capacity: float, leak_rate: float, cost: int = 1
+    ):
+        return await self._check(
+            RateLimitCheck("leaky_bucket", subject, capacity, leak_rate, cost)
+        )
+
+    async def check_sliding_window(
+        self, subject: str, capacity: float, window_size: float, cost: int = 1
+    ):
+        return await self._check(
+            RateLimitCheck("sliding_window", subject, capacity, window_size, cost)
+        )
+
+    async def check_sliding_window_counter(
+        self, subject: str, capacity: float, window_size: float, cost: int = 1
+    ):
+        return await self._check(
+            RateLimitCheck(
+                "sliding_window_counter", subject, capacity, window_size, cost
+            )
+        )
+
+    async def check_gcra(
+        self, subject: str, capacity: float, rate: float, cost: int = 1
+    ):
+        return await self._check(RateLimitCheck("gcra", subject, capacity, rate, cost))
+
+    async def check_policy(self, policy: "Policy", subject: str, cost: int = 1):
+        return await self._check(
+            RateLimitCheck(
+                policy.algorithm, subject, policy.capacity, policy.param, cost
+            )
+        )
+
+    async def check_composite(
+        self,
+        composite: "CompositePolicy",
+        subjects: Mapping[str, str],
+        cost: int = 1,
+    ):
+        """Check every level of ``composite`` in one atomic evaluation.
+
+        ``cost`` is consumed at every level or, if any level denies, at none.
+        The summary reports the tightest ``remaining`` and the longest wait of
+        the levels that were evaluated; ``results`` has one entry per level.
+        """
+        batch = await self.check_many(
+            composite.checks(subjects, cost), all_or_nothing=True
+        )
+        evaluated = [result for result in batch["results"] if result is not None]
+        denied = [result for result in evaluated if not result["allowed"]]
+        return {
+            "allowed": batch["allowed"],
+            "remaining": min(result["remaining"] for result in evaluated),
+            "retry_after": max(
+                (result["retry_after"] for result in denied), default=0.0
+            ),
+            "reset_after": max(result["reset_after"] for result in evaluated),
+            "results": batch["results"],
+        }
+
+    async def acquire(self, check: RateLimitCheck, timeout: float, wait: bool = True):
+        """Reserve ``check.cost`` units that are available within ``timeout``.
+
+        A reservation takes the units right away, possibly ahead of time, and
+        reports in ``wait`` how long the caller has to wait before using them;
+        later requests queue up behind it in the bucket itself, so callers are
+        served in the order they reserved. With ``wait`` this call sleeps
+        until then before returning. If the units are not available within
+        ``timeout`` nothing is reserved and ``retry_after`` is the time after
+        which the same request would fit.
+        """
+        check = RateLimitCheck(*check)
+        self._validate(check)
+        if check.algorithm not in RESERVABLE_ALGORITHMS:
+            raise ValueError(f"{check.algorithm} does not support reservations")
+
+        # the deny cache is skipped, as a denied check may still be reservable
+        start = time.perf_counter()
+        allowed, remaining, delay, reset_after = await self._reserve(check, timeout)
+        self._observe_script(check.algorithm, start)
+
+        retry_after = 0.0 if allowed else delay
+        result = self._result(check, allowed, remaining, retry_after, reset_after)
+        result["wait"] = float(delay) if allowed else 0.0
+        if wait and result["wait"] > 0:
+            await asyncio.sleep(result["wait"])
+            result["reset_after"] = max(0.0, result["reset_after"] - result["wait"])
+        return result
+
+    async def check_many(
+        self, checks: Iterable[RateLimitCheck], all_or_nothing: bool = False
+    ):
+        """Evaluate several checks together.
+
+        By default every check is evaluated on its own. With
+        ``all_or_nothing`` the checks are evaluated atomically and nothing is
+        consumed unless every check allows; if the deny cache already knows
+        one of them is denied, the others are reported as ``None``.
+        """
+        checks = [RateLimitCheck(*check) for check in checks]
+        for check in checks:
+            self._validate(check)
+
+        if not checks:
+            return {"allowed": True, "results": []}
+
+        if all_or_nothing:
+            self._validate_atomic(checks)
+
+        results = [self._cached_denial(check) for check in checks]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        if all_or_nothing and len(pending) < len(checks):
+            # A known denial fails the whole batch, so the backend is not
+            # consulted and the remaining checks are left unevaluated.
+            return {"allowed": False, "results": results}
+
+        start = time.perf_counter()
+        if all_or_nothing:
+            rows = await self._evaluate_atomic(checks)
+            self._observe_script("batch_atomic", start)
+        elif pending:
+            rows = await self._evaluate_many([checks[i] for i in pending])
+            self._observe_script("batch", start)
+        else:
+            rows = []
+
+        for i, row in zip(pending, rows):
+            results[i] = self._result(checks[i], *row)
+
+        return {
+            "allowed": all(result["allowed"] for result in results),
+            "results": results,
+        }
+
+    @abstractmethod
+    async def memory_usage(self) -> dict[str, dict[str, int]]:
+        """Number of stored keys and their estimated bytes, per algorithm."""
+
+    @abstractmethod
+    async def _evaluate(self, check: RateLimitCheck) -> Row:
+        """Evaluate one check, consuming ``cost`` when it is allowed."""
+
+    @abstractmethod
+    async def _reserve(self, check: RateLimitCheck, max_wait: float) -> Row:
+        """Reserve ``cost`` if it is available within ``max_wait`` seconds.
+
+        Allowed rows carry the wait for the reserved units in place of
+        ``retry_after``.
+        """
+
+    @abstractmethod
+    async def _peek(self, check: RateLimitCheck) -> Row:
+        """Evaluate one check without writing any state."""
+
+    @abstractmethod
+    async def _evaluate_many(self, checks: list[RateLimitCheck]) -> list[Row]:
+        """Evaluate independent checks, one row per check."""
+
+    @abstractmethod
+    async def _evaluate_atomic(self, checks: list[RateLimitCheck]) -> list[Row]:
+        """Evaluate checks, consuming nothing unless every one allows.
+
+        Allowed rows of a denied batch report what is still available.
+        """
+
+    async def _check(self, check: RateLimitCheck):
+        self._validate(check)
+        cached = self._cached_denial(check)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        row = await self._evaluate(check)
+        self._observe_script(check.algorithm, start)
+        return self._result(check, *row)
+
+    @staticmethod
+    def _validate(check: RateLimitCheck):
+        if check.algorithm not in PARAM_NAMES:
+            raise ValueError(f"unknown algorithm: {check.algorithm}")
+        # NaN and infinity would reach the scripts and the response bodies
+        if not (math.isfinite(check.param) and check.param > 0):
+            name = PARAM_NAMES[check.algorithm]
+            raise ValueError(f"{name} must be a positive finite number")
+        if not (math.isfinite(check.capacity) and check.capacity > 0):
+            raise ValueError("capacity must be a positive finite number")
+        if not 0 < check.cost <= check.capacity:
+            # such a request could never be allowed
+            raise ValueError("cost must be between 1 and capacity")
+
+    def _validate_atomic(self, checks: list[RateLimitCheck]):
+        subjects = {(check.algorithm, check.subject) for check in checks}
+        if len(subjects) != len(checks):
+            raise ValueError("all_or_nothing checks must not repeat a subject")
+
+    def _observe_script(self, name: str, start: float):
+        if self.metrics is not None:
+            self.metrics.script_latency[name].observe(time.perf_counter() - start)
+
+    def _cached_denial(self, check: RateLimitCheck):
+        if self.deny_cache is None:
+            return None
+
+        cached = self.deny_cache.get(check)
+        if cached is None:
+            return None
+
+        if self.metrics is not None:
+            self.metrics.deny_cache_hits[check.algorithm].inc()
+            self.metrics.denied[check.algorithm].inc()
+
+        retry_after, reset_after = cached
+        result = {
+            "allowed": False,
+            "remaining": 0,
+            "retry_after": retry_after,
+            "reset_after": reset_after,
+        }
+        if self.decision_log is not None:
+            self.decision_log.record(check, result)
+        return result
+
+    def _result(
+        self,
+        check: RateLimitCheck,
+        allowed: int,
+        remaining: int,
+        retry_after: float | str,
+        reset_after: float | str,
+    ):
+        retry_after = float(retry_after)
+        reset_after = float(reset_after)
+        if self.deny_cache is not None and not allowed:
+            self.deny_cache.deny(check, retry_after, reset_after)
+        if self.metrics is not None:
+            decisions = self.metrics.allowed if allowed else self.metrics.denied
+            decisions[check.algorithm].inc()
+
+        result = {
+            "allowed": bool(allowed),
+            "remaining": remaining,
+            "retry_after": retry_after,
+            "reset_after": reset_after,
+        }
+        if self.decision_log is not None:
+            self.decision_log.record(check, result)
+        return result
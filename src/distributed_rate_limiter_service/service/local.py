@@ -0,0 +1,343 @@
+from collections import deque
+from itertools import islice
+from typing import TYPE_CHECKING, Callable
+import heapq
+import math
+import sys
+import time
+
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.limiter import (
+    RateLimitCheck,
+    RateLimiter,
+    Row,
+)
+
+if TYPE_CHECKING:
+    from distributed_rate_limiter_service.service.decision_log import DecisionLog
+    from distributed_rate_limiter_service.service.metrics import Metrics
+
+
+# State per key. ``expires_at`` is when the state becomes indistinguishable
+# from a key that was never seen (a full bucket, an empty window, ...), which
+# is when the sweep may drop it.
+class _Bucket:
+    __slots__ = ("level", "updated", "expires_at")
+
+
+class _Window:
+    __slots__ = ("units", "count", "expires_at")
+
+    def __init__(self):
+        # ``(timestamp, cost)`` of every admitted request, oldest first
+        self.units = deque()
+        self.count = 0
+
+
+class _Counter:
+    __slots__ = ("window", "current", "previous", "expires_at")
+
+
+class _Tat:
+    __slots__ = ("tat", "expires_at")
+
+
+class LocalService(RateLimiter):
+    """Rate limiter keeping its state in process memory.
+
+    The algorithms mirror the Lua scripts of ``RedisService`` on a monotonic
+    clock, for single-node deployments and tests that should not need Redis.
+    Limits are per process, so replicas do not share them.
+
+    Every check runs to completion without yielding to the event loop, which
+    makes it atomic for asyncio callers without any locking. Expired state is
+    treated as absent when it is read and dropped by a sweep that removes at
+    most ``sweep_limit`` keys per call.
+    """
+
+    def __init__(
+        self,
+        deny_cache: DenyCache | None = None,
+        metrics: "Metrics | None" = None,
+        sweep_limit: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+        decision_log: "DecisionLog | None" = None,
+    ):
+        super().__init__(deny_cache, metrics, decision_log)
+        self.sweep_limit = sweep_limit
+        self.clock = clock
+        self._state = {}
+        # ``(expires_at, key)``, one entry per stored key; an entry can be
+        # older than the key's current expiry, which the sweep checks
+        self._expiry = []
+        self._algorithms = {
+            "token_bucket": self._token_bucket,
+            "leaky_bucket": self._leaky_bucket,
+            "sliding_window": self._sliding_window,
+            "sliding_window_counter": self._sliding_window_counter,
+            "gcra": self._gcra,
+        }
+
+    def __len__(self):
+        return len(self._state)
+
+    async def memory_usage(self):
+        report = {name: {"keys": 0, "bytes": 0} for name in self._algorithms}
+        for (algorithm, subject), state in self._state.items():
+            size = sys.getsizeof(subject) + sys.getsizeof(state)
+            if isinstance(state, _Window):
+                size += sys.getsizeof(state.units)
+                size += sum(sys.getsizeof(unit) for unit in state.units)
+            report[algorithm]["keys"] += 1
+            report[algorithm]["bytes"] += size
+        return report
+
+    async def _evaluate(self, check: RateLimitCheck) -> Row:
+        now = self.clock()
+        self._sweep(now)
+        allowed, remaining, retry_after, reset_after, commit = self._run(check, now)
+        if allowed:
+            commit()
+        return allowed, remaining, retry_after, reset_after
+
+    async def _reserve(self, check: RateLimitCheck, max_wait: float) -> Row:
+        now = self.clock()
+        self._sweep(now)
+        allowed, remaining, wait, reset_after, commit = self._algorithms[
+            check.algorithm
+        ](
+            (check.algorithm, check.subject),
+            now,
+            check.capacity,
+            check.param,
+            check.cost,
+            max_wait,
+        )
+        if allowed:
+            commit()
+        return allowed, remaining, wait, reset_after
+
+    async def _peek(self, check: RateLimitCheck) -> Row:
+        allowed, remaining, retry_after, reset_after, _ = self._run(check, self.clock())
+        return allowed, remaining, retry_after, reset_after
+
+    async def _evaluate_many(self, checks: list[RateLimitCheck]) -> list[Row]:
+        return [await self._evaluate(check) for check in checks]
+
+    async def _evaluate_atomic(self, checks: list[RateLimitCheck]) -> list[Row]:
+        now = self.clock()
+        self._sweep(now)
+        evaluated = [self._run(check, now) for check in checks]
+
+        if all(allowed for allowed, *_ in evaluated):
+            for *_, commit in evaluated:
+                commit()
+            return [row for *row, _ in evaluated]
+
+        # nothing was consumed, so report what is still available
+        return [
+            (allowed, remaining + check.cost if allowed else remaining, retry, reset)
+            for check, (allowed, remaining, retry, reset, _) in zip(checks, evaluated)
+        ]
+
+    def _run(self, check: RateLimitCheck, now: float):
+        return self._algorithms[check.algorithm](
+            (check.algorithm, check.subject),
+            now,
+            check.capacity,
+            check.param,
+            check.cost,
+        )
+
+    def _sweep(self, now: float):
+        expiry = self._expiry
+        for _ in range(self.sweep_limit):
+            if not expiry or expiry[0][0] > now:
+                return
+            _, key = heapq.heappop(expiry)
+            state = self._state[key]
+            if state.expires_at <= now:
+                del self._state[key]
+            else:
+                heapq.heappush(expiry, (state.expires_at, key))
+
+    def _live(self, key, now: float):
+        state = self._state.get(key)
+        if state is None or state.expires_at <= now:
+            return None
+        return state
+
+    def _store(self, key, state_type, expires_at: float):
+        # Expired state is reused rather than deleted, so every stored key
+        # keeps exactly one entry in the expiry heap.
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = state_type()
+            heapq.heappush(self._expiry, (expires_at, key))
+        state.expires_at = expires_at
+        return state
+
+    # The bucket algorithms take ``max_wait`` for reservations, like the Lua
+    # functions: within it, units are taken ahead of time and the third value
+    # is the wait instead of ``retry_after``.
+    def _token_bucket(self, key, now, capacity, refill_rate, cost, max_wait=0.0):
+        state = self._live(key, now)
+        if state is None:
+            tokens = capacity
+        else:
+            elapsed = now - state.updated
+            tokens = min(capacity, state.level + elapsed * refill_rate)
+
+        wait = (cost - tokens) / refill_rate
+        if wait > max_wait:
+            reset_after = (capacity - tokens) / refill_rate
+            remaining = max(0, math.floor(tokens))
+            return 0, remaining, wait - max_wait, reset_after, None
+
+        tokens -= cost
+        reset_after = (capacity - tokens) / refill_rate
+
+        def commit():
+            state = self._store(key, _Bucket, now + reset_after)
+            state.level = tokens
+            state.updated = now
+
+        return 1, max(0, math.floor(tokens)), max(0.0, wait), reset_after, commit
+
+    def _leaky_bucket(self, key, now, capacity, leak_rate, cost, max_wait=0.0):
+        state = self._live(key, now)
+        if state is None:
+            water_level = 0
+        else:
+            leaked = (now - state.updated) * leak_rate
+            water_level = max(0, state.level - leaked)
+
+        wait = (water_level + cost - capacity) / leak_rate
+        if wait > max_wait:
+            remaining = max(0, math.floor(capacity - water_level))
+            return 0, remaining, wait - max_wait, water_level / leak_rate, None
+
+        water_level += cost
+        reset_after = water_level / leak_rate
+
+        def commit():
+            state = self._store(key, _Bucket, now + reset_after)
+            state.level = water_level
+            state.updated = now
+
+        remaining = max(0, math.floor(capacity - water_level))
+        return 1, remaining, max(0.0, wait), reset_after, commit
+
+    def _sliding_window(self, key, now, capacity, window_size, cost):
+        state = self._live(key, now)
+        count = 0
+        expired = 0
+        if state is not None:
+            # expired units are only dropped on commit, so that a check with
+            # a shorter window leaves the state as it was
+            count = state.count
+            for timestamp, unit_cost in state.units:
+                if timestamp > now - window_size:
+                    break
+                count -= unit_cost
+                expired += 1
+
+        if count + cost > capacity:
+            # allowed again once enough of the oldest units leave the window
+            offset = max(0, count - math.floor(capacity - cost) - 1)
+            for timestamp, unit_cost in islice(state.units, expired, None):
+                offset -= unit_cost
+                if offset < 0:
+                    break
+            retry_after = timestamp + window_size - now
+            reset_after = state.units[-1][0] + window_size - now
+            return (
+                0,
+                max(0, math.floor(capacity - count)),
+                retry_after,
+                reset_after,
+                None,
+            )
+
+        def commit():
+            state = self._store(key, _Window, now + window_size)
+            units = state.units
+            # expired state is reused with whatever was left in it
+            while units and units[0][0] <= now - window_size:
+                state.count -= units.popleft()[1]
+            units.append((now, cost))
+            state.count += cost
+
+        return 1, math.floor(capacity - count - cost), 0.0, window_size, commit
+
+    def _sliding_window_counter(self, key, now, capacity, window_size, cost):
+        # The monotonic clock never runs behind the stored window, so unlike
+        # the Lua version there is no lagging-caller case.
+        window = math.floor(now / window_size)
+        state = self._live(key, now)
+        current = previous = 0
+        if state is not None:
+            if state.window == window:
+                current, previous = state.current, state.previous
+            elif state.window == window - 1:
+                previous = state.current
+
+        elapsed = now - window * window_size
+
+        # the count only reaches zero once every counted window has slid past
+        def reset_after(current, previous):
+            if current > 0:
+                return (window + 2) * window_size - now
+            elif previous > 0:
+                return (window + 1) * window_size - now
+            return 0.0
+
+        count = previous * (1 - elapsed / window_size) + current
+
+        if count + cost > capacity:
+            if current + cost <= capacity:
+                retry_after = (
+                    window_size * (1 - (capacity - cost - current) / previous) - elapsed
+                )
+            else:
+                # nothing frees up before the next window starts
+                retry_after = (
+                    window_size
+                    - elapsed
+                    + max(0, window_size * (1 - (capacity - cost) / current))
+                )
+            remaining = max(0, math.floor(capacity - count))
+            return 0, remaining, retry_after, reset_after(current, previous), None
+
+        current += cost
+        remaining = math.floor(capacity - count - cost)
+
+        def commit():
+            state = self._store(key, _Counter, (window + 2) * window_size)
+            state.window = window
+            state.current = current
+            state.previous = previous
+
+        return 1, remaining, 0.0, reset_after(current, previous), commit
+
+    def _gcra(self, key, now, capacity, rate, cost):
+        emission_interval = 1 / rate
+        tolerance = capacity * emission_interval
+
+        state = self._live(key, now)
+        tat = now if state is None else max(state.tat, now)
+
+        new_tat = tat + cost * emission_interval
+        allow_at = new_tat - tolerance
+
+        if now < allow_at:
+            available = math.floor((tolerance - (tat - now)) / emission_interval + 1e-9)
+            return 0, available, allow_at - now, tat - now, None
+
+        remaining = math.floor((tolerance - (new_tat - now)) / emission_interval + 1e-9)
+
+        def commit():
+            state = self._store(key, _Tat, new_tat)
+            state.tat = new_tat
+
+        return 1, remaining, 0.0, new_tat - now, commit
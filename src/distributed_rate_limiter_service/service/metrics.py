@@ -0,0 +1,156 @@
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+from redis.asyncio import Redis, RedisCluster
+import asyncio
+import os
+
+from distributed_rate_limiter_service.service.limiter import ALGORITHMS
+
+# Sub-millisecond resolution for script round trips; prometheus_client's
+# defaults start at 5ms.
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+
+# Label values for calls that are not a single algorithm
+BATCH = "batch"
+BATCH_ATOMIC = "batch_atomic"
+POLICY = "policy"
+COMPOSITE = "composite"
+ACQUIRE = "acquire"
+
+
+class Metrics:
+    """Prometheus metrics for the service.
+
+    Label children are bound once up front, so recording a sample on the hot
+    path is a dictionary lookup plus the observation itself.
+
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set, as the multi-worker launcher
+    does, prometheus_client writes every worker's samples to files there and
+    ``render`` reports the sum over all workers, whichever worker is
+    scraped. The pool gauges then count the live workers' connections and
+    are refreshed by ``watch_pool`` rather than read at scrape time.
+    """
+
+    def __init__(self, registry: CollectorRegistry | None = None):
+        self.registry = registry or CollectorRegistry()
+        self.multiprocess = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+        self._pool = None
+
+        script_latency = Histogram(
+            "rate_limiter_script_duration_seconds",
+            "Time spent evaluating checks in the limiter backend.",
+            ["algorithm"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        handler_latency = Histogram(
+            "rate_limiter_handler_duration_seconds",
+            "End-to-end time spent in rate limit check handlers.",
+            ["algorithm"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        decisions = Counter(
+            "rate_limiter_decisions_total",
+            "Rate limit decisions.",
+            ["algorithm", "decision"],
+            registry=self.registry,
+        )
+        deny_cache_hits = Counter(
+            "rate_limiter_deny_cache_hits_total",
+            "Denials answered from the local deny cache without Redis.",
+            ["algorithm"],
+            registry=self.registry,
+        )
+        self.noscript_reloads = Counter(
+            "rate_limiter_noscript_reloads_total",
+            "Script reloads triggered by NOSCRIPT replies.",
+            registry=self.registry,
+        )
+        self.fallbacks = Counter(
+            "rate_limiter_fallback_calls_total",
+            "Backend calls answered by the fallback while Redis was unavailable.",
+            registry=self.registry,
+        )
+        self.decisions_dropped = Counter(
+            "rate_limiter_decision_log_dropped_total",
+            "Sampled decisions dropped because the decision log fell behind.",
+            registry=self.registry,
+        )
+        self.pool_in_use = Gauge(
+            "rate_limiter_redis_pool_in_use_connections",
+            "Redis connections currently checked out of the pool.",
+            registry=self.registry,
+            multiprocess_mode="livesum",
+        )
+        self.pool_max = Gauge(
+            "rate_limiter_redis_pool_max_connections",
+            "Size limit of the Redis connection pool.",
+            registry=self.registry,
+            multiprocess_mode="livesum",
+        )
+
+        algorithms = list(ALGORITHMS)
+        self.script_latency = {
+            name: script_latency.labels(name)
+            for name in algorithms + [BATCH, BATCH_ATOMIC]
+        }
+        self.handler_latency = {
+            name: handler_latency.labels(name)
+            for name in algorithms + [BATCH, POLICY, COMPOSITE, ACQUIRE]
+        }
+        self.allowed = {name: decisions.labels(name, "allowed") for name in algorithms}
+        self.denied = {name: decisions.labels(name, "denied") for name in algorithms}
+        self.deny_cache_hits = {
+            name: deny_cache_hits.labels(name) for name in algorithms
+        }
+
+    def track_pool(self, redis: Redis | RedisCluster):
+        """Report pool usage of ``redis``, read only when metrics are scraped."""
+        if isinstance(redis, RedisCluster):
+            # every node has its own pool
+            return
+
+        pool = redis.connection_pool
+        if self.multiprocess:
+            # a function would only be called in the scraped worker
+            self._pool = pool
+            self.pool_max.set(pool.max_connections)
+            return
+        self.pool_in_use.set_function(lambda: len(pool._in_use_connections))
+        self.pool_max.set_function(lambda: pool.max_connections)
+
+    async def watch_pool(self, interval: float = 1.0):
+        """Write the pool usage for other workers' scrapes, in multiprocess mode."""
+        if self._pool is None:
+            return
+        while True:
+            self.pool_in_use.set(len(self._pool._in_use_connections))
+            await asyncio.sleep(interval)
+
+    def render(self) -> tuple[bytes, str]:
+        if self.multiprocess:
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+            return generate_latest(registry), CONTENT_TYPE_LATEST
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
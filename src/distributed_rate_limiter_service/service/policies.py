@@ -0,0 +1,135 @@
+from typing import Mapping, NamedTuple
+import asyncio
+import json
+import logging
+import os
+import string
+
+from pydantic import TypeAdapter
+
+from distributed_rate_limiter_service.core.models import (
+    CompositePolicyConfig,
+    PolicyConfig,
+)
+from distributed_rate_limiter_service.service.limiter import (
+    PARAM_NAMES,
+    RateLimitCheck,
+)
+
+logger = logging.getLogger(__name__)
+
+_POLICY_FILE = TypeAdapter(dict[str, PolicyConfig | CompositePolicyConfig])
+
+
+class Policy(NamedTuple):
+    """A named limit, resolved to the arguments its script takes."""
+
+    name: str
+    algorithm: str
+    capacity: int
+    param: float
+
+
+def compile_policy(name: str, config: PolicyConfig) -> Policy:
+    param = getattr(config, PARAM_NAMES[config.algorithm])
+    if not param:
+        raise ValueError(f"policy {name!r}: {PARAM_NAMES[config.algorithm]} not found")
+    return Policy(name, config.algorithm, config.capacity, param)
+
+
+class CompositePolicy(NamedTuple):
+    """Policies that must all allow a request, each on its own subject."""
+
+    name: str
+    # ``(policy, subject template)`` per level
+    levels: tuple[tuple[Policy, str], ...]
+
+    def checks(self, subjects: Mapping[str, str], cost: int = 1):
+        try:
+            return [
+                RateLimitCheck(
+                    policy.algorithm,
+                    template.format_map(subjects),
+                    policy.capacity,
+                    policy.param,
+                    cost,
+                )
+                for policy, template in self.levels
+            ]
+        except KeyError as exc:
+            raise ValueError(f"subject {exc.args[0]!r} not found") from None
+
+
+def compile_composite(name: str, config: CompositePolicyConfig) -> CompositePolicy:
+    if not config.levels:
+        raise ValueError(f"policy {name!r}: no levels")
+
+    levels = []
+    for i, level in enumerate(config.levels):
+        for _, field, spec, conversion in string.Formatter().parse(level.subject):
+            # only plain names, so a template cannot reach into attributes
+            if field is not None and (not field.isidentifier() or spec or conversion):
+                raise ValueError(f"policy {name!r}: invalid subject {level.subject!r}")
+        levels.append((compile_policy(f"{name}[{i}]", level), level.subject))
+    return CompositePolicy(name, tuple(levels))
+
+
+class PolicyRegistry:
+    """Named policies from settings, optionally overlaid by a JSON file.
+
+    The file maps policy names to ``PolicyConfig`` or ``CompositePolicyConfig``
+    objects. It is validated and compiled once per change, and an invalid file
+    keeps the previous policies in place.
+    """
+
+    def __init__(
+        self,
+        policies: Mapping[str, PolicyConfig | CompositePolicyConfig] | None = None,
+        path: str | None = None,
+    ):
+        self.configs = dict(policies or {})
+        self.path = path
+        self.policies: dict[str, Policy] = {}
+        self.composites: dict[str, CompositePolicy] = {}
+        self._mtime: int | None = None
+        self.load()
+
+    def get(self, name: str) -> Policy | None:
+        return self.policies.get(name)
+
+    def get_composite(self, name: str) -> CompositePolicy | None:
+        return self.composites.get(name)
+
+    def load(self):
+        configs = dict(self.configs)
+        if self.path is not None:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                configs.update(_POLICY_FILE.validate_python(json.load(f)))
+            self._mtime = mtime
+
+        policies, composites = {}, {}
+        for name, config in configs.items():
+            if isinstance(config, CompositePolicyConfig):
+                composites[name] = compile_composite(name, config)
+            else:
+                policies[name] = compile_policy(name, config)
+        self.policies, self.composites = policies, composites
+
+    def reload_if_changed(self) -> bool:
+        if self.path is None:
+            return False
+
+        try:
+            if os.stat(self.path).st_mtime_ns == self._mtime:
+                return False
+            self.load()
+        except (OSError, ValueError):
+            logger.exception("failed to reload policies from %s", self.path)
+            return False
+        return True
+
+    async def watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
@@ -1,144 +1,1076 @@
-from redis.asyncio import Redis
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Literal
+
+from redis.asyncio import Redis, RedisCluster
+from redis.crc import key_slot
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+import asyncio
+import logging
+import math
+import random
+import struct
 import time
 
-CHECK_TOKEN_BUCKET_SCRIPT = """
-local key = KEYS[1]
+from distributed_rate_limiter_service.service.breaker import (
+    CLOSED,
+    CircuitBreaker,
+    CircuitOpenError,
+    Fallback,
+)
+from distributed_rate_limiter_service.service.coalescer import Coalescer
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.lease import LeaseTable
+from distributed_rate_limiter_service.service.limiter import (
+    RateLimitCheck,
+    RateLimiter,
+    Row,
+    split_check,
+)
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+from distributed_rate_limiter_service.service.shards import HotKeys
 
-local capacity = tonumber(ARGV[1])
-local refill_rate = tonumber(ARGV[2])
-local now = tonumber(ARGV[3])
+if TYPE_CHECKING:
+    from distributed_rate_limiter_service.service.decision_log import DecisionLog
+    from distributed_rate_limiter_service.service.metrics import Metrics
 
-local data = redis.call("HGETALL" , key)
+logger = logging.getLogger(__name__)
 
-local tokens = nil
-local last_refill = nil
+# Bucket and counter state is a single string of packed little-endian doubles
+# (see STATE_FIELDS) that expires once it is no longer needed, i.e. when the
+# limit is back to full capacity. Keys written as hashes by earlier versions
+# are still read and are replaced on their next write.
+STATE_LUA = """
+local function load_state(key, ...)
+    local n = select("#", ...)
+    local raw = redis.pcall("GET", key)
+    if type(raw) == "table" and raw.err then
+        local fields = redis.call("HMGET", key, ...)
+        for i = 1, n do
+            fields[i] = tonumber(fields[i])
+        end
+        return unpack(fields, 1, n)
+    end
+    if not raw then
+        return nil
+    end
+    return struct.unpack("<" .. string.rep("d", n), raw)
+end
 
-for i = 1, #data, 2 do
-    if data[i] == "tokens" then
-        tokens = tonumber(data[i+1])
-    elseif data[i] == "last_refill_ts" then
-        last_refill = tonumber(data[i+1])
+local function save_state(key, ttl, ...)
+    local ttl_ms = math.ceil(ttl * 1000)
+    if ttl_ms <= 0 then
+        redis.call("DEL", key)
+        return
     end
+    local values = {...}
+    local packed = struct.pack("<" .. string.rep("d", #values), unpack(values))
+    redis.call("SET", key, packed, "PX", ttl_ms)
 end
+"""
 
-local new_tokens
-local elapsed_ts
+# Each algorithm is a Lua function that inspects the current state of a key for
+# a request of ``cost`` units and returns ``allowed, remaining, retry_after,
+# reset_after, commit``. ``remaining`` is the number of whole units left after
+# the request (or still available when it is denied), ``retry_after`` the
+# number of seconds until a denied request could be allowed and
+# ``reset_after`` the number of seconds until the limit is back to full
+# capacity. Nothing is written until ``commit()`` is called, so the same
+# functions back the single-key scripts and the atomic batch script below.
+#
+# The bucket functions also take ``max_wait``: a request that would be allowed
+# within that many seconds reserves its units right away, which may leave the
+# bucket in debt for later requests to wait out, and gets the wait as its
+# third return value instead.
+TOKEN_BUCKET_LUA = """
+local function token_bucket(key, now, capacity, refill_rate, cost, max_wait)
+    local tokens, last_refill = load_state(key, "tokens", "last_refill_ts")
 
-if tokens == nil or last_refill == nil then
-    new_tokens = capacity
-else
-    elapsed_ts = now - last_refill
-    new_tokens = math.min(capacity , tokens + (elapsed_ts * refill_rate ))
+    local new_tokens
+    local elapsed_ts
+
+    if tokens == nil or last_refill == nil then
+        new_tokens = capacity
+        last_refill = now
+    else
+        -- a caller whose clock is behind the last writer refills nothing
+        elapsed_ts = math.max(0, now - last_refill)
+        new_tokens = math.min(capacity , tokens + (elapsed_ts * refill_rate ))
+        last_refill = math.max(now, last_refill)
+    end
+
+    max_wait = max_wait or 0
+    local wait = (cost - new_tokens) / refill_rate
+    if wait > max_wait then
+        local reset_after = (capacity - new_tokens) / refill_rate
+        return 0, math.max(0, math.floor(new_tokens)), wait - max_wait, reset_after, nil
+    end
+
+    new_tokens = new_tokens - cost
+    local reset_after = (capacity - new_tokens) / refill_rate
+    return 1, math.max(0, math.floor(new_tokens)), math.max(0, wait), reset_after, function()
+        save_state(key, reset_after, new_tokens, last_refill)
+    end
+end
+"""
+
+LEAKY_BUCKET_LUA = """
+local function leaky_bucket(key, now, capacity, leak_rate, cost, max_wait)
+    local water_level, last_leaked_ts = load_state(key, "water_level", "last_leaked_ts")
+
+    if water_level == nil or last_leaked_ts == nil then
+        water_level = 0
+        last_leaked_ts = now
+    else
+        local elapsed_ts = math.max(0, now - last_leaked_ts)
+        local leaked = elapsed_ts * leak_rate
+        water_level = math.max(0, water_level - leaked)
+        last_leaked_ts = math.max(now, last_leaked_ts)
+    end
+
+    max_wait = max_wait or 0
+    local wait = (water_level + cost - capacity) / leak_rate
+    if wait > max_wait then
+        local remaining = math.max(0, math.floor(capacity - water_level))
+        return 0, remaining, wait - max_wait, water_level / leak_rate, nil
+    end
+
+    water_level = water_level + cost
+    local reset_after = water_level / leak_rate
+    return 1, math.max(0, math.floor(capacity - water_level)), math.max(0, wait), reset_after, function()
+        save_state(key, reset_after, water_level, last_leaked_ts)
+    end
+end
+"""
+
+# One member per admitted request, scored by its timestamp. A member packs
+# the running total of the costs admitted to the key, this request included,
+# and the request's own cost, both as big-endian doubles so that requests at
+# the same timestamp sort in the order they were admitted. The cost within
+# the window is the newest total minus the total before the oldest request
+# in it, so a check reads two members whatever the costs. Members of earlier
+# versions, one per unit, are rewritten in this form when first read.
+SLIDING_WINDOW_LUA = """
+local function window_request(member)
+    if #member == 16 and member:byte(1) > 57 then
+        return struct.unpack(">dd", member)
+    end
 end
 
-if new_tokens < 1 then
-    return {0, new_tokens}
+local function rewrite_window(key)
+    local ttl = redis.call("PTTL", key)
+    local members = redis.call("ZRANGE", key, 0, -1, "WITHSCORES")
+    redis.call("DEL", key)
+    local total = 0
+    local rewritten = {}
+    for i = 1, #members, 2 do
+        local _, cost = window_request(members[i])
+        total = total + (cost or 1)
+        rewritten[#rewritten + 1] = members[i + 1]
+        rewritten[#rewritten + 1] = struct.pack(">dd", total, cost or 1)
+        -- added in chunks to stay within Lua's unpack() limit
+        if #rewritten >= 1000 or i + 1 == #members then
+            redis.call("ZADD", key, unpack(rewritten))
+            rewritten = {}
+        end
+    end
+    if ttl > 0 then
+        redis.call("PEXPIRE", key, ttl)
+    end
 end
 
-new_tokens = new_tokens - 1
-redis.call('HSET' , key , "tokens" , new_tokens , "last_refill_ts" , now)
-return {1 , new_tokens}
+local function sliding_window(key, now, capacity, window_size, cost)
+    local expired_until = "" .. (now - window_size)
+    local window_start = "(" .. expired_until
+    local newest = redis.call("ZRANGE", key, -1, -1, "WITHSCORES")
+    if newest[1] and not window_request(newest[1]) then
+        rewrite_window(key)
+        newest = redis.call("ZRANGE", key, -1, -1, "WITHSCORES")
+    end
 
+    local total, count = 0, 0
+    if newest[1] then
+        total = window_request(newest[1])
+        local oldest = redis.call("ZRANGEBYSCORE", key, window_start, "+inf", "LIMIT", 0, 1)
+        if oldest[1] then
+            local oldest_total, oldest_cost = window_request(oldest[1])
+            count = total - (oldest_total - oldest_cost)
+        end
+    end
+
+    if count + cost > capacity then
+        -- allowed again once the oldest requests holding ``need`` units leave
+        -- the window; totals grow with the rank, so the request that takes
+        -- the total past them is found by bisection
+        local need = count - math.floor(capacity - cost)
+        local target = total - count + need
+        local low = redis.call("ZCOUNT", key, "-inf", expired_until)
+        local high = redis.call("ZCARD", key) - 1
+        while low < high do
+            local middle = math.floor((low + high) / 2)
+            if window_request(redis.call("ZRANGE", key, middle, middle)[1]) >= target then
+                high = middle
+            else
+                low = middle + 1
+            end
+        end
+        local leaving = redis.call("ZRANGE", key, low, low, "WITHSCORES")
+        local retry_after = tonumber(leaving[2]) + window_size - now
+        local reset_after = tonumber(newest[2]) + window_size - now
+        return 0, math.max(0, capacity - count), retry_after, reset_after, nil
+    end
+
+    return 1, capacity - count - cost, 0, window_size, function()
+        redis.call("ZREMRANGEBYSCORE" , key , "-inf", now - window_size)
+        -- a caller whose clock is behind the newest request is recorded with
+        -- it, so that scores keep the order of the totals
+        local stamp = now
+        if newest[1] then
+            stamp = math.max(now, tonumber(newest[2]))
+        end
+        redis.call("ZADD", key, stamp, struct.pack(">dd", total + cost, cost))
+        redis.call("PEXPIRE" , key, math.ceil(window_size * 1000))
+    end
+end
 """
 
-CHECK_LEAKY_BUCKET_SCRIPT = """
-local key = KEYS[1]
-local capacity = tonumber(ARGV[1])
-local leak_rate = tonumber(ARGV[2])
-local now = tonumber(ARGV[3])
+# Approximates the sliding window from two fixed-window counters: the previous
+# window's count is weighted by how much of it still overlaps the sliding
+# window. State is three packed doubles in one string regardless of capacity.
+SLIDING_WINDOW_COUNTER_LUA = """
+local function sliding_window_counter(key, now, capacity, window_size, cost)
+    local window = math.floor(now / window_size)
+    local stored, current, previous = load_state(key, "window", "current", "previous")
+    current = current or 0
+    previous = previous or 0
+
+    if stored == nil or stored < window - 1 then
+        current = 0
+        previous = 0
+    elseif stored == window - 1 then
+        previous = current
+        current = 0
+    elseif stored > window then
+        -- the caller's clock is behind the one that wrote the state
+        window = stored
+    end
+
+    local elapsed = now - window * window_size
 
-local data = redis.call("HGETALL", key)
-local water_level = nil
-local last_leaked_ts = nil
+    -- the count only reaches zero once every counted window has slid past
+    local function reset_after(window, current, previous)
+        if current > 0 then
+            return (window + 2) * window_size - now
+        elseif previous > 0 then
+            return (window + 1) * window_size - now
+        end
+        return 0
+    end
+
+    local count = previous * (1 - elapsed / window_size) + current
+
+    if count + cost > capacity then
+        local retry_after
+        if current + cost <= capacity then
+            retry_after = window_size * (1 - (capacity - cost - current) / previous) - elapsed
+        else
+            -- nothing frees up before the next window starts
+            retry_after = window_size - elapsed
+                + math.max(0, window_size * (1 - (capacity - cost) / current))
+        end
+        local remaining = math.max(0, math.floor(capacity - count))
+        return 0, remaining, retry_after, reset_after(window, current, previous), nil
+    end
 
-for i = 1, #data, 2 do
-    if data[i] == "water_level" then
-        water_level = tonumber(data[i+1])
-    elseif data[i] == "last_leaked_ts" then
-        last_leaked_ts = tonumber(data[i+1])
+    current = current + cost
+    local remaining = math.floor(capacity - count - cost)
+    local ttl = reset_after(window, current, previous)
+    return 1, remaining, 0, ttl, function()
+        save_state(key, ttl, window, current, previous)
     end
 end
+"""
 
-if water_level == nil or last_leaked_ts == nil then
-    water_level = 0
-    last_leaked_ts = now
-else
-    local elapsed_ts = now - last_leaked_ts
-    local leaked = elapsed_ts * leak_rate
-    water_level = math.max(0, water_level - leaked)
+# Generic cell rate algorithm: the only state is the theoretical arrival time
+# (TAT) of the next request, stored as a plain string that expires once the
+# limit would be back to full capacity.
+GCRA_LUA = """
+local function gcra(key, now, capacity, rate, cost)
+    local emission_interval = 1 / rate
+    local tolerance = capacity * emission_interval
+
+    local tat = tonumber(redis.call("GET", key)) or now
+    tat = math.max(tat, now)
+
+    local new_tat = tat + cost * emission_interval
+    local allow_at = new_tat - tolerance
+
+    if now < allow_at then
+        local available = math.floor((tolerance - (tat - now)) / emission_interval + 1e-9)
+        return 0, available, allow_at - now, tat - now, nil
+    end
+
+    local remaining = math.floor((tolerance - (new_tat - now)) / emission_interval + 1e-9)
+    return 1, remaining, 0, new_tat - now, function()
+        local ttl = math.max(1, math.ceil((new_tat - now) * 1000))
+        redis.call("SET", key, tostring(new_tat), "PX", ttl)
+    end
 end
+"""
 
-if water_level + 1 > capacity then
-    return {0, water_level}
+# ``now`` is the caller's timestamp, or the Redis server clock when the caller
+# passes an empty string, so that every API replica shares one time source.
+NOW_LUA = """
+local function resolve_now(now)
+    if now == nil or now == "" then
+        local time = redis.call("TIME")
+        return tonumber(time[1]) + tonumber(time[2]) / 1000000
+    end
+    return tonumber(now)
 end
+"""
 
-water_level = water_level + 1
-redis.call("HSET", key, "water_level", tostring(water_level), "last_leaked_ts", tostring(now))
+# ARGV = capacity, param, now, cost and, for a reservation, max_wait
+SINGLE_CHECK_LUA = """
+local cost = tonumber(ARGV[4]) or 1
+local now = resolve_now(ARGV[3])
+local allowed, remaining, retry_after, reset_after, commit = {func}(KEYS[1], now, tonumber(ARGV[1]), tonumber(ARGV[2]), cost, tonumber(ARGV[5]))
+if allowed == 1 then
+    commit()
+end
+return {{allowed, remaining, tostring(retry_after), tostring(reset_after)}}
+"""
 
-redis.call("EXPIRE", key, math.ceil(capacity / leak_rate) + 60)
 
-return {1, water_level}
+# Same as SINGLE_CHECK_LUA without ``commit()``: reports what a check would
+# return and leaves the key untouched, for shadow checks.
+SINGLE_PEEK_LUA = """
+local cost = tonumber(ARGV[4]) or 1
+local now = resolve_now(ARGV[3])
+local allowed, remaining, retry_after, reset_after = {func}(KEYS[1], now, tonumber(ARGV[1]), tonumber(ARGV[2]), cost)
+return {{allowed, remaining, tostring(retry_after), tostring(reset_after)}}
 """
 
-CHECK_SLIDING_WINDOW_SCRIPT = """
-local key = KEYS[1]
 
+def single_check_script(algorithm_lua: str, func: str, peek: bool = False) -> str:
+    template = SINGLE_PEEK_LUA if peek else SINGLE_CHECK_LUA
+    return STATE_LUA + algorithm_lua + NOW_LUA + template.format(func=func)
+
+
+CHECK_TOKEN_BUCKET_SCRIPT = single_check_script(TOKEN_BUCKET_LUA, "token_bucket")
+CHECK_LEAKY_BUCKET_SCRIPT = single_check_script(LEAKY_BUCKET_LUA, "leaky_bucket")
+CHECK_SLIDING_WINDOW_SCRIPT = single_check_script(SLIDING_WINDOW_LUA, "sliding_window")
+CHECK_SLIDING_WINDOW_COUNTER_SCRIPT = single_check_script(
+    SLIDING_WINDOW_COUNTER_LUA, "sliding_window_counter"
+)
+CHECK_GCRA_SCRIPT = single_check_script(GCRA_LUA, "gcra")
+
+ALGORITHM_LUA = {
+    "token_bucket": TOKEN_BUCKET_LUA,
+    "leaky_bucket": LEAKY_BUCKET_LUA,
+    "sliding_window": SLIDING_WINDOW_LUA,
+    "sliding_window_counter": SLIDING_WINDOW_COUNTER_LUA,
+    "gcra": GCRA_LUA,
+}
+
+# Takes a block of up to ``size`` tokens (at least ``cost``) out of a token
+# bucket for a worker to spend locally, after putting back the ``returned``
+# tokens of its previous lease. ARGV = capacity, refill_rate, now, cost, size,
+# returned; a call with cost and size 0 only returns tokens. Replies like the
+# single-key scripts plus the number of tokens granted.
+TOKEN_BUCKET_LEASE_SCRIPT = (
+    STATE_LUA
+    + NOW_LUA
+    + """
 local capacity = tonumber(ARGV[1])
-local window_size = tonumber(ARGV[2])
-local now = tonumber(ARGV[3])
+local refill_rate = tonumber(ARGV[2])
+local now = resolve_now(ARGV[3])
+local cost = tonumber(ARGV[4])
+local size = tonumber(ARGV[5])
+local returned = tonumber(ARGV[6])
 
-redis.call("ZREMRANGEBYSCORE" , key , "-inf", now - window_size)
+local tokens, last_refill = load_state(KEYS[1], "tokens", "last_refill_ts")
 
-local count = redis.call("ZCARD" , key)
+if tokens == nil or last_refill == nil then
+    tokens = capacity
+    last_refill = now
+else
+    local elapsed_ts = math.max(0, now - last_refill)
+    tokens = math.min(capacity, tokens + elapsed_ts * refill_rate)
+    last_refill = math.max(now, last_refill)
+end
+tokens = math.min(capacity, tokens + returned)
 
-if count >= capacity then
-    return {0, count}
+local allowed = 0
+local granted = 0
+local retry_after = (cost - tokens) / refill_rate
+if tokens >= cost then
+    allowed = 1
+    granted = math.max(cost, math.min(size, math.floor(tokens)))
+    tokens = tokens - granted
+    retry_after = 0
 end
 
-redis.call("ZADD" , key, now, now)
+local reset_after = (capacity - tokens) / refill_rate
+save_state(KEYS[1], reset_after, tokens, last_refill)
+-- reservations can leave the bucket in debt
+return {allowed, math.max(0, math.floor(tokens)), tostring(retry_after), tostring(reset_after), granted}
+"""
+)
 
-redis.call("EXPIRE" , key, window_size)
+# Adds a worker's requests for one subject to KEYS[1], which counts them over
+# fixed intervals, and promotes the subject to sharded mode in the marker
+# KEYS[2] once they reach the threshold. ARGV = requests, threshold per
+# interval, interval in ms and the number of shares to promote to. A marker
+# holds its shares and the time they take effect, and is kept alive while the
+# subject gets at least half the threshold; both changes happen two or three
+# intervals after they are decided, on the Redis clock. Replies with the
+# shares and the ms until they take effect and expire, or nothing.
+HOT_KEY_SCRIPT = """
+local requests = tonumber(ARGV[1])
+local threshold = tonumber(ARGV[2])
+local interval = tonumber(ARGV[3])
+local count = redis.call("INCRBY", KEYS[1], requests)
+if redis.call("PTTL", KEYS[1]) < 0 then
+    redis.call("PEXPIRE", KEYS[1], interval)
+end
 
-return {1, count+1}
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local marker = redis.call("GET", KEYS[2])
+local parts, since
+if marker then
+    local sep = string.find(marker, ":", 1, true)
+    parts = tonumber(string.sub(marker, 1, sep - 1))
+    since = tonumber(string.sub(marker, sep + 1))
+    if count * 2 >= threshold then
+        redis.call("PEXPIREAT", KEYS[2], math.max(since, now) + 3 * interval)
+    end
+elseif count >= threshold and tonumber(ARGV[4]) > 1 then
+    parts = tonumber(ARGV[4])
+    since = now + 2 * interval
+    redis.call("SET", KEYS[2], parts .. ":" .. since, "PXAT", since + 3 * interval)
+else
+    return {}
+end
+return {parts, since - now, redis.call("PTTL", KEYS[2])}
+"""
+
+# KEYS are the keys of every check; ARGV[1] is ``now`` followed by an
+# ``algorithm, capacity, param, cost`` group per key. State is only committed when
+# every check allows.
+CHECK_MANY_ATOMIC_SCRIPT = (
+    STATE_LUA
+    + TOKEN_BUCKET_LUA
+    + LEAKY_BUCKET_LUA
+    + SLIDING_WINDOW_LUA
+    + SLIDING_WINDOW_COUNTER_LUA
+    + GCRA_LUA
+    + NOW_LUA
+    + """
+local algorithms = {
+    token_bucket = token_bucket,
+    leaky_bucket = leaky_bucket,
+    sliding_window = sliding_window,
+    sliding_window_counter = sliding_window_counter,
+    gcra = gcra,
+}
+
+local now = resolve_now(ARGV[1])
+local results = {}
+local commits = {}
+local all_allowed = 1
+
+for i = 1, #KEYS do
+    local base = 2 + (i - 1) * 4
+    local check = algorithms[ARGV[base]]
+    local allowed, remaining, retry_after, reset_after, commit = check(
+        KEYS[i], now, tonumber(ARGV[base + 1]), tonumber(ARGV[base + 2]), tonumber(ARGV[base + 3])
+    )
+    if allowed == 0 then
+        all_allowed = 0
+    end
+    results[i] = {allowed, remaining, tostring(retry_after), tostring(reset_after)}
+    commits[i] = commit
+end
+
+if all_allowed == 1 then
+    for i = 1, #commits do
+        commits[i]()
+    end
+else
+    -- nothing was consumed, so report what is still available
+    for i = 1, #KEYS do
+        if results[i][1] == 1 then
+            results[i][2] = results[i][2] + tonumber(ARGV[2 + (i - 1) * 4 + 3])
+        end
+    end
+end
 
+return {all_allowed, results}
 """
+)
 
 
-class RedisService:
-    def __init__(self, redis: Redis):
-        self.redis = redis
+KEY_PREFIXES = {
+    "token_bucket": "tb",
+    "leaky_bucket": "lb",
+    "sliding_window": "sw",
+    "sliding_window_counter": "swc",
+    "gcra": "gcra",
+}
 
-    async def check_token_bucket(
-        self, subject: str, capacity: float, refill_rate: float
-    ):
-        key = f"tb:{subject}"
-        now = time.time()
+# Names of the doubles packed into each algorithm's state string
+STATE_FIELDS = {
+    "token_bucket": ("tokens", "last_refill_ts"),
+    "leaky_bucket": ("water_level", "last_leaked_ts"),
+    "sliding_window_counter": ("window", "current", "previous"),
+}
+
+SCRIPTS = {
+    "token_bucket": CHECK_TOKEN_BUCKET_SCRIPT,
+    "leaky_bucket": CHECK_LEAKY_BUCKET_SCRIPT,
+    "sliding_window": CHECK_SLIDING_WINDOW_SCRIPT,
+    "sliding_window_counter": CHECK_SLIDING_WINDOW_COUNTER_SCRIPT,
+    "gcra": CHECK_GCRA_SCRIPT,
+    "check_many_atomic": CHECK_MANY_ATOMIC_SCRIPT,
+    "token_bucket_lease": TOKEN_BUCKET_LEASE_SCRIPT,
+    "hot_key": HOT_KEY_SCRIPT,
+    **{
+        f"{algorithm}_peek": single_check_script(lua, algorithm, peek=True)
+        for algorithm, lua in ALGORITHM_LUA.items()
+    },
+}
+
+
+# Failures that mean Redis cannot answer right now, as opposed to errors
+# returned by a script
+OUTAGE_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    RedisConnectionError,
+    RedisTimeoutError,
+    CircuitOpenError,
+)
+
+
+def unpack_state(algorithm: str, raw: bytes) -> dict[str, float]:
+    """Decode a state string written by the scripts of ``algorithm``."""
+    fields = STATE_FIELDS[algorithm]
+    return dict(zip(fields, struct.unpack("<" + "d" * len(fields), raw)))
 
-        script = self.redis.register_script(CHECK_TOKEN_BUCKET_SCRIPT)
 
-        allowed, remaining = await script(keys=[key], args=[capacity, refill_rate, now])
+def pack_state(algorithm: str, state: dict[str, float]) -> bytes:
+    """Encode ``state`` the way the scripts of ``algorithm`` store it."""
+    fields = STATE_FIELDS[algorithm]
+    return struct.pack("<" + "d" * len(fields), *(state[f] for f in fields))
 
-        return {"allowed": bool(allowed), "remaining": remaining}
 
-    async def check_leaky_bucket(self, subject: str, capacity: float, leak_rate: float):
-        key = f"lb:{subject}"
-        now = time.time()
+def window_members(units: list[tuple[float, int]]) -> dict[bytes, float]:
+    """Sorted set members for ``(timestamp, cost)`` units of a sliding window.
 
-        script = self.redis.register_script(CHECK_LEAKY_BUCKET_SCRIPT)
+    Mirrors the members ``SLIDING_WINDOW_LUA`` adds: each unit becomes one
+    request carrying the running total of the costs up to it.
+    """
+    members = {}
+    total = 0.0
+    for timestamp, cost in sorted(units):
+        total += cost
+        members[struct.pack(">dd", total, cost)] = timestamp
+    return members
 
-        allowed, water_level = await script(keys=[key], args=[capacity, leak_rate, now])
 
-        print("REDIS FUNC", capacity, water_level)
-        return {"allowed": bool(allowed), "remaining": max(0, capacity - water_level)}
+def window_cost(member: bytes) -> float:
+    """Cost of a sliding window member; members of earlier versions are one unit."""
+    if len(member) == 16 and member[0] > 57:
+        return struct.unpack(">dd", member)[1]
+    return 1.0
 
-    async def check_sliding_window(
-        self, subject: str, capacity: float, window_size: float
+
+def hash_tagged_key(prefix: str, subject: str) -> str:
+    """Key for ``subject`` in Redis Cluster.
+
+    The subject is wrapped in a hash tag so every key it owns maps to one
+    slot, unless it already carries a tag of its own (e.g. ``{tenant:1}:user:7``),
+    which lets callers co-locate related subjects for atomic batches.
+    """
+    start = subject.find("{")
+    if start != -1 and subject.find("}", start + 1) > start + 1:
+        return f"{prefix}:{subject}"
+    return f"{prefix}:{{{subject}}}"
+
+
+class RedisService(RateLimiter):
+    """Rate limiter backed by Lua scripts on Redis or Redis Cluster.
+
+    With a ``breaker``, checks that fail or time out in Redis, and every
+    check while the breaker is open, are answered by ``fallback`` instead.
+    With ``hot_keys``, the limits of hot subjects are spread over several
+    keys, named after the subject plus ``#<shard>``; ``watch_hot_keys``
+    keeps the workers in agreement on which subjects are hot. Single and
+    batch checks try up to ``hot_keys.probes`` shares and peeks read all of
+    them. Reservations and all-or-nothing checks, composites included, use a
+    single random share, as one script cannot span the shares' slots.
+    """
+
+    def __init__(
+        self,
+        redis: Redis | RedisCluster,
+        scripts: ScriptRegistry | None = None,
+        deny_cache: DenyCache | None = None,
+        time_source: Literal["redis", "client"] = "redis",
+        metrics: "Metrics | None" = None,
+        leases: LeaseTable | None = None,
+        coalescer: Coalescer | None = None,
+        breaker: CircuitBreaker | None = None,
+        fallback: Fallback | None = None,
+        hot_keys: HotKeys | None = None,
+        decision_log: "DecisionLog | None" = None,
     ):
-        key = f"sw:{subject}"
-        now = time.time()
+        if (breaker is None) != (fallback is None):
+            raise ValueError("breaker and fallback must be given together")
+        super().__init__(deny_cache, metrics, decision_log)
+        self.redis = redis
+        self.cluster = isinstance(redis, RedisCluster)
+        self.scripts = scripts or ScriptRegistry(redis, SCRIPTS)
+        self.time_source = time_source
+        # token bucket checks outside of batches are served from leases
+        self.leases = leases
+        # single checks from concurrent callers share pipelines
+        self.coalescer = coalescer
+        self.breaker = breaker
+        self.fallback = fallback
+        self.hot_keys = hot_keys
+
+    @property
+    def fallback_mode(self) -> str | None:
+        if self.breaker is None or self.breaker.state == CLOSED:
+            return None
+        return self.fallback.mode
+
+    async def release_leases(self):
+        """Return every leased token that was not spent to Redis."""
+        if self.leases is None:
+            return
+
+        calls = [
+            (
+                "token_bucket_lease",
+                [self._key(check)],
+                [check.capacity, check.param, self._now(), 0, 0, tokens],
+            )
+            for check, tokens in self.leases.drain()
+        ]
+        if calls:
+            await self.scripts.evalsha_many(calls)
+
+    async def sync_hot_keys(self):
+        """Share this worker's request counts with the other workers and read
+        back which subjects are sharded."""
+        pending = self.hot_keys.drain()
+        if not pending:
+            return
+
+        interval = math.ceil(self.hot_keys.interval * 1000)
+        threshold = self.hot_keys.hot_rate * self.hot_keys.interval
+        markers = await self.scripts.evalsha_many(
+            (
+                "hot_key",
+                [f"hot:{self._key(check)}:n", f"hot:{self._key(check)}"],
+                [count, threshold, interval, shards],
+            )
+            for check, count, shards in pending
+        )
+        for (check, _, _), marker in zip(pending, markers):
+            self.hot_keys.update(check, marker)
+
+    async def watch_hot_keys(self):
+        while True:
+            await asyncio.sleep(self.hot_keys.interval)
+            try:
+                await self.sync_hot_keys()
+            except Exception:
+                logger.exception("Failed to sync hot keys")
+
+    async def memory_usage(self, samples: int = 100):
+        """Count keys with SCAN and extrapolate MEMORY USAGE of a sample.
+
+        The first ``samples`` keys found for each algorithm are measured.
+        """
+        report = {}
+        for algorithm, prefix in KEY_PREFIXES.items():
+            keys = 0
+            sampled = []
+            async for key in self.redis.scan_iter(match=f"{prefix}:*", count=1000):
+                keys += 1
+                if len(sampled) < samples:
+                    sampled.append(key)
+
+            sizes = []
+            if sampled:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in sampled:
+                        pipe.memory_usage(key)
+                    # keys can expire between SCAN and MEMORY USAGE
+                    sizes = [size for size in await pipe.execute() if size]
+
+            estimate = round(sum(sizes) / len(sizes) * keys) if sizes else 0
+            report[algorithm] = {"keys": keys, "bytes": estimate}
+        return report
+
+    async def scan_state(
+        self, algorithm: str, match: str = "*", count: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Yield the stored state of the ``algorithm`` subjects matching ``match``.
+
+        Keys are found with ``SCAN`` and read ``count`` at a time in one
+        pipeline, so the server is never blocked by a full keyspace walk.
+        Each record holds the ``algorithm``, ``subject``, decoded ``state``
+        and the seconds until the key expires as ``ttl``; keys that expire
+        while they are read are skipped.
+        """
+        async for keys in self._scan(algorithm, match, count):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    if algorithm == "sliding_window":
+                        pipe.execute_command(
+                            "ZRANGE",
+                            key,
+                            0,
+                            -1,
+                            "WITHSCORES",
+                            withscores=True,
+                            NEVER_DECODE=True,
+                        )
+                    else:
+                        pipe.execute_command("GET", key, NEVER_DECODE=True)
+                    pipe.pttl(key)
+                replies = await pipe.execute(raise_on_error=False)
+
+            for key, value, ttl in zip(keys, replies[::2], replies[1::2]):
+                if not value or isinstance(ttl, Exception) or ttl < 0:
+                    continue
+                if isinstance(value, Exception):
+                    # a hash written by an earlier version
+                    fields = STATE_FIELDS[algorithm]
+                    values = await self.redis.hmget(key, fields)
+                    if None in values:
+                        continue
+                    value = dict(zip(fields, map(float, values)))
+                yield {
+                    "algorithm": algorithm,
+                    "subject": self._subject(algorithm, key),
+                    "state": self._decode_state(algorithm, value),
+                    "ttl": ttl / 1000,
+                }
+
+    async def reset_state(self, algorithm: str, match: str, count: int = 1000) -> int:
+        """Delete the state of the ``algorithm`` subjects matching ``match``.
+
+        Returns the number of keys removed. Workers may still deny a reset
+        subject from their deny cache until its entry expires.
+        """
+        deleted = 0
+        async for keys in self._scan(algorithm, match, count):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                # one key per command, so keys may live in different slots;
+                # the cluster pipeline has no plain ``unlink`` method
+                for key in keys:
+                    pipe.execute_command("UNLINK", key)
+                deleted += sum(await pipe.execute())
+        return deleted
+
+    async def import_state(self, records: Iterable[dict]) -> int:
+        """Write records as yielded by ``scan_state``, replacing existing state.
+
+        Meant for migrations while the subjects see no traffic: a sliding
+        window is rewritten in several commands, which checks can interleave
+        with. Records without a positive ``ttl`` are skipped. Returns the
+        number of keys written.
+        """
+        written = 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for record in records:
+                algorithm = record["algorithm"]
+                if algorithm not in KEY_PREFIXES:
+                    raise ValueError(f"unknown algorithm: {algorithm}")
+                ttl_ms = math.ceil(record["ttl"] * 1000)
+                if ttl_ms <= 0:
+                    continue
+                key = self._key(RateLimitCheck(algorithm, record["subject"], 0, 0))
+                state = record["state"]
+                if algorithm == "sliding_window":
+                    pipe.delete(key)
+                    pipe.zadd(key, window_members(state["units"]))
+                    pipe.pexpire(key, ttl_ms)
+                elif algorithm == "gcra":
+                    pipe.set(key, repr(float(state["tat"])), px=ttl_ms)
+                else:
+                    pipe.set(key, pack_state(algorithm, state), px=ttl_ms)
+                written += 1
+            await pipe.execute()
+        return written
+
+    async def _scan(
+        self, algorithm: str, match: str, count: int
+    ) -> AsyncIterator[list[str]]:
+        prefix = KEY_PREFIXES[algorithm]
+        pattern = f"{prefix}:{match}"
+        # (pattern, skip keys of subjects wrapped whole in a hash tag)
+        patterns = [(pattern, False)]
+        if self.cluster and hash_tagged_key(prefix, match) != pattern:
+            # subjects are wrapped in a hash tag unless they carry their own;
+            # the unwrapped pattern finds the latter and would find some
+            # wrapped keys a second time
+            patterns = [(hash_tagged_key(prefix, match), False), (pattern, True)]
+
+        keys = []
+        for pattern, skip_wrapped in patterns:
+            async for key in self.redis.scan_iter(match=pattern, count=count):
+                if skip_wrapped and self._wrapped(prefix, key):
+                    continue
+                keys.append(key)
+                if len(keys) >= count:
+                    yield keys
+                    keys = []
+        if keys:
+            yield keys
+
+    @staticmethod
+    def _wrapped(prefix: str, key: str | bytes) -> bool:
+        """Whether the subject of ``key`` is wrapped whole in a hash tag."""
+        if isinstance(key, bytes):
+            key = key.decode()
+        subject = key[len(prefix) + 1 :]
+        return subject.startswith("{") and subject.endswith("}")
+
+    @staticmethod
+    def _decode_state(algorithm: str, value) -> dict:
+        if isinstance(value, dict):
+            return value
+        if algorithm == "sliding_window":
+            units = {}
+            for member, timestamp in value:
+                units[timestamp] = units.get(timestamp, 0) + window_cost(member)
+            return {"units": sorted(units.items())}
+        if algorithm == "gcra":
+            return {"tat": float(value)}
+        return unpack_state(algorithm, value)
+
+    def _subject(self, algorithm: str, key: str | bytes) -> str:
+        if isinstance(key, bytes):
+            key = key.decode()
+        subject = key[len(KEY_PREFIXES[algorithm]) + 1 :]
+        if self.cluster and self._wrapped(KEY_PREFIXES[algorithm], key):
+            # a whole subject wrapped in a hash tag by ``hash_tagged_key``
+            # maps back to the same key either way
+            return subject[1:-1]
+        return subject
+
+    async def _evaluate(self, check: RateLimitCheck) -> Row:
+        parts = self._parts(check)
+        if parts > 1:
+            return await self._evaluate_sharded(check, parts)
+
+        if self.leases is not None and check.algorithm == "token_bucket":
+            row = self.leases.spend(check)
+            if row is not None:
+                return row
+            return await self._guarded(self._renew_lease, Fallback.evaluate, check)
+
+        return await self._guarded(self._evaluate_script, Fallback.evaluate, check)
+
+    async def _evaluate_sharded(self, check: RateLimitCheck, parts: int) -> Row:
+        share = split_check(check, parts)
+        denied = None
+        for shard in self.hot_keys.order(parts):
+            allowed, remaining, retry_after, reset_after = await self._guarded(
+                self._evaluate_script,
+                Fallback.evaluate,
+                share._replace(subject=f"{check.subject}#{shard}"),
+            )
+            # the other shares are assumed to be about as full as this one
+            row = allowed, remaining * parts, retry_after, reset_after
+            if allowed:
+                return row
+            if denied is None or float(retry_after) < float(denied[2]):
+                denied = row
+        return denied
+
+    async def _evaluate_script(self, check: RateLimitCheck) -> Row:
+        return await self._evalsha(
+            check.algorithm,
+            keys=[self._key(check)],
+            args=[check.capacity, check.param, self._now(), check.cost],
+        )
+
+    async def _renew_lease(self, check: RateLimitCheck) -> Row:
+        returned, size = self.leases.renew(check)
+        *row, granted = await self._evalsha(
+            "token_bucket_lease",
+            keys=[self._key(check)],
+            args=[check.capacity, check.param, self._now(), check.cost, size, returned],
+        )
+        if granted:
+            self.leases.grant(check, granted, row[1])
+        return row
+
+    async def _reserve(self, check: RateLimitCheck, max_wait: float) -> Row:
+        parts = self._parts(check)
+        allowed, remaining, delay, reset_after = await self._guarded(
+            partial(self._reserve_script, max_wait=max_wait),
+            partial(Fallback.reserve, max_wait=max_wait),
+            self._share(check, parts),
+        )
+        return allowed, remaining * parts, delay, reset_after
+
+    async def _reserve_script(self, check: RateLimitCheck, max_wait: float) -> Row:
+        return await self._evalsha(
+            check.algorithm,
+            keys=[self._key(check)],
+            args=[check.capacity, check.param, self._now(), check.cost, max_wait],
+        )
+
+    async def _peek(self, check: RateLimitCheck) -> Row:
+        parts = self._parts(check)
+        if parts == 1:
+            return await self._guarded(self._peek_script, Fallback.peek, check)
+
+        share = split_check(check, parts)
+        rows = await asyncio.gather(
+            *(
+                self._guarded(
+                    self._peek_script,
+                    Fallback.peek,
+                    share._replace(subject=f"{check.subject}#{shard}"),
+                )
+                for shard in range(parts)
+            )
+        )
+        # allowed if any share would admit the request
+        remaining = sum(row[1] for row in rows)
+        reset_after = max(float(row[3]) for row in rows)
+        if any(row[0] for row in rows):
+            return 1, remaining, 0.0, reset_after
+        return 0, remaining, min(float(row[2]) for row in rows), reset_after
+
+    async def _peek_script(self, check: RateLimitCheck) -> Row:
+        return await self._evalsha(
+            f"{check.algorithm}_peek",
+            keys=[self._key(check)],
+            args=[check.capacity, check.param, self._now(), check.cost],
+        )
+
+    async def _evaluate_many(self, checks: list[RateLimitCheck]) -> list[Row]:
+        parts = [self._parts(check) for check in checks]
+        if all(n == 1 for n in parts):
+            return await self._guarded(
+                self._evaluate_many_scripts, Fallback.evaluate_many, checks
+            )
+
+        # sharded subjects try their shares one by one, the rest share a pipeline
+        rows: list[Row | None] = [None] * len(checks)
+        plain = [i for i, n in enumerate(parts) if n == 1]
+        if plain:
+            plain_rows = await self._guarded(
+                self._evaluate_many_scripts,
+                Fallback.evaluate_many,
+                [checks[i] for i in plain],
+            )
+            for i, row in zip(plain, plain_rows):
+                rows[i] = row
+        for i, n in enumerate(parts):
+            if n > 1:
+                rows[i] = await self._evaluate_sharded(checks[i], n)
+        return rows
+
+    async def _evaluate_many_scripts(self, checks: list[RateLimitCheck]) -> list[Row]:
+        # every check is its own script call, sent together in one pipeline
+        now = self._now()
+        return await self.scripts.evalsha_many(
+            (
+                check.algorithm,
+                [self._key(check)],
+                [check.capacity, check.param, now, check.cost],
+            )
+            for check in checks
+        )
+
+    async def _evaluate_atomic(self, checks: list[RateLimitCheck]) -> list[Row]:
+        parts = [self._parts(check) for check in checks]
+        shares = [self._share(check, n) for check, n in zip(checks, parts)]
+        if self.cluster:
+            keys = [self._key(check) for check in shares]
+            if len({key_slot(key.encode()) for key in keys}) > 1:
+                raise ValueError(
+                    "all_or_nothing checks must share a hash tag in cluster mode"
+                )
+
+        rows = await self._guarded(
+            self._evaluate_atomic_script, Fallback.evaluate_atomic, shares
+        )
+        return [
+            (allowed, remaining * n, retry_after, reset_after)
+            for (allowed, remaining, retry_after, reset_after), n in zip(rows, parts)
+        ]
+
+    async def _evaluate_atomic_script(self, checks: list[RateLimitCheck]) -> list[Row]:
+        args = [self._now()]
+        for check in checks:
+            args.extend([check.algorithm, check.capacity, check.param, check.cost])
+
+        _, rows = await self.scripts.evalsha(
+            "check_many_atomic", keys=[self._key(check) for check in checks], args=args
+        )
+        return rows
+
+    async def _guarded(self, call, fallback, checks):
+        """Run ``call(checks)`` through the breaker.
+
+        If Redis is unreachable, times out or the breaker is open,
+        ``fallback``, a ``Fallback`` method, answers the same checks instead.
+        Errors raised by the scripts themselves are not an outage and are
+        passed on.
+        """
+        if self.breaker is None:
+            return await call(checks)
+        try:
+            return await self.breaker.call(call, checks)
+        except OUTAGE_ERRORS:
+            if self.metrics is not None:
+                self.metrics.fallbacks.inc()
+            return await fallback(self.fallback, checks)
+
+    async def _evalsha(self, name: str, keys: list[str], args: list):
+        if self.coalescer is not None:
+            return await self.coalescer.evalsha(name, keys, args)
+        return await self.scripts.evalsha(name, keys, args)
+
+    def _validate(self, check: RateLimitCheck):
+        super()._validate(check)
+        if self.hot_keys is not None:
+            # every request is validated once, so this is where it is counted
+            self.hot_keys.record(check)
+        parts = self._parts(check)
+        if parts > 1 and check.cost > check.capacity / parts:
+            # no single share could ever admit it
+            raise ValueError("cost must be at most one shard of the capacity")
+
+    def _parts(self, check: RateLimitCheck) -> int:
+        return 1 if self.hot_keys is None else self.hot_keys.parts(check)
 
-        script = self.redis.register_script(CHECK_SLIDING_WINDOW_SCRIPT)
+    def _share(self, check: RateLimitCheck, parts: int) -> RateLimitCheck:
+        """``check`` against one random share of its limit, if it is split."""
+        if parts == 1:
+            return check
+        shard = random.randrange(parts)
+        return split_check(check, parts)._replace(subject=f"{check.subject}#{shard}")
 
-        allowed, count = await script(keys=[key], args=[capacity, window_size, now])
+    def _now(self) -> float | str:
+        # an empty timestamp makes the script read the Redis server clock
+        return "" if self.time_source == "redis" else time.time()
 
-        return {"allowed": bool(allowed), "remaining": capacity - count}
+    def _key(self, check: RateLimitCheck) -> str:
+        if self.cluster:
+            return hash_tagged_key(KEY_PREFIXES[check.algorithm], check.subject)
+        return f"{KEY_PREFIXES[check.algorithm]}:{check.subject}"
@@ -0,0 +1,90 @@
+from hashlib import sha1
+import asyncio
+from typing import Any, Callable, Iterable, Mapping, Sequence
+
+from redis.asyncio import Redis, RedisCluster
+from redis.exceptions import NoScriptError
+
+
+class ScriptRegistry:
+    """Lua scripts loaded once and called by SHA.
+
+    SHAs are computed up front, so a registry works even before ``load()``;
+    any ``NOSCRIPT`` reply (e.g. after a Redis restart or failover) reloads
+    every script and retries the call once.
+    """
+
+    def __init__(
+        self,
+        redis: Redis | RedisCluster,
+        scripts: Mapping[str, str],
+        on_reload: Callable[[], None] | None = None,
+    ):
+        self.redis = redis
+        self.on_reload = on_reload
+        self.sources = dict(scripts)
+        self.shas = {
+            name: sha1(source.encode()).hexdigest()
+            for name, source in self.sources.items()
+        }
+
+    async def load(self):
+        # SCRIPT LOAD cannot be pipelined on a cluster, where the client sends
+        # it to every primary instead
+        shas = await asyncio.gather(
+            *(self.redis.script_load(source) for source in self.sources.values())
+        )
+        self.shas = dict(zip(self.sources, shas))
+
+    async def evalsha(self, name: str, keys: Sequence[Any], args: Sequence[Any]):
+        try:
+            return await self.redis.evalsha(self.shas[name], len(keys), *keys, *args)
+        except NoScriptError:
+            await self._reload()
+            return await self.redis.evalsha(self.shas[name], len(keys), *keys, *args)
+
+    async def evalsha_many(
+        self,
+        calls: Iterable[tuple[str, Sequence[Any], Sequence[Any]]],
+        raise_on_error: bool = True,
+    ) -> list[Any]:
+        """Run ``(name, keys, args)`` calls in one pipeline, in order.
+
+        On a cluster the pipeline sends one batch to each node owning some of
+        the keys. With ``raise_on_error`` false, a failed call's exception is
+        returned in its place instead of being raised.
+
+        Only the calls that got ``NOSCRIPT`` are sent again after a reload:
+        the others already ran (on a cluster, possibly on a healthy node), and
+        replaying them would charge their subjects twice.
+        """
+        calls = list(calls)
+        results = await self._pipeline(calls)
+        missing = [
+            i for i, result in enumerate(results) if isinstance(result, NoScriptError)
+        ]
+        if missing:
+            await self._reload()
+            retried = await self._pipeline([calls[i] for i in missing])
+            for i, result in zip(missing, retried):
+                results[i] = result
+
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def _reload(self):
+        if self.on_reload is not None:
+            self.on_reload()
+        await self.load()
+
+    async def _pipeline(self, calls):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name, keys, args in calls:
+                # ClusterPipeline blocks evalsha() but routes the raw command
+                pipe.execute_command(
+                    "EVALSHA", self.shas[name], len(keys), *keys, *args
+                )
+            return await pipe.execute(raise_on_error=False)
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from typing import Callable
+import math
+import random
+import time
+
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+
+
+class _Subject:
+    __slots__ = ("check", "count", "fit", "seen", "parts", "since", "until")
+
+    def __init__(self, check: RateLimitCheck):
+        self.check = check
+        self.count = 0
+        # smallest capacity / cost seen since the last sync
+        self.fit = math.inf
+        self.seen = 0.0
+        self.parts = 1
+        self.since = self.until = 0.0
+
+
+class HotKeys:
+    """Splits the limits of hot subjects across several Redis keys.
+
+    Every worker counts the requests for each algorithm and subject and adds
+    its counts to a counter shared in Redis every ``interval`` seconds (see
+    ``RedisService.sync_hot_keys``). A subject getting at least ``hot_rate``
+    requests per second across all workers is promoted: a marker in Redis
+    splits its limit into ``shards`` equal shares, each under its own key
+    (and, in cluster mode, its own slot). The marker expires, moving the
+    subject back to one key, once its rate has stayed below half of that for
+    three intervals. A limit is only split as far as each share can still
+    admit the largest request seen when it is promoted.
+
+    The marker holds the times at which the shares take effect and expire,
+    both at least two intervals after they are decided, and every worker
+    that checked the subject in the last ``4 * interval`` seconds reads it
+    at each sync, so the workers switch keys together. A worker that has
+    not checked the subject for longer uses the single key until its next
+    sync. Switching modes starts the new keys full, so a subject can briefly
+    be admitted up to its capacity once more.
+
+    A request is checked against one random share; when that share is
+    exhausted it borrows from up to ``probes - 1`` other shares before it is
+    denied, which bounds the round trips a denial costs. A request can
+    therefore be denied while shares it did not try still hold units. Only
+    the ``maxsize`` most recently checked subjects are tracked.
+    """
+
+    def __init__(
+        self,
+        shards: int = 8,
+        hot_rate: float = 1000.0,
+        interval: float = 1.0,
+        probes: int = 2,
+        maxsize: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.shards = shards
+        self.hot_rate = hot_rate
+        self.interval = interval
+        self.probes = probes
+        self.maxsize = maxsize
+        self.clock = clock
+        self._subjects: OrderedDict[tuple[str, str], _Subject] = OrderedDict()
+
+    def __len__(self):
+        return len(self._subjects)
+
+    def record(self, check: RateLimitCheck):
+        """Count one request for ``check`` towards its subject's rate."""
+        key = (check.algorithm, check.subject)
+        subject = self._subjects.get(key)
+        if subject is None:
+            subject = self._subjects[key] = _Subject(check)
+            if len(self._subjects) > self.maxsize:
+                self._subjects.popitem(last=False)
+        else:
+            self._subjects.move_to_end(key)
+
+        subject.check = check
+        subject.count += 1
+        subject.fit = min(subject.fit, check.capacity / check.cost)
+        subject.seen = self.clock()
+
+    def parts(self, check: RateLimitCheck) -> int:
+        """How many shares the limit of ``check`` is split into right now."""
+        subject = self._subjects.get((check.algorithm, check.subject))
+        if subject is None:
+            return 1
+        if subject.since <= self.clock() < subject.until:
+            return subject.parts
+        return 1
+
+    def drain(self) -> list[tuple[RateLimitCheck, int, int]]:
+        """``(check, requests, shards)`` for each subject to sync, resetting
+        the counts.
+
+        ``shards`` is how far the subject's limit would be split if it is
+        promoted now.
+        """
+        now = self.clock()
+        pending = []
+        for subject in self._subjects.values():
+            if now - subject.seen > 4 * self.interval:
+                continue
+            shards = self.shards
+            if subject.fit != math.inf:
+                shards = min(shards, math.floor(subject.fit))
+            pending.append((subject.check, subject.count, shards))
+            subject.count = 0
+            subject.fit = math.inf
+        return pending
+
+    def update(self, check: RateLimitCheck, marker: list[int]):
+        """Apply a marker read by ``sync_hot_keys``: the number of shares and
+        the milliseconds until they take effect and expire, or nothing."""
+        subject = self._subjects.get((check.algorithm, check.subject))
+        if subject is None:
+            return
+        if not marker or marker[2] < 0:
+            subject.parts = 1
+            subject.since = subject.until = 0.0
+            return
+
+        now = self.clock()
+        parts, since, ttl = marker
+        subject.parts = int(parts)
+        subject.since = now + since / 1000
+        subject.until = now + ttl / 1000
+
+    def order(self, parts: int) -> list[int]:
+        """Shares to try for one request: a random one, then its neighbours."""
+        first = random.randrange(parts)
+        return [(first + i) % parts for i in range(min(self.probes, parts))]
@@ -0,0 +1,485 @@
+"""Replays a recorded request log through candidate limits, offline.
+
+    python -m distributed_rate_limiter_service.simulate requests.csv \\
+        --algorithm token_bucket --capacity 10 20 --param 1 5
+
+The log is CSV with ``timestamp,subject`` rows, or NDJSON with ``ts`` (or
+``timestamp``) and ``subject`` fields, and must hold every request; the
+decision log only keeps a sample of the decisions, shadow checks included,
+so it is not one. Every request costs one unit. For each combination of
+algorithm, capacity and param the report has the deny rate, the subjects
+that spent the longest over their limit and the distribution of each
+subject's busiest ``--burst-window``.
+
+Needs NumPy, installed with the ``simulate`` extra.
+"""
+
+from collections import deque
+from typing import NamedTuple
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import sys
+
+import numpy as np
+
+from distributed_rate_limiter_service.service.limiter import PARAM_NAMES
+
+
+class Candidate(NamedTuple):
+    algorithm: str
+    capacity: float
+    # refill_rate, leak_rate or window_size, as in ``RateLimitCheck``
+    param: float
+
+
+class Report(NamedTuple):
+    candidate: Candidate
+    requests: int
+    denied: int
+    # per subject, in the order of ``Simulation.subjects``
+    denied_per_subject: np.ndarray
+    # seconds each subject spent denied, i.e. inside the ``retry_after`` of a
+    # denied request
+    over_limit_time: np.ndarray
+    # most requests offered and allowed within any ``burst_window`` seconds
+    peak_requests: np.ndarray
+    peak_allowed: np.ndarray
+
+    @property
+    def deny_rate(self) -> float:
+        return self.denied / self.requests if self.requests else 0.0
+
+
+class Simulation:
+    """A request log, ordered for replaying every subject in lockstep.
+
+    Step ``k`` of a replay evaluates the ``k``-th request of every subject
+    that has one, for all candidates of an algorithm at once. Once only a
+    few subjects have requests left, each of them is replayed on its own,
+    one allowed request at a time and each run of denials at once, so the
+    cost of a skewed log grows with the requests its busiest subjects get
+    allowed. State is kept in ``(candidates, subjects)`` arrays; a sliding
+    window also keeps the timestamps of up to ``capacity`` allowed requests
+    per subject, and never more than the subject has requests.
+    """
+
+    def __init__(self, timestamps, subjects):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        names, inverse, counts = np.unique(
+            np.asarray(subjects), return_inverse=True, return_counts=True
+        )
+        # busiest subjects first, so the subjects still replaying at any step
+        # are a prefix of the state arrays
+        order = np.argsort(-counts, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        events = np.lexsort((timestamps, rank[inverse]))
+        self.subjects = names[order]
+        self.timestamps = timestamps[events]
+        # subject of each event, as an index into ``subjects``
+        self.owners = rank[inverse][events]
+        self.counts = counts[order]
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def run(self, candidates: list[Candidate], burst_window: float = 1.0):
+        """One ``Report`` per candidate, in the given order."""
+        reports = {}
+        for algorithm, group in itertools.groupby(
+            sorted(enumerate(candidates), key=lambda c: c[1].algorithm),
+            key=lambda c: c[1].algorithm,
+        ):
+            group = list(group)
+            allowed, retry_after = self.replay(
+                algorithm,
+                np.array([c.capacity for _, c in group], dtype=np.float64),
+                np.array([c.param for _, c in group], dtype=np.float64),
+            )
+            peak_requests = self._peaks(np.ones(len(self), dtype=bool), burst_window)
+            for row, (i, candidate) in enumerate(group):
+                denied = ~allowed[row]
+                reports[i] = Report(
+                    candidate,
+                    len(self),
+                    int(denied.sum()),
+                    np.bincount(self.owners[denied], minlength=len(self.subjects)),
+                    self._over_limit_time(denied, retry_after[row]),
+                    peak_requests,
+                    self._peaks(allowed[row], burst_window),
+                )
+        return [reports[i] for i in range(len(candidates))]
+
+    def replay(self, algorithm: str, capacity: np.ndarray, param: np.ndarray):
+        """Decisions and ``retry_after`` per candidate and event.
+
+        ``capacity`` and ``param`` hold one value per candidate; both
+        results are ``(candidates, events)`` arrays in event order.
+        """
+        if algorithm not in MODELS:
+            raise ValueError(f"cannot simulate {algorithm}")
+        if np.any(capacity < 1):
+            raise ValueError("capacity must be at least 1")
+
+        model = MODELS[algorithm](capacity, param, self.counts)
+        allowed = np.empty((len(capacity), len(self)), dtype=bool)
+        retry_after = np.empty(allowed.shape)
+
+        steps = int(self.counts[0]) if len(self) else 0
+        k = 0
+        while k < steps:
+            # subjects with more than ``k`` requests
+            active = int(np.searchsorted(-self.counts, -(k + 1), side="right"))
+            if active * len(capacity) < LOCKSTEP_MIN_WIDTH:
+                break
+            events = self.starts[:active] + k
+            allowed[:, events], retry_after[:, events] = model.step(
+                active, self.timestamps[events]
+            )
+            k += 1
+        else:
+            return allowed, retry_after
+
+        # too few subjects are left for a step to pay off, so the rest of
+        # each one is replayed on its own
+        for s in range(active):
+            events = slice(self.starts[s] + k, self.starts[s] + self.counts[s])
+            for c in range(len(capacity)):
+                model.replay(
+                    c,
+                    s,
+                    self.timestamps[events],
+                    allowed[c, events],
+                    retry_after[c, events],
+                )
+        return allowed, retry_after
+
+    def _over_limit_time(self, denied: np.ndarray, retry_after: np.ndarray):
+        # the union of ``[t, t + retry_after)`` over each subject's denials;
+        # a denial never ends before an earlier one of the same subject
+        owners = self.owners[denied]
+        starts = self.timestamps[denied]
+        ends = starts + retry_after[denied]
+        previous = np.full_like(ends, -np.inf)
+        same = owners[1:] == owners[:-1]
+        previous[1:][same] = ends[:-1][same]
+        covered = np.maximum(0.0, ends - np.maximum(starts, previous))
+        return np.bincount(owners, weights=covered, minlength=len(self.subjects))
+
+    def _peaks(self, mask: np.ndarray, window: float):
+        # requests in ``(t - window, t]`` for every request, searched in one
+        # sorted array where each subject's timestamps are shifted past the
+        # previous subject's
+        owners = self.owners[mask]
+        times = self.timestamps[mask]
+        peaks = np.zeros(len(self.subjects), dtype=np.int64)
+        if not len(times):
+            return peaks
+        stride = times.max() - times.min() + 2 * window + 1
+        keys = owners * stride + (times - times.min())
+        counts = np.arange(len(keys)) - np.searchsorted(keys, keys - window, "right")
+        np.maximum.at(peaks, owners, counts + 1)
+        return peaks
+
+
+# Lockstep steps evaluating fewer requests than this, over all candidates,
+# hand the remaining subjects over to ``replay``
+LOCKSTEP_MIN_WIDTH = 64
+
+# Shortest run of denials ``replay`` evaluates at once rather than one by one
+DENIAL_RUN = 8
+
+
+def _replay_subject(times, allowed, retry_after, check, evaluate):
+    """Replays the remaining requests of one subject for one candidate.
+
+    ``check(now)`` evaluates a request and records it when it is allowed;
+    ``evaluate(times)`` evaluates requests at ``times`` against the current
+    state without recording anything. Both return ``allowed, retry_after``.
+    A denied request writes nothing, so the requests that follow it within
+    its ``retry_after`` are denied as well and, when there are enough of
+    them, are evaluated together.
+    """
+    values = times.tolist()
+    i = 0
+    while i < len(values):
+        now = values[i]
+        ok, retry = check(now)
+        allowed[i] = ok
+        retry_after[i] = 0.0 if ok else retry
+        i += 1
+        if ok:
+            continue
+
+        end = bisect.bisect_left(values, now + retry, i)
+        if end - i < DENIAL_RUN:
+            continue
+        run_allowed, run_retry = evaluate(times[i:end])
+        # the search is only as exact as ``now + retry``
+        stop = np.flatnonzero(run_allowed)
+        denied = int(stop[0]) if stop.size else end - i
+        allowed[i : i + denied] = False
+        retry_after[i : i + denied] = run_retry[:denied]
+        i += denied
+
+
+# The models below keep the state of every candidate (rows) and subject
+# (columns), given the number of requests of each subject, and follow the
+# Lua functions in ``service/redis.py`` for a cost of one, including that a
+# denied request writes nothing. ``step`` evaluates one request for each of
+# the first ``active`` subjects of every candidate; ``replay`` the remaining
+# requests of one subject for one candidate, with the same arithmetic on
+# Python floats.
+
+
+class _TokenBucket:
+    def __init__(self, capacity, refill_rate, counts):
+        self.capacity = capacity[:, None]
+        self.refill_rate = refill_rate[:, None]
+        # a subject that was never allowed behaves like a full bucket last
+        # refilled infinitely long ago
+        self.tokens = np.repeat(self.capacity, len(counts), axis=1)
+        self.last_refill = np.full(self.tokens.shape, -np.inf)
+
+    @staticmethod
+    def evaluate(tokens, last_refill, capacity, refill_rate, now):
+        elapsed = np.maximum(0.0, now - last_refill)
+        new_tokens = np.minimum(capacity, tokens + elapsed * refill_rate)
+        wait = (1 - new_tokens) / refill_rate
+        return wait <= 0, wait, new_tokens
+
+    def step(self, active: int, now):
+        tokens = self.tokens[:, :active]
+        last_refill = self.last_refill[:, :active]
+        allowed, wait, new_tokens = self.evaluate(
+            tokens, last_refill, self.capacity, self.refill_rate, now
+        )
+        tokens[...] = np.where(allowed, new_tokens - 1, tokens)
+        last_refill[...] = np.where(allowed, np.maximum(now, last_refill), last_refill)
+        return allowed, np.where(allowed, 0.0, wait)
+
+    def replay(self, c: int, s: int, times, allowed, retry_after):
+        capacity = float(self.capacity[c, 0])
+        refill_rate = float(self.refill_rate[c, 0])
+        tokens = float(self.tokens[c, s])
+        last_refill = float(self.last_refill[c, s])
+
+        def check(now):
+            nonlocal tokens, last_refill
+            elapsed = max(0.0, now - last_refill)
+            new_tokens = min(capacity, tokens + elapsed * refill_rate)
+            wait = (1 - new_tokens) / refill_rate
+            if wait <= 0:
+                tokens = new_tokens - 1
+                last_refill = max(now, last_refill)
+            return wait <= 0, wait
+
+        def evaluate(times):
+            ok, wait, _ = self.evaluate(
+                tokens, last_refill, capacity, refill_rate, times
+            )
+            return ok, wait
+
+        _replay_subject(times, allowed, retry_after, check, evaluate)
+
+
+class _LeakyBucket:
+    def __init__(self, capacity, leak_rate, counts):
+        self.capacity = capacity[:, None]
+        self.leak_rate = leak_rate[:, None]
+        self.water_level = np.zeros((len(capacity), len(counts)))
+        self.last_leaked = np.full(self.water_level.shape, -np.inf)
+
+    @staticmethod
+    def evaluate(water_level, last_leaked, capacity, leak_rate, now):
+        elapsed = np.maximum(0.0, now - last_leaked)
+        level = np.maximum(0.0, water_level - elapsed * leak_rate)
+        wait = (level + 1 - capacity) / leak_rate
+        return wait <= 0, wait, level
+
+    def step(self, active: int, now):
+        water_level = self.water_level[:, :active]
+        last_leaked = self.last_leaked[:, :active]
+        allowed, wait, level = self.evaluate(
+            water_level, last_leaked, self.capacity, self.leak_rate, now
+        )
+        water_level[...] = np.where(allowed, level + 1, water_level)
+        last_leaked[...] = np.where(allowed, np.maximum(now, last_leaked), last_leaked)
+        return allowed, np.where(allowed, 0.0, wait)
+
+    def replay(self, c: int, s: int, times, allowed, retry_after):
+        capacity = float(self.capacity[c, 0])
+        leak_rate = float(self.leak_rate[c, 0])
+        water_level = float(self.water_level[c, s])
+        last_leaked = float(self.last_leaked[c, s])
+
+        def check(now):
+            nonlocal water_level, last_leaked
+            elapsed = max(0.0, now - last_leaked)
+            level = max(0.0, water_level - elapsed * leak_rate)
+            wait = (level + 1 - capacity) / leak_rate
+            if wait <= 0:
+                water_level = level + 1
+                last_leaked = max(now, last_leaked)
+            return wait <= 0, wait
+
+        def evaluate(times):
+            ok, wait, _ = self.evaluate(
+                water_level, last_leaked, capacity, leak_rate, times
+            )
+            return ok, wait
+
+        _replay_subject(times, allowed, retry_after, check, evaluate)
+
+
+class _SlidingWindow:
+    # The script counts the units in ``(now - window_size, now]``, which
+    # reaches ``capacity`` exactly when the oldest of the last ``capacity``
+    # allowed requests is still inside the window. The script formats that
+    # bound with Lua's 14 significant digits, which only matters for
+    # requests closer than that to the edge of the window.
+
+    def __init__(self, capacity, window_size, counts):
+        self.window_size = window_size[:, None]
+        # the timestamps of the last allowed requests, in one ring per
+        # candidate and subject; a subject with fewer requests than the
+        # capacity never fills more slots than it has requests
+        self.sizes = np.minimum(np.floor(capacity).astype(np.int64)[:, None], counts)
+        self.offsets = (np.cumsum(self.sizes) - self.sizes.ravel()).reshape(
+            self.sizes.shape
+        )
+        self.allowed_at = np.full(int(self.sizes.sum()), -np.inf)
+        # the slot of each ring holding its oldest timestamp
+        self.head = np.zeros(self.sizes.shape, dtype=np.int64)
+
+    def step(self, active: int, now):
+        head = self.head[:, :active]
+        slots = self.offsets[:, :active] + head
+        oldest = self.allowed_at[slots]
+        allowed = oldest <= now - self.window_size
+        self.allowed_at[slots] = np.where(allowed, now, oldest)
+        head[...] = np.where(allowed, (head + 1) % self.sizes[:, :active], head)
+        return allowed, np.where(allowed, 0.0, oldest + self.window_size - now)
+
+    def replay(self, c: int, s: int, times, allowed, retry_after):
+        size = int(self.sizes[c, s])
+        start = int(self.offsets[c, s])
+        window_size = float(self.window_size[c, 0])
+        ring = deque(
+            np.roll(self.allowed_at[start : start + size], -self.head[c, s]).tolist(),
+            maxlen=size,
+        )
+
+        def check(now):
+            oldest = ring[0]
+            if oldest <= now - window_size:
+                ring.append(now)
+                return True, 0.0
+            return False, oldest + window_size - now
+
+        def evaluate(times):
+            oldest = ring[0]
+            return oldest <= times - window_size, oldest + window_size - times
+
+        _replay_subject(times, allowed, retry_after, check, evaluate)
+
+
+MODELS = {
+    "token_bucket": _TokenBucket,
+    "leaky_bucket": _LeakyBucket,
+    "sliding_window": _SlidingWindow,
+}
+
+
+def load_log(path: str):
+    """``timestamps, subjects`` of a CSV or NDJSON request log."""
+    timestamps, subjects = [], []
+    with open(path, newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    timestamps.append(entry.get("ts", entry.get("timestamp")))
+                    subjects.append(entry["subject"])
+        else:
+            for row in csv.reader(f):
+                if row and row[0] != "timestamp":
+                    timestamps.append(float(row[0]))
+                    subjects.append(row[1])
+    return np.array(timestamps, dtype=np.float64), np.array(subjects)
+
+
+def summarize(simulation: Simulation, report: Report, top: int = 10) -> dict:
+    worst = np.argsort(-report.over_limit_time, kind="stable")[:top]
+    percentiles = (50, 90, 99, 100)
+    return {
+        "algorithm": report.candidate.algorithm,
+        "capacity": report.candidate.capacity,
+        PARAM_NAMES[report.candidate.algorithm]: report.candidate.param,
+        "requests": report.requests,
+        "denied": report.denied,
+        "deny_rate": report.deny_rate,
+        "subjects_denied": int(np.count_nonzero(report.denied_per_subject)),
+        "over_limit": [
+            {
+                "subject": str(simulation.subjects[i]),
+                "seconds": float(report.over_limit_time[i]),
+                "denied": int(report.denied_per_subject[i]),
+            }
+            for i in worst
+            if report.over_limit_time[i] > 0
+        ],
+        "peak_requests": dict(
+            zip(map(str, percentiles), np.percentile(report.peak_requests, percentiles))
+        ),
+        "peak_allowed": dict(
+            zip(map(str, percentiles), np.percentile(report.peak_allowed, percentiles))
+        ),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("log", help="CSV or NDJSON request log")
+    parser.add_argument(
+        "--algorithm",
+        nargs="+",
+        choices=tuple(MODELS),
+        default=["token_bucket"],
+    )
+    parser.add_argument("--capacity", nargs="+", type=float, required=True)
+    parser.add_argument(
+        "--param",
+        nargs="+",
+        type=float,
+        required=True,
+        help="refill_rate, leak_rate or window_size",
+    )
+    parser.add_argument("--burst-window", type=float, default=1.0)
+    parser.add_argument("--top", type=int, default=10, help="worst subjects shown")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    simulation = Simulation(*load_log(args.log))
+    candidates = [
+        Candidate(*combination)
+        for combination in itertools.product(args.algorithm, args.capacity, args.param)
+    ]
+    reports = simulation.run(candidates, args.burst_window)
+    json.dump(
+        [summarize(simulation, report, args.top) for report in reports],
+        sys.stdout,
+        indent=2,
+    )
+    print()
+
+
+if __name__ == "__main__":
+    main()
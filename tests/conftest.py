@@ -1,8 +1,14 @@
 import pytest
 import pytest_asyncio
 import asyncio
-from redis.asyncio import Redis
-from distributed_rate_limiter_service.service.redis import RedisService
+import shutil
+import socket
+import subprocess
+import time
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis, RedisCluster
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.redis import RedisService, unpack_state
 
 pytest_plugins = ("pytest_asyncio",)
 
@@ -14,8 +20,35 @@ def event_loop():
     loop.close()
 
 
+class FakeClock:
+    """A clock that only moves when a test advances ``now``."""
+
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope="session")
+def redis_available():
+    """Whether a Redis server is listening; tests that need one skip otherwise."""
+    try:
+        socket.create_connection(("localhost", 6379), timeout=1).close()
+    except OSError:
+        return False
+    return True
+
+
 @pytest_asyncio.fixture
-async def redis_client():
+async def redis_client(redis_available):
+    if not redis_available:
+        pytest.skip("Redis is not running on localhost:6379")
     # Use test database index 9 (safe for tests)
     client = Redis(host="localhost", port=6379, db=9, decode_responses=True)
     await client.flushdb()
@@ -24,8 +57,118 @@ async def redis_client():
     await client.aclose()
 
 
+@pytest.fixture
+def read_state(redis_client):
+    """Decode the packed state the scripts keep under a key."""
+
+    async def read(algorithm, key):
+        raw = await redis_client.execute_command("GET", key, NEVER_DECODE=True)
+        return unpack_state(algorithm, raw)
+
+    return read
+
+
 @pytest_asyncio.fixture
 async def redis_service(redis_client):
     """Provide a RedisService instance for testing."""
     service = RedisService(redis=redis_client)
     return service
+
+
+def _free_cluster_port():
+    """A port whose cluster bus port (port + 10000) is also free."""
+    while True:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if port + 10000 > 65535:
+            continue
+        with socket.socket() as s:
+            try:
+                s.bind(("127.0.0.1", port + 10000))
+            except OSError:
+                continue
+        return port
+
+
+def _wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("redis cluster did not come up")
+
+
+@pytest.fixture(scope="session")
+def redis_cluster_nodes(tmp_path_factory):
+    """Start a local three-primary Redis Cluster from redis-server binaries."""
+    if not shutil.which("redis-server") or not shutil.which("redis-cli"):
+        pytest.skip("redis-server and redis-cli are required for cluster tests")
+
+    workdir = tmp_path_factory.mktemp("redis-cluster")
+    ports = [_free_cluster_port() for _ in range(3)]
+    processes = [
+        subprocess.Popen(
+            [
+                "redis-server",
+                "--port", str(port),
+                "--cluster-enabled", "yes",
+                "--cluster-config-file", f"nodes-{port}.conf",
+                "--save", "",
+                "--appendonly", "no",
+                "--dir", str(workdir),
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]  # fmt: skip
+    try:
+        for port in ports:
+            _wait_until(lambda: SyncRedis(port=port).ping())
+
+        subprocess.run(
+            ["redis-cli", "--cluster", "create"]
+            + [f"127.0.0.1:{port}" for port in ports]
+            + ["--cluster-replicas", "0", "--cluster-yes"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        for port in ports:
+            _wait_until(
+                lambda: SyncRedis(port=port).cluster("info")["cluster_state"] == "ok"
+            )
+        yield ports
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+@pytest_asyncio.fixture
+async def redis_cluster_client(redis_cluster_nodes):
+    client = RedisCluster(
+        host="127.0.0.1", port=redis_cluster_nodes[0], decode_responses=True
+    )
+    await client.flushall()
+    yield client
+    await client.flushall()
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def redis_cluster_service(redis_cluster_client):
+    """Provide a RedisService backed by the local Redis Cluster."""
+    return RedisService(redis=redis_cluster_client)
+
+
+@pytest.fixture(params=["redis", "local"])
+def limiter(request):
+    """Each backend in turn, for tests both must pass."""
+    if request.param == "local":
+        return LocalService()
+    return request.getfixturevalue("redis_service")
@@ -0,0 +1,76 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.main import create_app
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+from distributed_rate_limiter_service.service.local import LocalService
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["token_bucket", "leaky_bucket"])
+async def test_reservations_queue_up_in_order(limiter, algorithm):
+    check = RateLimitCheck(algorithm, "user:1", 2, 10.0)
+    for _ in range(2):
+        assert (await limiter.check(check))["allowed"]
+
+    first = await limiter.acquire(check, timeout=1, wait=False)
+    second = await limiter.acquire(check, timeout=1, wait=False)
+    assert first["allowed"] and second["allowed"]
+    assert first["wait"] == pytest.approx(0.1, abs=0.02)
+    assert second["wait"] == pytest.approx(0.2, abs=0.02)
+
+    # the next slot is ~0.3s out, beyond this timeout
+    late = await limiter.acquire(check, timeout=0.05, wait=False)
+    assert not late["allowed"]
+    assert late["wait"] == 0
+    assert late["retry_after"] == pytest.approx(0.25, abs=0.02)
+
+    # plain checks wait behind the reservations
+    denied = await limiter.check(check)
+    assert not denied["allowed"]
+    assert denied["remaining"] == 0
+    assert denied["retry_after"] == pytest.approx(0.3, abs=0.02)
+
+
+@pytest.mark.asyncio
+async def test_acquire_holds_the_caller_until_its_slot(limiter):
+    check = RateLimitCheck("token_bucket", "user:1", 1, 20.0)
+    await limiter.check(check)
+
+    start = time.perf_counter()
+    result = await limiter.acquire(check, timeout=1)
+
+    assert result["allowed"]
+    assert time.perf_counter() - start >= result["wait"] > 0
+
+
+@pytest.mark.asyncio
+async def test_only_buckets_take_reservations():
+    check = RateLimitCheck("sliding_window", "user:1", 1, 1.0)
+    with pytest.raises(ValueError, match="reservations"):
+        await LocalService().acquire(check, timeout=1)
+
+
+def test_open_breaker_answers_reservations_through_the_fallback(monkeypatch):
+    monkeypatch.setattr(settings, "redis_url", "redis://localhost:6379/9")
+    monkeypatch.setattr(settings, "breaker_fallback", "closed")
+    monkeypatch.setattr(settings, "breaker_reset_timeout", 5.0)
+    payload = {
+        "subject": "user:1",
+        "capacity": 1,
+        "refill_rate": 1.0,
+        "leak_rate": None,
+        "window_size": None,
+        "wait": False,
+    }
+    with TestClient(create_app()) as client:
+        breaker = client.app.state.limiter.breaker
+        breaker.opened_at = breaker.clock()
+
+        response = client.post("/v1/acquire/token_bucket", json=payload)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert response.headers["X-RateLimit-Fallback"] == "closed"
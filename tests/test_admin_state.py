@@ -0,0 +1,122 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.main import create_app
+from distributed_rate_limiter_service.service.limiter import (
+    ALGORITHMS,
+    RATE_ALGORITHMS,
+    RateLimitCheck,
+)
+
+
+async def export(service, algorithm, match="*"):
+    return [record async for record in service.scan_state(algorithm, match, count=2)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+async def test_exported_state_imports_back(redis_service, redis_client, algorithm):
+    param = 1.0 if algorithm in RATE_ALGORITHMS else 60.0
+    check = RateLimitCheck(algorithm, "user:1", 5, param, cost=2)
+    await redis_service.check(check)
+    await redis_service.check(check)
+
+    records = await export(redis_service, algorithm)
+    assert [record["subject"] for record in records] == ["user:1"]
+    assert 0 < records[0]["ttl"] <= 120
+
+    await redis_client.flushdb()
+    assert await redis_service.import_state(json.loads(json.dumps(records))) == 1
+
+    # the imported state carries on where it left off
+    assert (await redis_service.check(check._replace(cost=1)))["remaining"] == 0
+    assert not (await redis_service.check(check._replace(cost=1)))["allowed"]
+
+
+@pytest.mark.asyncio
+async def test_scan_state_decodes_each_algorithm(redis_service):
+    await redis_service.check(RateLimitCheck("token_bucket", "user:1", 5, 1.0, 2))
+    await redis_service.check(RateLimitCheck("sliding_window", "user:1", 5, 10.0, 3))
+
+    (bucket,) = await export(redis_service, "token_bucket")
+    assert bucket["state"]["tokens"] == pytest.approx(3, abs=0.01)
+    (window,) = await export(redis_service, "sliding_window")
+    ((_, units),) = window["state"]["units"]
+    assert units == 3
+
+
+@pytest.mark.asyncio
+async def test_reset_state_by_pattern(redis_service):
+    for subject in ("tenant:1:a", "tenant:1:b", "tenant:2:a"):
+        await redis_service.check(RateLimitCheck("gcra", subject, 1, 1.0))
+
+    assert await redis_service.reset_state("gcra", "tenant:1:*", count=1) == 2
+
+    remaining = await export(redis_service, "gcra")
+    assert [record["subject"] for record in remaining] == ["tenant:2:a"]
+    check = RateLimitCheck("gcra", "tenant:1:a", 1, 1.0)
+    assert (await redis_service.check(check))["allowed"]
+
+
+@pytest.mark.asyncio
+async def test_cluster_state_is_found_through_hash_tags(redis_cluster_service):
+    subjects = ["tenant:1:a", "tenant:1:b", "tenant:2:a", "{tenant:1}:c"]
+    for subject in subjects:
+        await redis_cluster_service.check(RateLimitCheck("gcra", subject, 1, 0.01))
+
+    records = await export(redis_cluster_service, "gcra")
+    assert sorted(record["subject"] for record in records) == sorted(subjects)
+
+    assert await redis_cluster_service.reset_state("gcra", "tenant:1:*", count=1) == 2
+    remaining = await export(redis_cluster_service, "gcra")
+    assert sorted(record["subject"] for record in remaining) == [
+        "tenant:2:a",
+        "{tenant:1}:c",
+    ]
+
+    assert await redis_cluster_service.import_state(records) == 4
+    check = RateLimitCheck("gcra", "tenant:1:a", 1, 0.01)
+    assert not (await redis_cluster_service.check(check))["allowed"]
+
+
+@pytest.mark.asyncio
+async def test_legacy_hash_state_is_exported(redis_service, redis_client):
+    await redis_client.hset("tb:user:1", mapping={"tokens": 2, "last_refill_ts": 1})
+    await redis_client.expire("tb:user:1", 60)
+
+    (record,) = await export(redis_service, "token_bucket")
+    assert record["state"] == {"tokens": 2.0, "last_refill_ts": 1.0}
+
+
+def test_state_endpoints(monkeypatch, redis_client):
+    monkeypatch.setattr(settings, "redis_url", "redis://localhost:6379/9")
+    monkeypatch.setattr(settings, "deny_cache_size", 0)
+    payload = {
+        "subject": "user:1",
+        "capacity": 1,
+        "refill_rate": 0.5,
+        "leak_rate": None,
+        "window_size": None,
+    }
+    with TestClient(create_app()) as client:
+        client.post("/v1/check/token_bucket", json=payload)
+
+        exported = client.get("/v1/admin/state", params={"match": "user:*"})
+        assert exported.headers["content-type"] == "application/x-ndjson"
+        lines = exported.text.splitlines()
+        assert [json.loads(line)["subject"] for line in lines] == ["user:1"]
+
+        assert client.delete("/v1/admin/state", params={"match": "user:*"}).json() == {
+            "deleted": 1
+        }
+        assert client.post("/v1/check/token_bucket", json=payload).status_code == 200
+
+        imported = client.post("/v1/admin/state", content=exported.text)
+        assert imported.json() == {"imported": 1}
+        assert client.post("/v1/check/token_bucket", json=payload).status_code == 429
+
+        invalid = client.post("/v1/admin/state", content='{"algorithm":"x"}\n')
+        assert invalid.status_code == 400
+        assert invalid.json()["detail"].startswith("line 1:")
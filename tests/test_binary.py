@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+import pytest
+
+from distributed_rate_limiter_service.api.binary import BinaryClient, BinaryServer
+from distributed_rate_limiter_service.core.models import PolicyConfig
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+
+
+@pytest.fixture
+def policies():
+    return PolicyRegistry(
+        {"login": PolicyConfig(algorithm="sliding_window", capacity=2, window_size=60)}
+    )
+
+
+@contextlib.asynccontextmanager
+async def serve(limiter, policies, path=None):
+    handler = BinaryServer(limiter, policies).handle
+    if path is None:
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = await BinaryClient.connect("127.0.0.1", port)
+    else:
+        server = await asyncio.start_unix_server(handler, path)
+        client = await BinaryClient.connect(path=path)
+    try:
+        yield client
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_pipelined_checks_over_tcp(redis_service, policies):
+    async with serve(redis_service, policies) as client:
+        results = await asyncio.gather(
+            *(client.check("token_bucket", "user:1", 10, 0.001) for _ in range(50))
+        )
+
+    assert sum(result["allowed"] for result in results) == 10
+    denied = next(result for result in results if not result["allowed"])
+    assert denied["remaining"] == 0
+    assert denied["retry_after"] > 0
+
+
+@pytest.mark.asyncio
+async def test_policy_checks_and_errors(policies):
+    async with serve(LocalService(), policies) as client:
+        first = await client.check_policy("login", "user:1")
+        second = await client.check_policy("login", "user:1")
+        third = await client.check_policy("login", "user:1")
+
+        with pytest.raises(ValueError, match="policy not found"):
+            await client.check_policy("missing", "user:1")
+        with pytest.raises(ValueError, match="cost"):
+            await client.check("gcra", "user:1", 5, 1.0, cost=6)
+
+        # the connection stays usable after an error
+        assert (await client.check("gcra", "user:2", 5, 1.0))["allowed"]
+
+    assert [first["remaining"], second["remaining"]] == [1, 0]
+    assert not third["allowed"]
+
+
+@pytest.mark.asyncio
+async def test_checks_over_unix_socket(tmp_path, policies):
+    async with serve(
+        LocalService(), policies, str(tmp_path / "limiter.sock")
+    ) as client:
+        result = await client.check("leaky_bucket", "user:1", 3, 1.0, cost=2)
+
+    assert result == {
+        "allowed": True,
+        "remaining": 1,
+        "retry_after": 0.0,
+        "reset_after": 2.0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_invalid_params_are_rejected(limiter, policies):
+    async with serve(limiter, policies) as client:
+        with pytest.raises(ValueError, match="refill_rate must be"):
+            await client.check("token_bucket", "user:1", 5, 0.0)
+        with pytest.raises(ValueError, match="window_size must be"):
+            await client.check("sliding_window", "user:1", 5, float("nan"))
+        with pytest.raises(ValueError, match="capacity must be"):
+            await client.check("gcra", "user:1", float("inf"), 1.0)
@@ -0,0 +1,142 @@
+import asyncio
+import contextlib
+import time
+import pytest
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from distributed_rate_limiter_service.service.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    Fallback,
+)
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+from distributed_rate_limiter_service.service.redis import OUTAGE_ERRORS, RedisService
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def succeed():
+    return "ok"
+
+
+@contextlib.asynccontextmanager
+async def stalled_redis():
+    """A Redis client whose server accepts connections but never replies."""
+
+    async def stall(reader, writer):
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_server(stall, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = Redis(host="127.0.0.1", port=port)
+    try:
+        yield client
+    finally:
+        await client.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_recovers_through_a_trial_call(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5, clock=clock)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+
+    clock.now += 5
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    # a failed trial opens the breaker again right away
+    assert breaker.state == OPEN
+
+    clock.now += 5
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_stalled_redis_is_bounded_by_the_breaker_timeout():
+    async with stalled_redis() as redis:
+        service = RedisService(
+            redis,
+            breaker=CircuitBreaker(timeout=0.05, failure_threshold=1),
+            fallback=Fallback("local", replicas=2),
+        )
+
+        start = time.perf_counter()
+        first = await service.check_token_bucket("user:1", 10, 0.001)
+        assert time.perf_counter() - start < 1
+        assert service.fallback_mode == "local"
+
+        # the open breaker skips Redis; this worker gets half the capacity
+        results = [first] + [
+            await service.check_token_bucket("user:1", 10, 0.001) for _ in range(9)
+        ]
+
+    assert [r["allowed"] for r in results] == [True] * 5 + [False] * 5
+
+
+@pytest.mark.asyncio
+async def test_fail_open_and_fail_closed():
+    check = RateLimitCheck("gcra", "user:1", 10, 1.0, 3)
+
+    assert await Fallback("open").evaluate(check) == (1, 7, 0.0, 0.0)
+    assert await Fallback("closed", retry_after=5).evaluate(check) == (0, 0, 5, 5)
+
+
+@pytest.mark.asyncio
+async def test_healthy_redis_stays_closed(redis_client):
+    service = RedisService(
+        redis_client,
+        breaker=CircuitBreaker(timeout=1),
+        fallback=Fallback("closed"),
+    )
+
+    results = await service.check_many(
+        [RateLimitCheck("token_bucket", "user:1", 1, 0.001)] * 2
+    )
+
+    assert [r["allowed"] for r in results["results"]] == [True, False]
+    assert service.fallback_mode is None
+
+
+@pytest.mark.asyncio
+async def test_script_errors_are_not_an_outage(redis_client):
+    await redis_client.rpush("tb:user:1", "not a bucket")
+    service = RedisService(
+        redis_client,
+        breaker=CircuitBreaker(timeout=1),
+        fallback=Fallback("open"),
+    )
+
+    with pytest.raises(ResponseError, match="WRONGTYPE"):
+        await service.check_token_bucket("user:1", 10, 1.0)
+    assert service.fallback_mode is None
+
+
+@pytest.mark.asyncio
+async def test_script_errors_leave_the_breaker_closed(redis_client):
+    await redis_client.rpush("tb:user:1", "not a bucket")
+    breaker = CircuitBreaker(timeout=1, failure_threshold=2, errors=OUTAGE_ERRORS)
+    service = RedisService(redis_client, breaker=breaker, fallback=Fallback("open"))
+
+    for _ in range(5):
+        with pytest.raises(ResponseError, match="WRONGTYPE"):
+            await service.check_token_bucket("user:1", 10, 1.0)
+
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert (await service.check_token_bucket("user:2", 10, 1.0))["allowed"]
@@ -0,0 +1,101 @@
+import pytest
+
+from distributed_rate_limiter_service.service.redis import RateLimitCheck
+
+
+@pytest.mark.asyncio
+async def test_check_many_returns_results_in_order(redis_service):
+    """Test that a mixed batch is evaluated and returned in request order."""
+    checks = [
+        RateLimitCheck("token_bucket", "user:1", 5, 1.0),
+        RateLimitCheck("leaky_bucket", "user:1", 5, 1.0),
+        RateLimitCheck("sliding_window", "user:1", 5, 10),
+    ]
+
+    result = await redis_service.check_many(checks)
+
+    assert result["allowed"] is True
+    assert [r["allowed"] for r in result["results"]] == [True, True, True]
+    assert result["results"][0]["remaining"] == 4
+    assert result["results"][1]["remaining"] == 4
+    assert result["results"][2]["remaining"] == 4
+
+
+@pytest.mark.asyncio
+async def test_check_many_shares_state_with_single_checks(redis_service):
+    """Test that batch checks consume the same buckets as single checks."""
+    await redis_service.check_sliding_window("user:2", 2, 10)
+
+    result = await redis_service.check_many(
+        [RateLimitCheck("sliding_window", "user:2", 2, 10)]
+    )
+    assert result["results"][0]["allowed"] is True
+
+    r = await redis_service.check_sliding_window("user:2", 2, 10)
+    assert r["allowed"] is False
+
+
+@pytest.mark.asyncio
+async def test_check_many_partial_denial_consumes_allowed(redis_service):
+    """Test that without all_or_nothing allowed checks still consume."""
+    await redis_service.check_token_bucket("tenant:1", 1, 0.001)
+
+    result = await redis_service.check_many(
+        [
+            RateLimitCheck("token_bucket", "user:3", 1, 0.001),
+            RateLimitCheck("token_bucket", "tenant:1", 1, 0.001),
+        ]
+    )
+
+    assert result["allowed"] is False
+    assert [r["allowed"] for r in result["results"]] == [True, False]
+
+    r = await redis_service.check_token_bucket("user:3", 1, 0.001)
+    assert r["allowed"] is False
+
+
+@pytest.mark.asyncio
+async def test_check_many_all_or_nothing_consumes_nothing_on_denial(redis_service):
+    """Test that all_or_nothing leaves every bucket untouched on denial."""
+    await redis_service.check_leaky_bucket("tenant:2", 1, 0.001)
+
+    result = await redis_service.check_many(
+        [
+            RateLimitCheck("token_bucket", "user:4", 1, 0.001),
+            RateLimitCheck("sliding_window", "user:4", 1, 10),
+            RateLimitCheck("leaky_bucket", "tenant:2", 1, 0.001),
+        ],
+        all_or_nothing=True,
+    )
+
+    assert result["allowed"] is False
+    assert [r["allowed"] for r in result["results"]] == [True, True, False]
+
+    r1 = await redis_service.check_token_bucket("user:4", 1, 0.001)
+    r2 = await redis_service.check_sliding_window("user:4", 1, 10)
+    assert r1["allowed"] is True
+    assert r2["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_check_many_all_or_nothing_commits_when_all_allow(redis_service):
+    """Test that all_or_nothing consumes every bucket when all allow."""
+    checks = [
+        RateLimitCheck("token_bucket", "user:5", 1, 0.001),
+        RateLimitCheck("leaky_bucket", "user:5", 1, 0.001),
+        RateLimitCheck("sliding_window", "user:5", 1, 10),
+    ]
+
+    first = await redis_service.check_many(checks, all_or_nothing=True)
+    second = await redis_service.check_many(checks, all_or_nothing=True)
+
+    assert first["allowed"] is True
+    assert second["allowed"] is False
+    assert [r["allowed"] for r in second["results"]] == [False, False, False]
+
+
+@pytest.mark.asyncio
+async def test_check_many_rejects_unknown_algorithm(redis_service):
+    """Test that an unknown algorithm is rejected before touching Redis."""
+    with pytest.raises(ValueError):
+        await redis_service.check_many([RateLimitCheck("fixed_window", "u", 1, 1)])
@@ -0,0 +1,118 @@
+import pytest
+
+from distributed_rate_limiter_service.service.redis import hash_tagged_key
+
+
+def test_hash_tagged_key_wraps_plain_subjects():
+    assert hash_tagged_key("tb", "user:1") == "tb:{user:1}"
+    assert hash_tagged_key("tb", "{tenant:1}:user:1") == "tb:{tenant:1}:user:1"
+    # an empty tag does not count, so the subject is still wrapped
+    assert hash_tagged_key("tb", "{}user:1}") == "tb:{{}user:1}}"
+
+
+@pytest.mark.asyncio
+async def test_cluster_single_checks(redis_cluster_service, redis_cluster_client):
+    """Test that every algorithm runs against a cluster with tagged keys."""
+    service = redis_cluster_service
+
+    r1 = await service.check_token_bucket("user:1", 1, 0.001)
+    r2 = await service.check_token_bucket("user:1", 1, 0.001)
+    r3 = await service.check_leaky_bucket("user:1", 5, 1.0)
+    r4 = await service.check_sliding_window("user:1", 5, 10)
+    r5 = await service.check_sliding_window_counter("user:1", 5, 10)
+    r6 = await service.check_gcra("user:1", 5, 1.0)
+
+    assert r1["allowed"] is True
+    assert r2["allowed"] is False
+    assert all(r["allowed"] for r in (r3, r4, r5, r6))
+    assert await redis_cluster_client.exists("tb:{user:1}") == 1
+    assert await redis_cluster_client.exists("gcra:{user:1}") == 1
+
+
+@pytest.mark.asyncio
+async def test_cluster_batch_spans_nodes(redis_cluster_service):
+    """Test that a pipelined batch can touch keys owned by every node."""
+    checks = [("token_bucket", f"user:{i}", 1, 0.001) for i in range(30)]
+
+    first = await redis_cluster_service.check_many(checks)
+    second = await redis_cluster_service.check_many(checks)
+
+    assert first["allowed"] is True
+    assert [r["allowed"] for r in second["results"]] == [False] * 30
+
+
+@pytest.mark.asyncio
+async def test_cluster_all_or_nothing_with_shared_tag(redis_cluster_service):
+    """Test that subjects sharing a hash tag can be checked atomically."""
+    checks = [
+        ("token_bucket", "{tenant:1}:user:1", 1, 0.001),
+        ("sliding_window", "{tenant:1}", 2, 10),
+    ]
+
+    first = await redis_cluster_service.check_many(checks, all_or_nothing=True)
+    second = await redis_cluster_service.check_many(checks, all_or_nothing=True)
+
+    assert first["allowed"] is True
+    assert second["allowed"] is False
+    assert second["results"][1]["remaining"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cluster_all_or_nothing_rejects_cross_slot(redis_cluster_service):
+    """Test that atomic batches spanning slots are rejected up front."""
+    checks = [
+        ("token_bucket", "user:1", 1, 1.0),
+        ("token_bucket", "user:2", 1, 1.0),
+    ]
+
+    with pytest.raises(ValueError):
+        await redis_cluster_service.check_many(checks, all_or_nothing=True)
+
+
+@pytest.mark.asyncio
+async def test_cluster_reloads_scripts(redis_cluster_service, redis_cluster_client):
+    """Test that NOSCRIPT from any node reloads the scripts cluster-wide."""
+    await redis_cluster_service.scripts.load()
+    await redis_cluster_client.script_flush()
+
+    r = await redis_cluster_service.check_token_bucket("user:1", 1, 1.0)
+    result = await redis_cluster_service.check_many(
+        [("gcra", f"user:{i}", 1, 1.0) for i in range(10)]
+    )
+
+    assert r["allowed"] is True
+    assert result["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_cluster_memory_report_scans_every_node(redis_cluster_service):
+    """Test that the memory report counts keys on all primaries."""
+    await redis_cluster_service.check_many(
+        [("gcra", f"user:{i}", 5, 1.0) for i in range(30)]
+    )
+
+    report = await redis_cluster_service.memory_usage()
+
+    assert report["gcra"]["keys"] == 30
+    assert report["gcra"]["bytes"] > 0
+
+
+@pytest.mark.asyncio
+async def test_cluster_reload_replays_only_missing_calls(
+    redis_cluster_service, redis_cluster_client
+):
+    """Test that a NOSCRIPT on one node does not recharge the other nodes."""
+    await redis_cluster_service.scripts.load()
+    flushed = redis_cluster_client.get_node_from_key("tb:{user:0}")
+    other = next(
+        f"user:{i}"
+        for i in range(1, 100)
+        if redis_cluster_client.get_node_from_key(f"tb:{{user:{i}}}") != flushed
+    )
+    await redis_cluster_client.execute_command("SCRIPT FLUSH", target_nodes=flushed)
+
+    result = await redis_cluster_service.check_many(
+        [("token_bucket", "user:0", 10, 0.001), ("token_bucket", other, 10, 0.001)]
+    )
+
+    assert [r["remaining"] for r in result["results"]] == [9, 9]
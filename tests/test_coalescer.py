@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from redis.asyncio import BlockingConnectionPool
+from redis.exceptions import ResponseError
+
+from distributed_rate_limiter_service.core.config import Settings
+from distributed_rate_limiter_service.core.utils import create_redis
+from distributed_rate_limiter_service.service.coalescer import Coalescer
+from distributed_rate_limiter_service.service.redis import SCRIPTS, RedisService
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+
+
+def coalescing_service(redis_client, monkeypatch, window=0.001, max_batch=64):
+    """A coalescing RedisService and the list of pipelines it sends."""
+    scripts = ScriptRegistry(redis_client, SCRIPTS)
+    pipelines = []
+    evalsha_many = scripts.evalsha_many
+
+    async def counting(calls, raise_on_error=True):
+        calls = list(calls)
+        pipelines.append(len(calls))
+        return await evalsha_many(calls, raise_on_error)
+
+    monkeypatch.setattr(scripts, "evalsha_many", counting)
+    coalescer = Coalescer(scripts, window, max_batch)
+    return RedisService(redis_client, scripts, coalescer=coalescer), pipelines
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checks_share_a_pipeline(redis_client, monkeypatch):
+    """Test that checks made together reach Redis in one round trip."""
+    service, pipelines = coalescing_service(redis_client, monkeypatch)
+
+    results = await asyncio.gather(
+        *(service.check_token_bucket("user:1", 10, 0.001) for _ in range(30))
+    )
+
+    assert sum(r["allowed"] for r in results) == 10
+    assert pipelines == [30]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_before_the_window_ends(redis_client, monkeypatch):
+    """Test that max_batch waiting checks are flushed right away."""
+    service, pipelines = coalescing_service(
+        redis_client, monkeypatch, window=60, max_batch=5
+    )
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(service.check_gcra(f"user:{i}", 1, 1.0) for i in range(10))),
+        timeout=5,
+    )
+
+    assert all(r["allowed"] for r in results)
+    assert pipelines == [5, 5]
+
+
+@pytest.mark.asyncio
+async def test_zero_window_batches_one_loop_iteration(redis_client, monkeypatch):
+    """Test that a zero window still groups calls made in the same iteration."""
+    service, pipelines = coalescing_service(redis_client, monkeypatch, window=0)
+
+    await asyncio.gather(
+        *(service.check_leaky_bucket(f"user:{i}", 5, 1.0) for i in range(8))
+    )
+    await service.check_leaky_bucket("user:1", 5, 1.0)
+
+    assert pipelines == [8, 1]
+
+
+@pytest.mark.asyncio
+async def test_failed_call_only_fails_its_caller(redis_client, monkeypatch):
+    """Test that one erroring script call does not fail the rest of the batch."""
+    service, _ = coalescing_service(redis_client, monkeypatch)
+    await redis_client.rpush("tb:broken", "x")
+
+    results = await asyncio.gather(
+        service.check_token_bucket("broken", 5, 1.0),
+        service.check_token_bucket("user:1", 5, 1.0),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], ResponseError)
+    assert results[1]["allowed"] is True
+
+
+def test_pool_settings_are_applied():
+    redis = create_redis(
+        Settings(
+            redis_url="redis://localhost:6379/9",
+            redis_max_connections=7,
+            redis_pool_timeout=0.5,
+            redis_health_check_interval=10,
+        )
+    )
+    pool = redis.connection_pool
+
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool.max_connections == 7
+    assert pool.timeout == 0.5
+    assert pool.connection_kwargs["health_check_interval"] == 10
@@ -0,0 +1,87 @@
+import json
+import pytest
+
+from distributed_rate_limiter_service.core.models import CompositePolicyConfig
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+
+LEVELS = {
+    "levels": [
+        {
+            "algorithm": "token_bucket",
+            "capacity": 2,
+            "refill_rate": 0.001,
+            "subject": "user:{tenant}:{user}",
+        },
+        {
+            "algorithm": "sliding_window",
+            "capacity": 3,
+            "window_size": 60,
+            "subject": "tenant:{tenant}",
+        },
+    ]
+}
+
+
+@pytest.fixture
+def composite():
+    registry = PolicyRegistry({"api": CompositePolicyConfig.model_validate(LEVELS)})
+    return registry.get_composite("api")
+
+
+@pytest.mark.asyncio
+async def test_composite_denial_consumes_no_level(limiter, composite):
+    alice = {"tenant": "acme", "user": "alice"}
+    bob = {"tenant": "acme", "user": "bob"}
+
+    assert (await limiter.check_composite(composite, alice))["allowed"]
+    assert (await limiter.check_composite(composite, alice))["allowed"]
+    denied = await limiter.check_composite(composite, alice)
+    assert not denied["allowed"]
+    assert denied["retry_after"] > 0
+
+    # alice's denial left the tenant window untouched
+    result = await limiter.check_composite(composite, bob)
+    assert result["allowed"]
+    assert result["remaining"] == 0
+
+    # now the tenant denies, and bob's bucket keeps its last token
+    result = await limiter.check_composite(composite, bob)
+    assert not result["allowed"]
+    user, tenant = result["results"]
+    assert user == {**user, "allowed": True, "remaining": 1}
+    assert not tenant["allowed"]
+
+
+@pytest.mark.asyncio
+async def test_composite_requires_every_subject(composite):
+    with pytest.raises(ValueError, match="'user' not found"):
+        await LocalService().check_composite(composite, {"tenant": "acme"})
+
+
+def test_composite_policies_load_from_file(tmp_path):
+    path = tmp_path / "policies.json"
+    path.write_text(
+        json.dumps(
+            {
+                "api": LEVELS,
+                "login": {"algorithm": "gcra", "capacity": 1, "refill_rate": 1},
+            }
+        )
+    )
+    registry = PolicyRegistry(path=str(path))
+
+    assert registry.get("login").algorithm == "gcra"
+    assert registry.get("api") is None
+    levels = registry.get_composite("api").levels
+    assert [(policy.algorithm, subject) for policy, subject in levels] == [
+        ("token_bucket", "user:{tenant}:{user}"),
+        ("sliding_window", "tenant:{tenant}"),
+    ]
+
+
+def test_composite_subject_templates_are_plain_names():
+    config = json.loads(json.dumps(LEVELS))
+    config["levels"][1]["subject"] = "tenant:{tenant.__class__}"
+    with pytest.raises(ValueError, match="invalid subject"):
+        PolicyRegistry({"api": CompositePolicyConfig.model_validate(config)})
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+
+ALGORITHMS = [
+    ("check_token_bucket", 0.001),
+    ("check_leaky_bucket", 0.001),
+    ("check_sliding_window", 60),
+    ("check_sliding_window_counter", 60),
+    ("check_gcra", 0.001),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method, param", ALGORITHMS)
+async def test_cost_consumes_multiple_units(redis_service, method, param):
+    """Test that a weighted request consumes cost units in one call."""
+    check = getattr(redis_service, method)
+    subject = "user:1:endpoint:/upload"
+
+    r1 = await check(subject, 10, param, cost=4)
+    r2 = await check(subject, 10, param, cost=4)
+    r3 = await check(subject, 10, param, cost=4)
+
+    assert r1["allowed"] is True
+    assert r1["remaining"] == 6
+    assert r2["allowed"] is True
+    assert r2["remaining"] == 2
+    assert r3["allowed"] is False
+    # partial denial: the units still available are reported
+    assert r3["remaining"] == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method, param", ALGORITHMS)
+async def test_denied_cost_does_not_consume(redis_service, method, param):
+    """Test that a denied weighted request leaves the remaining units usable."""
+    check = getattr(redis_service, method)
+    subject = "user:2:endpoint:/upload"
+
+    await check(subject, 5, param, cost=3)
+    denied = await check(subject, 5, param, cost=3)
+    allowed = await check(subject, 5, param, cost=2)
+
+    assert denied["allowed"] is False
+    assert allowed["allowed"] is True
+    assert allowed["remaining"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cost_retry_after_scales_with_cost(redis_service):
+    """Test that retry_after covers the whole cost, not a single unit."""
+    subject = "user:3:endpoint:/upload"
+
+    await redis_service.check_token_bucket(subject, 10, 10.0, cost=10)
+    r = await redis_service.check_token_bucket(subject, 10, 10.0, cost=5)
+
+    assert r["allowed"] is False
+    assert r["retry_after"] == pytest.approx(0.5, abs=0.02)
+
+    await asyncio.sleep(r["retry_after"] + 0.01)
+    r = await redis_service.check_token_bucket(subject, 10, 10.0, cost=5)
+    assert r["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_cost_in_sliding_window_expires_together(redis_service):
+    """Test that all units of one request leave the window at the same time."""
+    subject = "user:4:endpoint:/upload"
+
+    r1 = await redis_service.check_sliding_window(subject, 3, 1, cost=3)
+    r2 = await redis_service.check_sliding_window(subject, 3, 1)
+    assert r1["allowed"] is True
+    assert r2["allowed"] is False
+
+    await asyncio.sleep(1.05)
+    r3 = await redis_service.check_sliding_window(subject, 3, 1, cost=3)
+    assert r3["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_large_cost_in_sliding_window_is_one_member(redis_service, redis_client):
+    """Test that a sliding window stores a request once, whatever its cost."""
+    subject = "user:7:endpoint:/export"
+
+    r1 = await redis_service.check_sliding_window(subject, 2_500_000, 60, 1_000_000)
+    r2 = await redis_service.check_sliding_window(subject, 2_500_000, 60, 1_000_000)
+    r3 = await redis_service.check_sliding_window(subject, 2_500_000, 60, 1_000_000)
+
+    assert [r1["allowed"], r2["allowed"], r3["allowed"]] == [True, True, False]
+    assert r3["remaining"] == 500_000
+    assert 59 < r3["retry_after"] <= 60
+    assert await redis_client.zcard(f"sw:{subject}") == 2
+
+
+@pytest.mark.asyncio
+async def test_cost_in_batch(redis_service):
+    """Test that batch checks thread cost through to every algorithm."""
+    result = await redis_service.check_many(
+        [
+            ("token_bucket", "user:5", 10, 0.001, 7),
+            ("sliding_window", "user:5", 10, 60, 7),
+        ],
+        all_or_nothing=True,
+    )
+
+    assert [r["remaining"] for r in result["results"]] == [3, 3]
+
+
+@pytest.mark.asyncio
+async def test_cost_above_capacity_is_rejected(redis_service):
+    """Test that a request that could never be allowed is rejected."""
+    with pytest.raises(ValueError):
+        await redis_service.check_token_bucket("user:6", 5, 1.0, cost=6)
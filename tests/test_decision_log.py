@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.main import create_app
+from distributed_rate_limiter_service.service.decision_log import (
+    DecisionLog,
+    FileSink,
+    StreamSink,
+)
+from distributed_rate_limiter_service.service.limiter import ALGORITHMS, RateLimitCheck
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.metrics import Metrics
+
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+
+    async def write(self, lines):
+        self.batches.append(lines)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+async def test_peek_consumes_nothing(limiter, algorithm):
+    check = RateLimitCheck(algorithm, "user:1", 2, 1.0)
+    await limiter.check(check)
+
+    for _ in range(3):
+        result = await limiter.peek(check)
+        assert result["allowed"]
+        assert result["remaining"] == 0
+
+    assert (await limiter.check(check))["allowed"]
+    denied = await limiter.peek(check)
+    assert not denied["allowed"]
+    assert denied["retry_after"] > 0
+
+
+@pytest.mark.asyncio
+async def test_peek_with_a_stricter_limit_reads_the_enforced_state(limiter):
+    for _ in range(3):
+        await limiter.check(RateLimitCheck("sliding_window", "user:1", 5, 10.0))
+
+    stricter = await limiter.peek(RateLimitCheck("sliding_window", "user:1", 3, 10.0))
+    assert not stricter["allowed"]
+
+    enforced = await limiter.check(RateLimitCheck("sliding_window", "user:1", 5, 10.0))
+    assert enforced["allowed"]
+    assert enforced["remaining"] == 1
+
+
+@pytest.mark.asyncio
+async def test_decisions_are_sampled_and_flushed_in_batches():
+    sink = ListSink()
+    log = DecisionLog(sink, sample_rate=1.0, batch_size=2)
+    limiter = LocalService(decision_log=log)
+    check = RateLimitCheck("token_bucket", "user:1", 1, 1.0)
+
+    await limiter.check(check)
+    await limiter.check(check)
+    await limiter.peek(check)
+    assert sink.batches == []
+
+    await log.flush()
+    entries = [json.loads(line) for batch in sink.batches for line in batch]
+    assert [len(batch) for batch in sink.batches] == [2, 1]
+    assert [entry["allowed"] for entry in entries] == [True, False, False]
+    assert [entry["shadow"] for entry in entries] == [False, False, True]
+    assert entries[0]["subject"] == "user:1"
+
+    log.sample_rate = 0.0
+    await limiter.check(check)
+    await log.flush()
+    assert len(sink.batches) == 2
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_the_oldest_decisions():
+    sink = ListSink()
+    metrics = Metrics()
+    log = DecisionLog(
+        sink, sample_rate=1.0, buffer_size=2, on_drop=metrics.decisions_dropped.inc
+    )
+    for i in range(3):
+        check = RateLimitCheck("gcra", f"user:{i}", 1, 1.0)
+        log.record(check, {"allowed": True, "remaining": 0, "retry_after": 0.0})
+
+    await log.flush()
+    subjects = [json.loads(line)["subject"] for line in sink.batches[0]]
+    assert subjects == ["user:1", "user:2"]
+    assert log.dropped == 1
+    dropped = "rate_limiter_decision_log_dropped_total"
+    assert metrics.registry.get_sample_value(dropped) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_writer_keeps_the_batch_it_was_writing():
+    class StalledSink(ListSink):
+        def __init__(self):
+            super().__init__()
+            self.writing = asyncio.Event()
+
+        async def write(self, lines):
+            self.writing.set()
+            await asyncio.Event().wait()
+
+    log = DecisionLog(StalledSink(), sample_rate=1.0, flush_interval=0)
+    check = RateLimitCheck("gcra", "user:1", 1, 1.0)
+    log.record(check, {"allowed": True, "remaining": 0, "retry_after": 0.0})
+    writer = asyncio.create_task(log.run())
+    await log.sink.writing.wait()
+
+    writer.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await writer
+    log.sink = ListSink()
+    await log.flush()
+
+    assert [json.loads(line)["subject"] for line in log.sink.batches[0]] == ["user:1"]
+
+
+@pytest.mark.asyncio
+async def test_file_and_stream_sinks(tmp_path, redis_client):
+    path = tmp_path / "decisions.ndjson"
+    await FileSink(str(path)).write(['{"a":1}', '{"a":2}'])
+    await FileSink(str(path)).write(['{"a":3}'])
+    assert path.read_text().splitlines() == ['{"a":1}', '{"a":2}', '{"a":3}']
+
+    await StreamSink(redis_client, "decisions").write(['{"a":1}', '{"a":2}'])
+    entries = await redis_client.xrange("decisions")
+    assert [fields["decision"] for _, fields in entries] == ['{"a":1}', '{"a":2}']
+
+
+def test_shadow_checks_always_succeed(monkeypatch):
+    monkeypatch.setattr(settings, "backend", "local")
+    monkeypatch.setattr(settings, "deny_cache_size", 0)
+    payload = {
+        "subject": "user:1",
+        "capacity": 1,
+        "refill_rate": 0.5,
+        "leak_rate": None,
+        "window_size": None,
+    }
+    with TestClient(create_app()) as client:
+        assert client.post("/v1/check/token_bucket", json=payload).status_code == 200
+
+        shadow = client.post("/v1/check/token_bucket?shadow=true", json=payload)
+        assert shadow.status_code == 200
+        assert shadow.headers["RateLimit-Shadow"] == "denied"
+        assert "RateLimit-Limit" not in shadow.headers
+        assert shadow.json()["allowed"] is False
+
+        # the shadow check left the bucket as it was
+        enforced = client.post("/v1/check/token_bucket", json=payload)
+        assert enforced.status_code == 429
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.redis import RedisService
+
+
+@pytest.fixture
+def cached_service(redis_client):
+    return RedisService(redis=redis_client, deny_cache=DenyCache(maxsize=2))
+
+
+def test_deny_cache_expires_entries():
+    cache = DenyCache()
+    cache.deny("a", 0.05, 0.2)
+
+    retry_after, reset_after = cache.get("a")
+    assert 0 < retry_after <= 0.05
+    assert 0.15 < reset_after <= 0.2
+
+    denied_until, reset_at = cache._entries["a"]
+    cache._entries["a"] = (denied_until - 1, reset_at)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_deny_cache_evicts_least_recently_used():
+    cache = DenyCache(maxsize=2)
+    cache.deny("a", 10)
+    cache.deny("b", 10)
+    cache.get("a")
+    cache.deny("c", 10)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+@pytest.mark.asyncio
+async def test_cached_denial_skips_redis(cached_service, redis_client):
+    """Test that a denied subject is answered locally until it can refill."""
+    subject = "user:1:endpoint:/orders"
+
+    r1 = await cached_service.check_token_bucket(subject, 1, 1.0)
+    r2 = await cached_service.check_token_bucket(subject, 1, 1.0)
+    assert r1["allowed"] is True
+    assert r2["allowed"] is False
+    assert 0.9 < r2["retry_after"] <= 1.0
+
+    # Redis would allow now, but the cached denial is still in force.
+    await redis_client.flushdb()
+    r3 = await cached_service.check_token_bucket(subject, 1, 1.0)
+    assert r3["allowed"] is False
+    assert r3["retry_after"] <= r2["retry_after"]
+
+
+@pytest.mark.asyncio
+async def test_cached_denial_ends_when_redis_would_allow(cached_service):
+    """Test that the cached denial lasts exactly as long as the refill."""
+    subject = "user:2:endpoint:/orders"
+    refill_rate = 5.0
+
+    await cached_service.check_token_bucket(subject, 1, refill_rate)
+    r1 = await cached_service.check_token_bucket(subject, 1, refill_rate)
+    assert r1["allowed"] is False
+
+    await asyncio.sleep(r1["retry_after"] + 0.01)
+    r2 = await cached_service.check_token_bucket(subject, 1, refill_rate)
+    assert r2["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_retry_after_tracks_oldest_request(cached_service):
+    """Test that the window denial lasts until the oldest request expires."""
+    subject = "user:3:endpoint:/api"
+
+    await cached_service.check_sliding_window(subject, 2, 1)
+    await asyncio.sleep(0.3)
+    await cached_service.check_sliding_window(subject, 2, 1)
+    r = await cached_service.check_sliding_window(subject, 2, 1)
+
+    assert r["allowed"] is False
+    assert 0.6 < r["retry_after"] < 0.75
+
+    await asyncio.sleep(r["retry_after"] + 0.01)
+    r = await cached_service.check_sliding_window(subject, 2, 1)
+    assert r["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_check_many_all_or_nothing_uses_cached_denial(cached_service):
+    """Test that a cached denial fails an atomic batch without Redis."""
+    await cached_service.check_leaky_bucket("tenant:1", 1, 0.001)
+    await cached_service.check_leaky_bucket("tenant:1", 1, 0.001)
+
+    result = await cached_service.check_many(
+        [
+            ("token_bucket", "user:4", 1, 0.001),
+            ("leaky_bucket", "tenant:1", 1, 0.001),
+        ],
+        all_or_nothing=True,
+    )
+
+    assert result["allowed"] is False
+    assert result["results"][0] is None
+    assert result["results"][1]["allowed"] is False
+
+    r = await cached_service.check_token_bucket("user:4", 1, 0.001)
+    assert r["allowed"] is True
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_burst_up_to_capacity(redis_service):
+    """Test that a full burst of capacity requests is allowed at once."""
+    subject = "user:1:endpoint:/orders"
+    capacity = 5
+    rate = 1.0
+
+    results = [
+        await redis_service.check_gcra(subject, capacity, rate)
+        for _ in range(capacity + 1)
+    ]
+
+    assert [r["allowed"] for r in results] == [True] * capacity + [False]
+    assert [r["remaining"] for r in results] == [4, 3, 2, 1, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_gcra_reports_exact_retry_and_reset(redis_service):
+    """Test that retry_after and reset_after follow the emission interval."""
+    subject = "user:2:endpoint:/orders"
+    capacity = 2
+    rate = 4.0  # one request every 0.25s
+
+    r1 = await redis_service.check_gcra(subject, capacity, rate)
+    r2 = await redis_service.check_gcra(subject, capacity, rate)
+    r3 = await redis_service.check_gcra(subject, capacity, rate)
+
+    assert r1["retry_after"] == 0
+    assert r1["reset_after"] == pytest.approx(0.25, abs=0.01)
+    assert r2["reset_after"] == pytest.approx(0.5, abs=0.01)
+    assert r3["allowed"] is False
+    assert r3["retry_after"] == pytest.approx(0.25, abs=0.01)
+    assert r3["reset_after"] == pytest.approx(0.5, abs=0.01)
+
+    await asyncio.sleep(r3["retry_after"] + 0.01)
+    r4 = await redis_service.check_gcra(subject, capacity, rate)
+    assert r4["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_gcra_stores_single_expiring_timestamp(redis_service, redis_client):
+    """Test that state is one string key that expires when the limit resets."""
+    subject = "user:3:endpoint:/orders"
+
+    r = await redis_service.check_gcra(subject, 10, 2.0)
+    r = await redis_service.check_gcra(subject, 10, 2.0)
+
+    key = f"gcra:{subject}"
+    assert await redis_client.type(key) == "string"
+    assert float(await redis_client.get(key)) > 0
+    ttl = await redis_client.pttl(key)
+    assert 0 < ttl <= 1000
+    assert ttl == pytest.approx(r["reset_after"] * 1000, abs=50)
+
+
+@pytest.mark.asyncio
+async def test_gcra_steady_rate(redis_service):
+    """Test that once the burst is spent requests pass at the configured rate."""
+    subject = "user:4:endpoint:/orders"
+    capacity = 1
+    rate = 10.0
+
+    r1 = await redis_service.check_gcra(subject, capacity, rate)
+    r2 = await redis_service.check_gcra(subject, capacity, rate)
+    assert r1["allowed"] is True
+    assert r2["allowed"] is False
+
+    await asyncio.sleep(0.11)
+    r3 = await redis_service.check_gcra(subject, capacity, rate)
+    assert r3["allowed"] is True
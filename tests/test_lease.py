@@ -0,0 +1,102 @@
+import pytest
+
+from distributed_rate_limiter_service.service.lease import LeaseTable
+from distributed_rate_limiter_service.service.redis import RedisService
+
+
+def leased_service(redis_client, clock, max_size=50):
+    return RedisService(
+        redis=redis_client, leases=LeaseTable(max_size, ttl=1.0, clock=clock)
+    )
+
+
+def count_script_calls(service, monkeypatch):
+    calls = []
+    evalsha = service.scripts.evalsha
+
+    async def counting(name, keys, args):
+        calls.append(name)
+        return await evalsha(name, keys, args)
+
+    monkeypatch.setattr(service.scripts, "evalsha", counting)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_hot_subject_is_served_from_leases(
+    redis_client, read_state, clock, monkeypatch
+):
+    """Test that a busy subject needs only a few Redis calls."""
+    service = leased_service(redis_client, clock)
+    calls = count_script_calls(service, monkeypatch)
+
+    results = []
+    for _ in range(200):
+        clock.now += 0.001
+        results.append(await service.check_token_bucket("user:1", 1_000, 1.0))
+
+    assert all(r["allowed"] for r in results)
+    assert len(calls) < 20
+    # the leased tokens are gone from Redis even if not all were spent yet
+    assert (await read_state("token_bucket", "tb:user:1"))["tokens"] <= 800
+
+
+@pytest.mark.asyncio
+async def test_leases_never_admit_more_than_the_bucket(redis_client, clock):
+    """Test that workers sharing a bucket cannot overspend it in a burst."""
+    workers = [leased_service(redis_client, clock) for _ in range(3)]
+
+    allowed = 0
+    for i in range(300):
+        clock.now += 0.001
+        result = await workers[i % 3].check_token_bucket("user:2", 20, 0.001)
+        allowed += result["allowed"]
+
+    assert allowed <= 20
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_returned_on_renewal(redis_client, read_state, clock):
+    """Test that tokens left in an expired lease go back to the bucket."""
+    service = leased_service(redis_client, clock)
+    for _ in range(50):
+        clock.now += 0.001
+        await service.check_token_bucket("user:3", 100, 0.001)
+    (lease,) = service.leases._leases.values()
+    assert lease.tokens > 0
+
+    clock.now += 2
+    await service.check_token_bucket("user:3", 100, 0.001)
+
+    # 51 tokens were spent; the rest is in Redis or in the renewed lease
+    tokens = (await read_state("token_bucket", "tb:user:3"))["tokens"]
+    assert tokens + lease.tokens == pytest.approx(100 - 51, abs=0.01)
+    assert lease.tokens < 50
+
+
+@pytest.mark.asyncio
+async def test_release_returns_unspent_tokens(redis_client, read_state, clock):
+    """Test that shutting down gives every unspent token back."""
+    service = leased_service(redis_client, clock)
+    for _ in range(30):
+        clock.now += 0.001
+        await service.check_token_bucket("user:4", 100, 0.001)
+
+    await service.release_leases()
+
+    tokens = (await read_state("token_bucket", "tb:user:4"))["tokens"]
+    assert tokens == pytest.approx(70, abs=0.01)
+    assert len(service.leases) == 0
+
+
+@pytest.mark.asyncio
+async def test_denial_is_reported_with_retry_after(redis_client, clock):
+    """Test that an exhausted bucket is still denied with leasing on."""
+    service = leased_service(redis_client, clock)
+    for _ in range(3):
+        await service.check_token_bucket("user:5", 3, 1.0)
+
+    result = await service.check_token_bucket("user:5", 3, 1.0)
+
+    assert result["allowed"] is False
+    assert 0 < result["retry_after"] <= 1.0
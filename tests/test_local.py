@@ -0,0 +1,103 @@
+import random
+import pytest
+
+from distributed_rate_limiter_service.service import redis as redis_module
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.redis import RedisService
+
+
+@pytest.fixture
+def local_service(clock):
+    return LocalService(clock=clock)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "algorithm, param",
+    [
+        ("token_bucket", 2.0),
+        ("leaky_bucket", 2.0),
+        ("sliding_window", 2),
+        ("sliding_window_counter", 2),
+        ("gcra", 4.0),
+    ],
+)
+async def test_local_engine_matches_lua_scripts(
+    redis_client, monkeypatch, clock, local_service, algorithm, param
+):
+    """Test that both backends make the same decisions for the same traffic."""
+    redis_service = RedisService(redis=redis_client, time_source="client")
+    monkeypatch.setattr(redis_module.time, "time", clock)
+    rng = random.Random(algorithm)
+
+    for _ in range(200):
+        # dyadic steps keep the float arithmetic exact on both sides
+        clock.now += rng.choice([0.25, 0.25, 0.5, 1.0, 2.5])
+        check = RateLimitCheck(algorithm, "user:1", 5, param, rng.randint(1, 3))
+
+        (expected,) = (await redis_service.check_many([check]))["results"]
+        (actual,) = (await local_service.check_many([check]))["results"]
+
+        # Lua's tostring() keeps 14 significant digits of the durations
+        assert actual == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.asyncio
+async def test_local_engine_refills_on_its_clock(clock, local_service):
+    """Test that a denied subject is allowed once the clock has moved on."""
+    r1 = await local_service.check_token_bucket("user:1", 1, 2.0)
+    r2 = await local_service.check_token_bucket("user:1", 1, 2.0)
+    clock.now += 0.5
+    r3 = await local_service.check_token_bucket("user:1", 1, 2.0)
+
+    assert [r1["allowed"], r2["allowed"], r3["allowed"]] == [True, False, True]
+    assert r2["retry_after"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_atomic_batch_consumes_nothing_when_denied(local_service):
+    """Test that a denied all-or-nothing batch leaves every limit untouched."""
+    checks = [
+        RateLimitCheck("token_bucket", "user:1", 5, 1.0),
+        RateLimitCheck("gcra", "user:1", 1, 1.0),
+    ]
+    await local_service.check_gcra("user:1", 1, 1.0)
+
+    batch = await local_service.check_many(checks, all_or_nothing=True)
+    single = await local_service.check_token_bucket("user:1", 5, 1.0)
+
+    assert batch["allowed"] is False
+    assert batch["results"][0]["remaining"] == 5
+    assert single["remaining"] == 4
+
+
+@pytest.mark.asyncio
+async def test_expired_state_is_swept_in_bounded_steps(clock):
+    """Test that expired keys are dropped a bounded number at a time."""
+    service = LocalService(clock=clock, sweep_limit=10)
+    for i in range(25):
+        await service.check_sliding_window(f"user:{i}", 5, 1)
+    assert len(service) == 25
+
+    clock.now += 1
+    await service.check_sliding_window("user:0", 5, 1)
+    assert len(service) == 16
+
+    await service.check_sliding_window("user:0", 5, 1)
+    await service.check_sliding_window("user:0", 5, 1)
+    assert len(service) == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_window_is_reused_empty(clock, local_service):
+    """Test that units from an expired window do not count again."""
+    for _ in range(3):
+        await local_service.check_sliding_window("user:1", 3, 1)
+
+    clock.now += 5
+    results = [
+        await local_service.check_sliding_window("user:1", 3, 1) for _ in range(4)
+    ]
+
+    assert [r["allowed"] for r in results] == [True, True, True, False]
@@ -0,0 +1,89 @@
+import pytest
+
+from distributed_rate_limiter_service.service import redis as redis_module
+from distributed_rate_limiter_service.service.local import LocalService
+from distributed_rate_limiter_service.service.redis import RedisService
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "algorithm, key",
+    [
+        ("token_bucket", "tb:user:1"),
+        ("leaky_bucket", "lb:user:1"),
+        ("sliding_window_counter", "swc:user:1"),
+    ],
+)
+async def test_state_expires_when_the_limit_is_full_again(
+    redis_service, redis_client, algorithm, key
+):
+    """Test that keys only live until the limit has fully recovered."""
+    check = getattr(redis_service, f"check_{algorithm}")
+    result = await check("user:1", 10, 2.0, 3)
+
+    assert await redis_client.strlen(key) == 8 * (3 if "counter" in algorithm else 2)
+    ttl = await redis_client.pttl(key)
+    assert ttl == pytest.approx(result["reset_after"] * 1000, abs=50)
+
+
+@pytest.mark.asyncio
+async def test_hash_state_from_earlier_versions_is_migrated(
+    redis_service, redis_client, read_state
+):
+    """Test that a bucket stored as a hash is read and rewritten packed."""
+    now = float((await redis_client.time())[0])
+    await redis_client.hset("tb:user:2", mapping={"tokens": 1, "last_refill_ts": now})
+
+    r1 = await redis_service.check_token_bucket("user:2", 5, 0.001)
+    r2 = await redis_service.check_token_bucket("user:2", 5, 0.001)
+
+    assert [r1["allowed"], r2["allowed"]] == [True, False]
+    assert await redis_client.type("tb:user:2") == "string"
+    assert (await read_state("token_bucket", "tb:user:2"))["tokens"] < 0.01
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counts_requests_sharing_a_timestamp(
+    redis_client, monkeypatch
+):
+    """Test that requests admitted at the same instant are all counted."""
+    service = RedisService(redis=redis_client, time_source="client")
+    monkeypatch.setattr(redis_module.time, "time", lambda: 1_000.25)
+
+    results = [
+        await service.check_sliding_window("user:3", 5, 0.5, 2) for _ in range(3)
+    ]
+
+    assert [r["allowed"] for r in results] == [True, True, False]
+    # one member per request, whatever its cost
+    assert await redis_client.zcard("sw:user:3") == 2
+    assert 0 < await redis_client.pttl("sw:user:3") <= 500
+
+
+@pytest.mark.asyncio
+async def test_redis_memory_report(redis_service):
+    """Test that keys are counted and measured per algorithm."""
+    for i in range(5):
+        await redis_service.check_token_bucket(f"user:{i}", 5, 1.0)
+    await redis_service.check_sliding_window("user:1", 5, 10)
+
+    report = await redis_service.memory_usage(samples=2)
+
+    assert report["token_bucket"]["keys"] == 5
+    assert report["token_bucket"]["bytes"] > 0
+    assert report["sliding_window"]["keys"] == 1
+    assert report["sliding_window_counter"] == {"keys": 0, "bytes": 0}
+
+
+@pytest.mark.asyncio
+async def test_local_memory_report():
+    """Test that the local engine reports its own state."""
+    service = LocalService()
+    await service.check_gcra("user:1", 5, 1.0)
+    await service.check_sliding_window("user:1", 5, 10, 3)
+
+    report = await service.memory_usage()
+
+    assert report["gcra"]["keys"] == 1
+    assert report["sliding_window"]["bytes"] > report["gcra"]["bytes"]
+    assert report["token_bucket"] == {"keys": 0, "bytes": 0}
@@ -0,0 +1,75 @@
+import pytest
+
+from distributed_rate_limiter_service.service.deny_cache import DenyCache
+from distributed_rate_limiter_service.service.metrics import Metrics
+from distributed_rate_limiter_service.service.redis import SCRIPTS, RedisService
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+
+
+def sample(metrics, name, **labels):
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+@pytest.mark.asyncio
+async def test_decisions_and_script_latency_are_recorded(redis_client, metrics):
+    service = RedisService(redis=redis_client, metrics=metrics)
+
+    await service.check_token_bucket("user:1", 1, 1.0)
+    await service.check_token_bucket("user:1", 1, 1.0)
+
+    decisions = "rate_limiter_decisions_total"
+    assert sample(metrics, decisions, algorithm="token_bucket", decision="allowed") == 1
+    assert sample(metrics, decisions, algorithm="token_bucket", decision="denied") == 1
+    assert (
+        sample(
+            metrics,
+            "rate_limiter_script_duration_seconds_count",
+            algorithm="token_bucket",
+        )
+        == 2
+    )
+
+
+@pytest.mark.asyncio
+async def test_deny_cache_hits_are_counted(redis_client, metrics):
+    service = RedisService(redis=redis_client, deny_cache=DenyCache(), metrics=metrics)
+
+    for _ in range(3):
+        await service.check_gcra("user:2", 1, 1.0)
+
+    assert sample(metrics, "rate_limiter_deny_cache_hits_total", algorithm="gcra") == 1
+    assert (
+        sample(metrics, "rate_limiter_script_duration_seconds_count", algorithm="gcra")
+        == 2
+    )
+
+
+@pytest.mark.asyncio
+async def test_noscript_reload_is_counted(redis_client, metrics):
+    scripts = ScriptRegistry(
+        redis_client, SCRIPTS, on_reload=metrics.noscript_reloads.inc
+    )
+    await scripts.load()
+    service = RedisService(redis=redis_client, scripts=scripts, metrics=metrics)
+
+    await redis_client.script_flush()
+    result = await service.check_token_bucket("user:3", 1, 1.0)
+
+    assert result["allowed"] is True
+    assert sample(metrics, "rate_limiter_noscript_reloads_total") == 1
+
+
+def test_pool_gauges_and_render(metrics):
+    from redis.asyncio import Redis
+
+    metrics.track_pool(Redis(max_connections=7))
+    content, content_type = metrics.render()
+
+    assert content_type.startswith("text/plain")
+    assert b"rate_limiter_redis_pool_max_connections 7.0" in content
+    assert b"rate_limiter_redis_pool_in_use_connections 0.0" in content
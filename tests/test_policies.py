@@ -0,0 +1,91 @@
+import json
+import os
+import pytest
+
+from distributed_rate_limiter_service.core.models import PolicyConfig
+from distributed_rate_limiter_service.service.policies import PolicyRegistry
+
+
+def write_policies(path, policies, mtime):
+    path.write_text(json.dumps(policies))
+    # force a distinct mtime regardless of filesystem timestamp resolution
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_policies_are_compiled_from_settings():
+    registry = PolicyRegistry(
+        {"login": PolicyConfig(algorithm="sliding_window", capacity=5, window_size=60)}
+    )
+
+    policy = registry.get("login")
+    assert policy.algorithm == "sliding_window"
+    assert policy.capacity == 5
+    assert policy.param == 60
+    assert registry.get("missing") is None
+
+
+def test_policy_without_its_param_is_rejected():
+    with pytest.raises(ValueError):
+        PolicyRegistry(
+            {"login": PolicyConfig(algorithm="token_bucket", capacity=5, window_size=1)}
+        )
+
+
+def test_policy_file_overrides_settings_and_reloads(tmp_path):
+    path = tmp_path / "policies.json"
+    write_policies(
+        path,
+        {"api": {"algorithm": "token_bucket", "capacity": 10, "refill_rate": 1}},
+        mtime=1_000_000_000,
+    )
+    registry = PolicyRegistry(
+        {
+            "api": PolicyConfig(algorithm="gcra", capacity=1, refill_rate=1),
+            "login": PolicyConfig(algorithm="gcra", capacity=3, refill_rate=1),
+        },
+        str(path),
+    )
+
+    assert registry.get("api").algorithm == "token_bucket"
+    assert registry.get("login").capacity == 3
+    assert registry.reload_if_changed() is False
+
+    write_policies(
+        path,
+        {"api": {"algorithm": "leaky_bucket", "capacity": 20, "leak_rate": 2}},
+        mtime=2_000_000_000,
+    )
+    assert registry.reload_if_changed() is True
+    assert registry.get("api").algorithm == "leaky_bucket"
+    assert registry.get("api").capacity == 20
+
+
+def test_invalid_policy_file_keeps_previous_policies(tmp_path):
+    path = tmp_path / "policies.json"
+    write_policies(
+        path,
+        {"api": {"algorithm": "token_bucket", "capacity": 10, "refill_rate": 1}},
+        mtime=1_000_000_000,
+    )
+    registry = PolicyRegistry(path=str(path))
+
+    write_policies(path, {"api": {"algorithm": "unknown"}}, mtime=2_000_000_000)
+    assert registry.reload_if_changed() is False
+    assert registry.get("api").algorithm == "token_bucket"
+
+
+@pytest.mark.asyncio
+async def test_check_policy_uses_policy_parameters(redis_service):
+    """Test that a policy check behaves like the equivalent explicit check."""
+    registry = PolicyRegistry(
+        {"api": PolicyConfig(algorithm="token_bucket", capacity=2, refill_rate=0.001)}
+    )
+    policy = registry.get("api")
+
+    r1 = await redis_service.check_policy(policy, "user:1")
+    r2 = await redis_service.check_policy(policy, "user:1")
+    r3 = await redis_service.check_token_bucket("user:1", 2, 0.001)
+
+    assert r1["allowed"] is True
+    assert r2["allowed"] is True
+    assert r3["allowed"] is False
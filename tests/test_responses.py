@@ -0,0 +1,72 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.main import create_app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "backend", "local")
+    monkeypatch.setattr(settings, "deny_cache_size", 0)
+    with TestClient(create_app()) as client:
+        yield client
+
+
+def check(client, **fields):
+    payload = {"subject": "user:1", "capacity": 2, **fields}
+    payload.setdefault("refill_rate", None)
+    payload.setdefault("leak_rate", None)
+    payload.setdefault("window_size", None)
+    return client.post("/v1/check/token_bucket", json=payload)
+
+
+def test_allowed_and_denied_carry_rate_limit_headers(client):
+    allowed = check(client, refill_rate=0.5)
+    check(client, refill_rate=0.5)
+    denied = check(client, refill_rate=0.5)
+
+    assert allowed.status_code == 200
+    assert allowed.json() == {
+        "allowed": True,
+        "remaining": 1,
+        "retry_after": 0.0,
+        "reset_after": 2.0,
+    }
+    assert allowed.headers["RateLimit-Limit"] == "2"
+    assert allowed.headers["RateLimit-Remaining"] == "1"
+    assert allowed.headers["RateLimit-Reset"] == "2"
+    assert "Retry-After" not in allowed.headers
+
+    assert denied.status_code == 429
+    detail = denied.json()["detail"]
+    assert detail["allowed"] is False
+    assert denied.headers["RateLimit-Remaining"] == "0"
+    # rounded up from the script's retry_after, just under 2s
+    assert 1 < detail["retry_after"] <= 2
+    assert denied.headers["Retry-After"] == "2"
+    assert denied.headers["RateLimit-Reset"] == "4"
+    assert denied.headers["X-RateLimit-Limit"] == "2"
+
+
+def test_body_is_valid_json_for_small_durations(client):
+    response = check(client, refill_rate=1e6)
+
+    assert json.loads(response.text)["reset_after"] == pytest.approx(1e-6)
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"refill_rate": "NaN"},
+        {"refill_rate": "Infinity"},
+        {"refill_rate": "-Infinity"},
+        {"refill_rate": -1},
+    ],
+)
+def test_non_finite_and_non_positive_params_are_rejected(client, fields):
+    response = check(client, **fields)
+
+    assert response.status_code == 400
+    assert "must be a positive finite number" in response.json()["detail"]
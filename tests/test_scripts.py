@@ -0,0 +1,43 @@
+import pytest
+
+from distributed_rate_limiter_service.service.redis import SCRIPTS
+from distributed_rate_limiter_service.service.scripts import ScriptRegistry
+
+
+@pytest.mark.asyncio
+async def test_registry_load_caches_server_shas(redis_client):
+    """Test that load() registers every script and keeps its SHA."""
+    registry = ScriptRegistry(redis_client, SCRIPTS)
+    await redis_client.script_flush()
+
+    await registry.load()
+
+    assert set(registry.shas) == set(SCRIPTS)
+    assert all(await redis_client.script_exists(*registry.shas.values()))
+
+
+@pytest.mark.asyncio
+async def test_evalsha_reloads_after_script_flush(redis_service, redis_client):
+    """Test that a NOSCRIPT reply reloads scripts transparently."""
+    r1 = await redis_service.check_token_bucket("user:1", 2, 1.0)
+    await redis_client.script_flush()
+    r2 = await redis_service.check_token_bucket("user:1", 2, 1.0)
+
+    assert r1["allowed"] is True
+    assert r2["allowed"] is True
+    assert r2["remaining"] <= 1
+
+
+@pytest.mark.asyncio
+async def test_evalsha_many_reloads_after_script_flush(redis_service, redis_client):
+    """Test that pipelined batch calls also recover from NOSCRIPT."""
+    await redis_client.script_flush()
+
+    result = await redis_service.check_many(
+        [
+            ("token_bucket", "user:2", 1, 1.0),
+            ("sliding_window", "user:2", 1, 10),
+        ]
+    )
+
+    assert [r["allowed"] for r in result["results"]] == [True, True]
@@ -0,0 +1,145 @@
+import os
+import signal
+import socket
+import time
+import pytest
+from prometheus_client import CollectorRegistry, values
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from distributed_rate_limiter_service import server
+from distributed_rate_limiter_service.core.config import settings
+from distributed_rate_limiter_service.service.metrics import Metrics
+from distributed_rate_limiter_service.server import bind, main, parse_args, supervise
+
+
+@pytest.fixture
+def signal_handlers():
+    """Restore the handlers ``supervise`` installs in the test process."""
+    saved = {
+        signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    yield
+    for signum, handler in saved.items():
+        signal.signal(signum, handler)
+
+
+@pytest.fixture(autouse=True)
+def metrics_mode():
+    """Undo the switch to multiprocess metrics ``supervise`` makes."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    value_class = values.ValueClass
+    yield
+    values.ValueClass = value_class
+    if path is None:
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def fake_workers(monkeypatch, tmp_path, behave):
+    """Replace the uvicorn worker with ``behave(index, starts)``.
+
+    Every start is logged to a file, since workers are forked processes;
+    ``starts`` is how often worker ``index`` was started before, this start
+    included. Returns a function reading the log as ``(index, pid)`` pairs.
+    """
+    path = tmp_path / "starts"
+    path.touch()
+
+    def run_worker(app, args, index, sock):
+        with open(path, "a") as f:
+            f.write(f"{index} {os.getpid()}\n")
+        behave(index, [int(line.split()[0]) for line in open(path)].count(index))
+
+    monkeypatch.setattr(server, "run_worker", run_worker)
+    return lambda: [tuple(map(int, line.split())) for line in open(path)]
+
+
+def test_defaults_to_one_worker_per_core():
+    args = parse_args([])
+
+    assert args.workers == (os.cpu_count() or 1)
+    assert args.reuse_port == hasattr(socket, "SO_REUSEPORT")
+    assert parse_args(["--no-reuse-port"]).reuse_port is False
+
+
+def test_reuse_port_sockets_share_a_port():
+    first = bind("127.0.0.1", 0, reuse_port=True)
+    port = first.getsockname()[1]
+    second = bind("127.0.0.1", port, reuse_port=True)
+    try:
+        first.listen()
+        second.listen()
+        assert second.getsockname()[1] == port
+    finally:
+        first.close()
+        second.close()
+
+
+def test_binary_port_is_shared_through_reuse_port(monkeypatch):
+    monkeypatch.setattr(settings, "binary_port", 9000)
+    monkeypatch.setattr(settings, "binary_reuse_port", True)
+
+    with pytest.raises(SystemExit, match="--reuse-port"):
+        main(["--workers", "2", "--no-reuse-port"])
+    assert settings.binary_reuse_port is False
+
+
+def test_exited_workers_are_restarted(monkeypatch, tmp_path, signal_handlers):
+    def behave(index, starts):
+        if starts == 1:
+            raise SystemExit(3)
+        # the restarted worker stops the supervisor, then waits for SIGTERM
+        os.kill(os.getppid(), signal.SIGTERM)
+        time.sleep(60)
+
+    starts = fake_workers(monkeypatch, tmp_path, behave)
+    supervise(None, parse_args(["--workers", "1", "--port", "0"]), restart_delay=0)
+
+    (_, first), (_, second) = starts()
+    assert first != second
+
+
+def test_sigterm_stops_every_worker(monkeypatch, tmp_path, signal_handlers):
+    def behave(index, starts):
+        if index == 1:
+            # once worker 0 runs, so both are stopped rather than never started
+            while 0 not in [index for index, _ in read_starts()]:
+                time.sleep(0.01)
+            os.kill(os.getppid(), signal.SIGTERM)
+        time.sleep(60)
+
+    starts = read_starts = fake_workers(monkeypatch, tmp_path, behave)
+    start = time.monotonic()
+    supervise(None, parse_args(["--workers", "2", "--port", "0"]), restart_delay=0)
+
+    # supervise returns once both workers exited, neither was restarted
+    assert time.monotonic() - start < 30
+    assert sorted(index for index, _ in starts()) == [0, 1]
+    for _, pid in starts():
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+def test_workers_share_their_metrics(monkeypatch, tmp_path, signal_handlers):
+    def behave(index, starts):
+        Metrics().allowed["gcra"].inc()
+        (tmp_path / f"done-{index}").touch()
+        if index == 1:
+            while not (tmp_path / "done-0").exists():
+                time.sleep(0.01)
+            os.kill(os.getppid(), signal.SIGTERM)
+        time.sleep(60)
+
+    fake_workers(monkeypatch, tmp_path, behave)
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "counter_1.db").write_bytes(b"stale")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(metrics_dir))
+    supervise(None, parse_args(["--workers", "2", "--port", "0"]), restart_delay=0)
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, str(metrics_dir))
+    labels = {"algorithm": "gcra", "decision": "allowed"}
+    assert registry.get_sample_value("rate_limiter_decisions_total", labels) == 2
+    assert not (metrics_dir / "counter_1.db").exists()
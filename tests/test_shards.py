@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+
+from distributed_rate_limiter_service.service.limiter import RateLimitCheck
+from distributed_rate_limiter_service.service.redis import RedisService
+from distributed_rate_limiter_service.service.shards import HotKeys
+
+INTERVAL = 0.05
+
+
+def sharded_service(redis_client, shards=4):
+    # 100 requests per second, i.e. 5 per interval, make a subject hot
+    return RedisService(
+        redis_client, hot_keys=HotKeys(shards, hot_rate=100, interval=INTERVAL)
+    )
+
+
+async def promote(service, check):
+    """Make ``check``'s subject hot and wait for its shares to take effect."""
+    for _ in range(5):
+        await service.peek(check)
+    await service.sync_hot_keys()
+    await asyncio.sleep(2.5 * INTERVAL)
+    assert service.hot_keys.parts(check) == service.hot_keys.shards
+
+
+def test_hot_keys_follow_the_shared_marker(clock):
+    hot_keys = HotKeys(shards=4, interval=1.0, clock=clock)
+    check = RateLimitCheck("gcra", "checkout", 10, 1.0)
+
+    hot_keys.record(check)
+    hot_keys.record(check._replace(cost=3))
+    assert hot_keys.drain() == [(check._replace(cost=3), 2, 3)]
+
+    hot_keys.update(check, [3, 2000, 5000])
+    assert hot_keys.parts(check) == 1
+    clock.now += 2
+    assert hot_keys.parts(check) == 3
+    clock.now += 3
+    assert hot_keys.parts(check) == 1
+
+    # subjects not checked for four intervals are no longer synced
+    assert hot_keys.drain() == []
+    assert len(hot_keys.order(4)) == 2
+
+
+@pytest.mark.asyncio
+async def test_workers_agree_on_promotion(redis_client):
+    # two workers, each with its own HotKeys, only hot together
+    workers = [sharded_service(redis_client) for _ in range(2)]
+    check = RateLimitCheck("token_bucket", "checkout", 8, 0.001)
+
+    for worker in workers:
+        for _ in range(3):
+            await worker.peek(check)
+        await worker.sync_hot_keys()
+    await workers[0].sync_hot_keys()
+
+    # the shares take effect later, at the same time for both workers
+    assert [worker.hot_keys.parts(check) for worker in workers] == [1, 1]
+    await asyncio.sleep(2.5 * INTERVAL)
+    assert [worker.hot_keys.parts(check) for worker in workers] == [4, 4]
+
+    await asyncio.gather(*(worker.check(check) for worker in workers))
+    assert await redis_client.exists("tb:checkout") == 0
+    assert await redis_client.exists("hot:tb:checkout") == 1
+
+
+@pytest.mark.asyncio
+async def test_cold_subjects_go_back_to_one_key(redis_client):
+    service = sharded_service(redis_client)
+    check = RateLimitCheck("token_bucket", "checkout", 8, 0.001)
+    await promote(service, check)
+
+    # one request per interval keeps it below half the threshold
+    for _ in range(4):
+        await service.check(check)
+        await service.sync_hot_keys()
+        await asyncio.sleep(INTERVAL)
+
+    assert service.hot_keys.parts(check) == 1
+    assert await redis_client.exists("hot:tb:checkout") == 0
+
+
+@pytest.mark.asyncio
+async def test_denials_try_a_bounded_number_of_shares(redis_client):
+    service = sharded_service(redis_client, shards=8)
+    check = RateLimitCheck("token_bucket", "checkout", 16, 0.001)
+    await promote(service, check)
+
+    calls = 0
+    evalsha = service.scripts.evalsha
+
+    async def counting(*args):
+        nonlocal calls
+        calls += 1
+        return await evalsha(*args)
+
+    service.scripts.evalsha = counting
+    allowed = denied = 0
+    for _ in range(40):
+        calls = 0
+        result = await service.check(check)
+        if result["allowed"]:
+            allowed += 1
+        else:
+            denied += 1
+            assert calls == 2
+
+    assert 0 < allowed <= 16
+    assert denied > 0
+
+
+@pytest.mark.asyncio
+async def test_batches_and_peeks_use_the_shares(redis_client):
+    service = sharded_service(redis_client)
+    check = RateLimitCheck("sliding_window", "tenant:1", 4, 60.0)
+    await promote(service, check)
+
+    batch = await service.check_many([check] + [check._replace(subject="user:1")])
+    assert [r["allowed"] for r in batch["results"]] == [True] * 2
+    assert (await service.peek(check))["allowed"]
+    assert await redis_client.exists("sw:tenant:1") == 0
+    assert len(await redis_client.keys("sw:tenant:1#*")) == 1
+
+
+@pytest.mark.asyncio
+async def test_composites_and_reservations_use_one_share(redis_client):
+    service = sharded_service(redis_client)
+    check = RateLimitCheck("token_bucket", "checkout", 8, 0.001)
+    await promote(service, check)
+
+    batch = await service.check_many(
+        [check, check._replace(subject="user:1")], all_or_nothing=True
+    )
+    reserved = await service.acquire(check, timeout=1, wait=False)
+
+    assert batch["allowed"] and reserved["allowed"]
+    assert await redis_client.exists("tb:checkout") == 0
+    assert 1 <= len(await redis_client.keys("tb:checkout#*")) <= 2
+    with pytest.raises(ValueError, match="one shard"):
+        await service.check(check._replace(cost=3))
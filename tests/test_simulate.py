@@ -0,0 +1,135 @@
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from distributed_rate_limiter_service.service.redis import KEY_PREFIXES
+from distributed_rate_limiter_service.simulate import (
+    MODELS,
+    Candidate,
+    Simulation,
+    load_log,
+    main,
+)
+
+
+def recorded_log(seed=0):
+    """A skewed log: a few busy subjects and many quiet ones.
+
+    Timestamps are multiples of 1/64s, so the window bounds the sliding
+    window script formats with 14 digits are exact.
+    """
+    rng = np.random.default_rng(seed)
+    subjects = np.concatenate(
+        [np.full(800, "hot"), np.full(200, "warm")]
+        + [np.full(rng.integers(1, 20), f"user:{i}") for i in range(100)]
+    )
+    timestamps = rng.integers(0, 20 * 64, len(subjects)) / 64
+    return timestamps, subjects
+
+
+async def replay_scripts(redis_service, candidate, timestamps, subjects, tag):
+    """``allowed, retry_after`` of the Lua script for every request, in order."""
+    order = np.argsort(timestamps, kind="stable")
+    prefix = KEY_PREFIXES[candidate.algorithm]
+    rows = await redis_service.scripts.evalsha_many(
+        (
+            candidate.algorithm,
+            [f"{prefix}:{tag}:{subjects[i]}"],
+            [candidate.capacity, candidate.param, float(timestamps[i]), 1],
+        )
+        for i in order
+    )
+    allowed = np.empty(len(order), dtype=bool)
+    retry_after = np.empty(len(order))
+    for i, (ok, _, retry, _) in zip(order, rows):
+        allowed[i] = ok
+        retry_after[i] = float(retry)
+    return allowed, retry_after
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "candidates",
+    [
+        [Candidate("token_bucket", 5, 2.0), Candidate("token_bucket", 20, 0.5)],
+        [Candidate("leaky_bucket", 5, 2.0), Candidate("leaky_bucket", 20, 0.5)],
+        [Candidate("sliding_window", 5, 2.0), Candidate("sliding_window", 20, 7.5)],
+    ],
+)
+async def test_replay_matches_the_lua_scripts(redis_service, candidates):
+    timestamps, subjects = recorded_log()
+    simulation = Simulation(timestamps, subjects)
+    allowed, retry_after = simulation.replay(
+        candidates[0].algorithm,
+        np.array([c.capacity for c in candidates], dtype=float),
+        np.array([c.param for c in candidates], dtype=float),
+    )
+    # requests of the busiest subjects are replayed one subject at a time
+    assert simulation.counts[0] > 64
+
+    for row, candidate in enumerate(candidates):
+        expected_allowed, expected_retry = await replay_scripts(
+            redis_service,
+            candidate,
+            simulation.timestamps,
+            simulation.subjects[simulation.owners],
+            tag=row,
+        )
+        assert 0 < expected_allowed.sum() < len(simulation)
+        np.testing.assert_array_equal(allowed[row], expected_allowed)
+        np.testing.assert_allclose(retry_after[row], expected_retry, rtol=1e-9)
+
+
+def test_report():
+    simulation = Simulation([0.0, 0.1, 0.2, 0.3, 5.0, 0.0], ["a"] * 5 + ["b"])
+    (report,) = simulation.run([Candidate("token_bucket", 2, 1.0)], burst_window=1.0)
+
+    assert list(simulation.subjects) == ["a", "b"]
+    assert report.requests == 6
+    assert report.denied == 2
+    assert report.deny_rate == pytest.approx(1 / 3)
+    assert list(report.denied_per_subject) == [2, 0]
+    # denied at 0.2 until 1.0; the denial at 0.3 overlaps it
+    assert report.over_limit_time[0] == pytest.approx(0.8)
+    assert list(report.peak_requests) == [4, 1]
+    assert list(report.peak_allowed) == [2, 1]
+
+
+def test_unknown_algorithm():
+    assert "gcra" not in MODELS
+    with pytest.raises(ValueError, match="cannot simulate"):
+        Simulation([0.0], ["a"]).replay("gcra", np.array([1.0]), np.array([1.0]))
+
+
+def test_window_state_is_bounded_by_the_requests():
+    # a ring of a billion slots per subject would not fit in memory
+    simulation = Simulation([0.0, 0.5, 1.0], ["a", "a", "b"])
+    allowed, _ = simulation.replay(
+        "sliding_window", np.array([1e9, 1.0]), np.array([60.0, 60.0])
+    )
+
+    assert allowed.tolist() == [[True, True, True], [True, False, True]]
+
+
+def test_cli_reads_csv_and_ndjson(tmp_path, capsys):
+    csv_log = tmp_path / "requests.csv"
+    csv_log.write_text("timestamp,subject\n0,a\n0.5,a\n1,b\n")
+    ndjson_log = tmp_path / "requests.ndjson"
+    ndjson_log.write_text(
+        "\n".join(
+            json.dumps({"ts": ts, "subject": subject})
+            for ts, subject in [(0, "a"), (0.5, "a"), (1, "b")]
+        )
+    )
+    for path in (csv_log, ndjson_log):
+        timestamps, subjects = load_log(str(path))
+        assert list(timestamps) == [0, 0.5, 1]
+        assert list(subjects) == ["a", "a", "b"]
+
+    main([str(csv_log), "--capacity", "1", "2", "--param", "1"])
+    summaries = json.loads(capsys.readouterr().out)
+    assert [s["capacity"] for s in summaries] == [1, 2]
+    assert [s["denied"] for s in summaries] == [1, 0]
+    assert summaries[0]["refill_rate"] == 1
+    assert summaries[0]["over_limit"] == [{"subject": "a", "seconds": 0.5, "denied": 1}]
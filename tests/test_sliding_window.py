@@ -1,4 +1,6 @@
 import asyncio
+import struct
+import time
 import pytest
 
 
@@ -183,3 +185,31 @@ async def test_sliding_window_reset_after_full_window(redis_service):
 
     assert r4["allowed"] is True
     assert r5["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_rewrites_members_of_earlier_versions(
+    redis_service, redis_client
+):
+    """Test that keys holding one member per unit keep their count."""
+    subject = "user:legacy"
+    now = time.time()
+    # a plain timestamp, and the packed timestamp with a sequence suffix
+    await redis_client.zadd(f"sw:{subject}", {str(now - 2): now - 2})
+    await redis_client.zadd(
+        f"sw:{subject}",
+        {
+            struct.pack("<d", now - 1): now - 1,
+            struct.pack("<d", now - 1) + struct.pack("<I", 1): now - 1,
+        },
+    )
+
+    r1 = await redis_service.check_sliding_window(subject, 5, 10, cost=2)
+    r2 = await redis_service.check_sliding_window(subject, 5, 10)
+
+    assert r1["allowed"] is True
+    assert r1["remaining"] == 0
+    assert r2["allowed"] is False
+    # the oldest unit leaves the window first
+    assert r2["retry_after"] == pytest.approx(8, abs=0.1)
+    assert await redis_client.zcard(f"sw:{subject}") == 4
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import pytest
+
+
+async def replay(redis_service, algorithm, timestamps, capacity, window_size):
+    """Run the algorithm's script at the given (simulated) timestamps."""
+    allowed = []
+    for now in timestamps:
+        result, *_ = await redis_service.scripts.evalsha(
+            algorithm, keys=[f"replay:{algorithm}"], args=[capacity, window_size, now]
+        )
+        allowed.append(bool(result))
+    return allowed
+
+
+def max_in_any_window(timestamps, allowed, window_size):
+    admitted = [t for t, ok in zip(timestamps, allowed) if ok]
+    worst = 0
+    start = 0
+    for end, t in enumerate(admitted):
+        while admitted[start] <= t - window_size:
+            start += 1
+        worst = max(worst, end - start + 1)
+    return worst
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_allows_under_limit(redis_service):
+    """Test that requests under the limit are allowed."""
+    subject = "user:1:endpoint:/api"
+
+    results = [
+        await redis_service.check_sliding_window_counter(subject, 5, 10)
+        for _ in range(3)
+    ]
+
+    assert all(r["allowed"] for r in results)
+    assert results[-1]["remaining"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_blocks_over_limit(redis_service):
+    """Test that requests exceeding the limit are blocked."""
+    subject = "user:2:endpoint:/api"
+
+    results = [
+        await redis_service.check_sliding_window_counter(subject, 3, 10)
+        for _ in range(4)
+    ]
+
+    assert [r["allowed"] for r in results] == [True, True, True, False]
+    assert results[-1]["remaining"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_recovers_after_two_windows(redis_service):
+    """Test that the limit is fully available once both windows have passed."""
+    subject = "user:3:endpoint:/api"
+
+    for _ in range(2):
+        await redis_service.check_sliding_window_counter(subject, 2, 0.5)
+    r = await redis_service.check_sliding_window_counter(subject, 2, 0.5)
+    assert r["allowed"] is False
+
+    await asyncio.sleep(1.05)
+
+    r1 = await redis_service.check_sliding_window_counter(subject, 2, 0.5)
+    r2 = await redis_service.check_sliding_window_counter(subject, 2, 0.5)
+    assert r1["allowed"] is True
+    assert r2["allowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_uses_constant_memory(redis_service, redis_client):
+    """Test that state stays three packed doubles however many requests pass."""
+    for _ in range(50):
+        await redis_service.check_sliding_window_counter("user:4", 100, 10)
+
+    key = "swc:user:4"
+    assert await redis_client.type(key) == "string"
+    assert await redis_client.strlen(key) == 24
+    assert 0 < await redis_client.pttl(key) <= 20_000
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_matches_log_under_steady_load(redis_service):
+    """Test that steady over-limit traffic is admitted at the exact rate."""
+    capacity = 20
+    window_size = 1.0
+    # 50 req/s for 10 windows against a 20 req/s limit
+    timestamps = [1_000 + i * 0.02 for i in range(500)]
+
+    exact = await replay(
+        redis_service, "sliding_window", timestamps, capacity, window_size
+    )
+    approx = await replay(
+        redis_service, "sliding_window_counter", timestamps, capacity, window_size
+    )
+
+    assert sum(exact) == pytest.approx(sum(approx), rel=0.05)
+    assert max_in_any_window(timestamps, approx, window_size) <= capacity + 1
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counter_matches_log_under_bursty_load(redis_service):
+    """Test that random bursty traffic stays close to the exact log."""
+    rng = random.Random(7)
+    capacity = 50
+    window_size = 2.0
+
+    timestamps = []
+    now = 5_000.0
+    while now < 5_040:
+        # alternate quiet periods with bursts well over the limit
+        rate = rng.choice([5, 10, 100])
+        for _ in range(rng.randint(10, 80)):
+            now += rng.expovariate(rate)
+            timestamps.append(now)
+
+    exact = await replay(
+        redis_service, "sliding_window", timestamps, capacity, window_size
+    )
+    approx = await replay(
+        redis_service, "sliding_window_counter", timestamps, capacity, window_size
+    )
+
+    assert sum(approx) == pytest.approx(sum(exact), rel=0.1)
+    # the approximation may overshoot the exact limit, but only modestly
+    assert max_in_any_window(timestamps, approx, window_size) <= capacity * 1.25
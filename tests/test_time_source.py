@@ -0,0 +1,53 @@
+import pytest
+
+from distributed_rate_limiter_service.service import redis as redis_module
+from distributed_rate_limiter_service.service.redis import RedisService
+
+
+@pytest.mark.asyncio
+async def test_redis_time_ignores_client_clock(redis_client, read_state, monkeypatch):
+    """Test that replicas with skewed clocks share one time source."""
+    service = RedisService(redis=redis_client, time_source="redis")
+
+    monkeypatch.setattr(redis_module.time, "time", lambda: 4_000_000_000.0)
+    r1 = await service.check_token_bucket("user:1", 2, 0.001)
+    monkeypatch.setattr(redis_module.time, "time", lambda: 1.0)
+    r2 = await service.check_token_bucket("user:1", 2, 0.001)
+    r3 = await service.check_token_bucket("user:1", 2, 0.001)
+
+    assert [r1["allowed"], r2["allowed"], r3["allowed"]] == [True, True, False]
+    stored = (await read_state("token_bucket", "tb:user:1"))["last_refill_ts"]
+    assert abs(stored - float((await redis_client.time())[0])) < 5
+
+
+@pytest.mark.asyncio
+async def test_client_time_is_used_when_configured(
+    redis_client, read_state, monkeypatch
+):
+    """Test that client mode stores the caller's timestamp."""
+    service = RedisService(redis=redis_client, time_source="client")
+    monkeypatch.setattr(redis_module.time, "time", lambda: 1_000.5)
+
+    await service.check_token_bucket("user:2", 2, 1.0)
+
+    assert (await read_state("token_bucket", "tb:user:2"))["last_refill_ts"] == 1_000.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "algorithm, field",
+    [("token_bucket", "last_refill_ts"), ("leaky_bucket", "last_leaked_ts")],
+)
+async def test_lagging_clock_cannot_rewind_state(
+    redis_service, read_state, algorithm, field
+):
+    """Test that a caller behind the last writer neither refills nor rewinds."""
+    scripts = redis_service.scripts
+    key = f"skew:{algorithm}"
+
+    r1 = await scripts.evalsha(algorithm, keys=[key], args=[3, 1.0, 1_000])
+    r2 = await scripts.evalsha(algorithm, keys=[key], args=[3, 1.0, 990])
+    r3 = await scripts.evalsha(algorithm, keys=[key], args=[3, 1.0, 1_000])
+
+    assert [r1[1], r2[1], r3[1]] == [2, 1, 0]
+    assert (await read_state(algorithm, key))[field] == 1_000